@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""Asyncio chat client. 异步聊天客户端。
+
+Requests are pipelined: many requests are sent over a few connections
+without waiting for previous answers. Every request carries an id which the
+server echoes in dict answers. Answers without id are matched in send order,
+since the server answers requests of one connection in order.
+请求以流水线方式发送：在少量连接上连续发送多个请求而无需等待之前的回答。
+每个请求带有 id，服务器在字典格式的回答中回显；没有 id 的回答按发送顺序匹配，
+因为服务器按顺序回答同一连接上的请求。
+
+Available classes:
+- AsyncClient: Asyncio client with pipelined requests. 流水线异步客户端。
+"""
+import asyncio
+import codecs
+import itertools
+import json
+from collections import OrderedDict
+from .client import question_pack, config_pack, reload_pack
+
+
+class Connection():
+    """One pipelined connection to server.
+    到服务器的一个流水线连接。
+
+    Public attributes:
+    - pending: Dict of request id to future in send order. 按发送顺序排列的请求 id 到 future 的字典。
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = OrderedDict()
+        self.closed = False
+        self.task = asyncio.ensure_future(self.receive())
+
+    def send(self, reqid, send):
+        """Send request and return future of its answer.
+        发送请求并返回其回答的 future。
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.pending[reqid] = future
+        self.writer.write(send.encode("UTF-8"))
+        return future
+
+    async def receive(self):
+        """Read answers and resolve futures of requests.
+        读取回答并完成对应请求的 future。
+        """
+        decoder = codecs.getincrementaldecoder("UTF-8")()
+        parser = json.JSONDecoder()
+        buffer = ""
+        error = ConnectionError("Connection closed by server.")
+        try:
+            while True:
+                data = await self.reader.read(4096)
+                if not data:
+                    break
+                buffer += decoder.decode(data)
+                while True:
+                    buffer = buffer.lstrip()
+                    try:
+                        answer, end = parser.raw_decode(buffer)
+                    except ValueError:
+                        break
+                    self.resolve(answer, buffer[:end])
+                    buffer = buffer[end:]
+        except (OSError, ValueError) as exc:
+            error = exc
+        finally:
+            self.closed = True
+            self.writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    def resolve(self, answer, text):
+        """Resolve the future matching answer by id or send order.
+        按 id 或发送顺序完成对应的 future。
+        """
+        if isinstance(answer, dict) and answer.get("id") in self.pending:
+            future = self.pending.pop(answer["id"])
+        elif self.pending:
+            _, future = self.pending.popitem(last=False)
+        else:
+            return
+        # 已超时取消的请求直接丢弃回答
+        if not future.done():
+            future.set_result(text)
+
+    def close(self):
+        """Close connection. 关闭连接。
+        """
+        self.task.cancel()
+        self.writer.close()
+
+
+class AsyncClient():
+    """Asyncio chat client with pipelined requests.
+    流水线异步聊天客户端。
+
+    Connections are opened on first use. Each request is sent on the
+    connection with the fewest pending requests. A closed connection is
+    replaced on the next request, requests pending on it fail with
+    ConnectionError.
+    连接在首次使用时建立，每个请求发送到待回答请求最少的连接上。
+    关闭的连接在下一次请求时被替换，其上待回答的请求以 ConnectionError 失败。
+
+    Public attributes:
+    - host: Server IP address. 服务器IP地址。
+    - port: Server port. 服务器端口。
+    - connections: Number of connections. 连接数。
+    - timeout: Seconds to wait for answer. 等待回答的超时时间（秒）。
+
+    Usage:
+        client = AsyncClient()
+        answer = await client.match(question="你好", userid="A0001")
+    """
+    def __init__(self, host="localhost", port=7000, connections=2, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.connections = connections
+        self.timeout = timeout
+        self.pool = [None] * connections
+        self.ids = itertools.count(1)
+        self.lock = None
+
+    async def connection(self):
+        """Get the open connection with the fewest pending requests.
+        获取待回答请求最少的可用连接。
+        """
+        # 在事件循环中创建锁
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            for index, conn in enumerate(self.pool):
+                if conn is None or conn.closed:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                    self.pool[index] = Connection(reader, writer)
+            return min(self.pool, key=lambda conn: len(conn.pending))
+
+    async def request(self, pack, info, userid):
+        """Send request and wait for its answer.
+        发送请求并等待回答。
+
+        Returns:
+            Received JSON format data. 接收到的json格式数据。
+        """
+        reqid = next(self.ids)
+        conn = await self.connection()
+        future = conn.send(reqid, pack(info, userid, reqid))
+        await conn.writer.drain()
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def match(self, question="question", userid="userid"):
+        """Match the answers from the semantic knowledge database.
+        从语义知识数据库搜索答案。
+        """
+        return await self.request(question_pack, question, userid)
+
+    async def config(self, info="", userid="userid"):
+        """Configure the semantic knowledge database.
+        配置语义知识数据库。
+        """
+        return await self.request(config_pack, info, userid)
+
+    async def reload(self, info="", userid="userid"):
+        """Reload knowledge base and word tables of server in background.
+        在后台热加载服务器的知识库和词表。
+        """
+        return await self.request(reload_pack, info, userid)
+
+    def close(self):
+        """Close all connections. 关闭所有连接。
+        """
+        for conn in self.pool:
+            if conn is not None:
+                conn.close()
+        self.pool = [None] * self.connections
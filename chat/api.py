@@ -1,29 +1,65 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Api lib for simple life."""
+"""Api lib for simple life.
+
+All online apis go through the shared 'httpclient.HttpClient', with pooled
+connections, per-endpoint timeouts and circuit breakers configured in the
+[http] section. Weather is cached by city, date word and hour, song search by
+query.
+所有在线 api 经共享的 'httpclient.HttpClient' 请求，连接池、各端点超时与熔断器在 [http] 中配置。
+天气按城市、日期词和小时缓存，歌曲搜索按查询词缓存。
+"""
 import os
-import json
-import requests
+import re
 import time
 import uuid
-from urllib.request import urlopen
+from .cache import TTLCache
+from .config import config
+from .download import Downloader, DownloadError
+from .httpclient import CircuitBreaker, Endpoint, HttpClient
 
 mac_address = uuid.UUID(int=uuid.getnode()).hex[-12:]
 
-def nlu_tuling(question, loc="上海"):
-    url = 'http://www.tuling123.com/openapi/api'
+client = HttpClient(pool_maxsize=config.getint("http", "pool_maxsize", minimum=1))
+
+def make_endpoint(name, url, timeout, ttl=None):
+    """Endpoint with timeout, breaker and cache from [http] config.
+    由 [http] 配置的超时、熔断器与缓存创建端点。
+    """
+    breaker = CircuitBreaker(failures=config.getint("http", "breaker_failures", minimum=1), \
+        reset_timeout=config.getfloat("http", "breaker_reset", minimum=0))
+    cache = TTLCache(maxsize=1024, ttl=config.getfloat("http", ttl, minimum=1)) if ttl else None
+    return Endpoint(name, url, timeout=config.getfloat("http", timeout, minimum=0.1), \
+        breaker=breaker, cache=cache)
+
+endpoints = dict(
+    tuling=make_endpoint("tuling", "http://www.tuling123.com/openapi/api", \
+        "tuling_timeout", "weather_ttl"),
+    location=make_endpoint("location", "http://api.map.baidu.com/location/ip", "map_timeout"),
+    geocoder=make_endpoint("geocoder", "http://api.map.baidu.com/geocoder/v2/", "map_timeout"),
+    music_search=make_endpoint("music_search", "http://tingapi.ting.baidu.com/v1/restserver/ting", \
+        "music_timeout", "music_ttl"),
+    music_play=make_endpoint("music_play", "http://tingapi.ting.baidu.com/v1/restserver/ting", \
+        "music_timeout")
+    )
+
+# 音乐下载到本模块目录，同时下载数受限，其余排队
+downloader = Downloader(os.path.dirname(__file__), \
+    workers=config.getint("download", "workers", minimum=1), \
+    block_size=config.getint("download", "block_kb", minimum=8) * 1024, \
+    timeout=(5, config.getfloat("download", "timeout", minimum=1)), \
+    retries=config.getint("download", "retries", minimum=0))
+
+def nlu_tuling(question, loc="上海", cache_key=None):
     data = {
         'key': "fd2a2710a7e01001f97dc3a663603fa1",
         'info': question,
         "loc": loc,
         'userid': mac_address
     }
-    try:
-        r = json.loads(requests.post(url=url, data=data).text)
-    except:
-        return
-    if not r['code'] in (100000, 200000, 302000, 308000, 313000, 314000): return
+    r = client.request(endpoints["tuling"], data=data, cache_key=cache_key)
+    if not r or not r.get('code') in (100000, 200000, 302000, 308000, 313000, 314000): return
     if r['code'] == 100000: # 文本类
         return '\n'.join([r['text'].replace('<br>','\n')])
     elif r['code'] == 200000: # 链接类
@@ -41,23 +77,39 @@ def nlu_tuling(question, loc="上海"):
     elif r['code'] == 314000: # 诗词类
         return '\n'.join([r['text'].replace('<br>','\n')])
 
+# 问句中的日期词，不同日期的天气不能共用缓存
+DATE_WORD = re.compile(r"大后天|后天|明天|明日|今天|今日|昨天|周末|" \
+    r"(?:下+|这|本)?(?:周|星期|礼拜)[一二三四五六日天]|\d{1,2}[号日]")
+
+def get_weather(city, question=""):
+    """Weather of city by tuling, cached by city, date word and hour.
+    通过图灵获取城市天气，按城市、问句中的日期词和小时缓存。
+
+    Args:
+        city: City to query. 查询的城市。
+        question: Original question, its date word such as '明天' or '周五'
+            is added to query and cache key. 原始问句，其中的日期词加入查询与缓存键。
+            Defaults to '' represents today.
+    """
+    match = DATE_WORD.search(question)
+    date = match.group() if match else ""
+    return nlu_tuling(city + date + "天气", cache_key=(city, date, time.strftime("%Y%m%d%H")))
+
 def get_location_by_ip(city="上海市"): 
-    url = "http://api.map.baidu.com/location/ip"
     data = {
         "ak": "wllxHD5CmWv8qX6CN2lyY73a",
         "coor": "bd09ll"
     }
+    result = client.request(endpoints["location"], data=data)
     try:
-        result = requests.post(url, data, timeout=20).text
-        location = json.loads(result)["content"]["address"]
+        location = result["content"]["address"]
         print("当前所在城市：", location)
-    except:
+    except (TypeError, KeyError):
         location = city
         print("采用默认城市：", location)
     return location
 
 def get_ll_by_address(address="", city="北京市"): 
-    url = "http://api.map.baidu.com/geocoder/v2/"
     data = {
         "ak": "wllxHD5CmWv8qX6CN2lyY73a",
         "ret_coordtype": "gcj02ll", # bd09mc 百度米制坐标
@@ -66,12 +118,9 @@ def get_ll_by_address(address="", city="北京市"):
         "output": "json",
         "callback": "showLocation"
     }
-    result = requests.post(url, data, timeout=20).text
-    location = json.loads(result)
-    return location
+    return client.request(endpoints["geocoder"], data=data)
 
 def get_location_by_ll(lat=39.908832488104686, lng=116.39753319791058): 
-    url = "http://api.map.baidu.com/geocoder/v2/"
     data = {
         "ak": "wllxHD5CmWv8qX6CN2lyY73a",
         "coordtype": "bd09ll",
@@ -81,50 +130,35 @@ def get_location_by_ll(lat=39.908832488104686, lng=116.39753319791058):
         "radius": 1000,
         #"callback": "renderReverse"
     }
-    result = requests.post(url, data, timeout=20).text
-    location = json.loads(result)
-    return location
+    return client.request(endpoints["geocoder"], data=data)
 
 def down_mp3_by_url(song_url, song_name, song_size):
+    """Download mp3 to the directory of this module, resuming a partial download.
+    将 mp3 下载到本模块目录，续传已下载的部分。
+    """
     file_name = song_name + ".mp3"
-    base_dir = os.path.dirname(__file__)
-    file_full_path = os.path.join(base_dir, file_name)  
-    if os.path.exists(file_full_path):  
+    print("Begin downLoad %s, size = %d" % (song_name, song_size))
+    try:
+        path = downloader.download(song_url, file_name, size=song_size)
+    except DownloadError as error:
+        # 保留部分文件，下次从中断处续传
+        print(error)
+        with open('log.txt', 'a') as log_file:
+            log_file.write("download failed %s\n" % file_name)
         return
-    print("Begin downLoad %s, size = %d" % (song_name, song_size))  
-    mp3 = urlopen(song_url)
-    block_size = 8192
-    down_loaded_size = 0
-    file = open(file_full_path, "wb")  
-    while True:  
-        try:  
-            buffer = mp3.read(block_size)             
-            down_loaded_size += len(buffer)
-            if(len(buffer) == 0):
-                if down_loaded_size < song_size:
-                    if os.path.exists(file_full_path):
-                        os.remove(file_full_path)
-                        print('download time out, file deleted')
-                        with open('log.txt', 'a') as log_file:
-                            log_file.write("time out rm %s\n" % file_name)
-                break
-            #print('%s %d of %d' % (song_name, down_loaded_size, song_size))  
-            file.write(buffer)  
-            if down_loaded_size >= song_size:  
-                print('%s download finshed' % file_full_path)  
-                break
-        except:  
-            if os.path.getsize(file_full_path) < song_size:  
-                if os.path.exists(file_full_path):  
-                    os.remove(file_full_path)  
-                    print('download time out, file deleted')  
-                    with open('log.txt', 'a') as log_file:  
-                        log_file.write("time out rm %s\n" % file_name)  
-            break
-    file.close()  
-    
+    print('%s download finshed' % path)
+
+def prefetch_mp3(songs):
+    """Queue downloads of songs returned by 'music_baidu'.
+    将 'music_baidu' 返回的歌曲加入下载队列。
+
+    Returns:
+        List of futures of file paths. 文件路径的 Future 列表。
+    """
+    return [downloader.submit(song["url"], song["title"] + ".mp3", size=int(song["file_size"])) \
+        for song in songs if song]
+
 def music_baidu(song="", singer=""):
-    url = "http://tingapi.ting.baidu.com/v1/restserver/ting"
     current_time = time.time()
     # 获取榜单专辑
     # data_billboard_billList = {
@@ -153,8 +187,9 @@ def music_baidu(song="", singer=""):
         "method": "baidu.ting.song.play"
     }
     try:
-        # 根据歌名查询歌曲
-        result = json.loads(requests.post(url, data=data_search_catalogSug).text)
+        # 根据歌名查询歌曲，同一歌名的搜索结果被缓存
+        result = client.request(endpoints["music_search"], data=data_search_catalogSug, \
+            cache_key=song)
         # 根据歌手获取songid
         for item in result["song"]:
             if item["artistname"] == singer:
@@ -163,7 +198,7 @@ def music_baidu(song="", singer=""):
         if not data_song_play["songid"]:
             data_song_play["songid"] = result["song"][0]["songid"]
         # 根据songid查询资源
-        result = json.loads(requests.post(url, data=data_song_play).text)
+        result = client.request(endpoints["music_play"], data=data_song_play)
         send = {
             "islocal": 0,
             "author": result["songinfo"]["author"],
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""cache
+
+Caches shared by server threads. 服务器线程共享的缓存。
+
+Available classes:
+- LRUCache: Thread-safe least recently used cache. 线程安全的最近最少使用缓存。
+- TTLCache: LRUCache whose items expire. 条目会过期的 LRUCache。
+- FileCache: Content-addressed file cache with LRU eviction. 按内容寻址、LRU 淘汰的文件缓存。
+"""
+import os
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class LRUCache():
+    """Thread-safe least recently used cache.
+    线程安全的最近最少使用缓存。
+
+    Public attributes:
+    - maxsize: Max number of items. 最大缓存条目数。
+    - hits: Number of cache hits. 命中次数。
+    - misses: Number of cache misses. 未命中次数。
+    """
+    def __init__(self, maxsize=1024):
+        assert maxsize > 0, "maxsize must be positive."
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        """Get value of key and mark it as recently used.
+        获取缓存值并标记为最近使用。
+
+        Args:
+            key: Hashable key. 缓存键。
+            default: Returned if key is not cached. 未命中时的返回值。
+                Defaults to None.
+        """
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Cache value of key, evict the least recently used item if full.
+        写入缓存，超过容量时淘汰最近最少使用的条目。
+        """
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        """Remove all items. 清空缓存。
+        """
+        with self.lock:
+            self.data.clear()
+
+
+class TTLCache(LRUCache):
+    """LRUCache whose items expire 'ttl' seconds after they are set.
+    条目在写入 'ttl' 秒后过期的 LRUCache。
+
+    Expired items are dropped when they are read or evicted as least recently
+    used. 过期条目在读取时删除，或作为最近最少使用的条目被淘汰。
+
+    Public attributes:
+    - ttl: Seconds to keep an item. 条目保留的秒数。
+    """
+    def __init__(self, maxsize=1024, ttl=60.0, timer=time.monotonic):
+        assert ttl > 0, "ttl must be positive."
+        LRUCache.__init__(self, maxsize)
+        self.ttl = ttl
+        self.timer = timer
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                expire, value = self.data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expire <= self.timer():
+                self.misses += 1
+                return default
+            self.data[key] = (expire, value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache value of key for 'ttl' seconds, defaults to 'self.ttl'.
+        缓存 'ttl' 秒，默认为 'self.ttl'。
+        """
+        LRUCache.set(self, key, (self.timer() + (ttl if ttl else self.ttl), value))
+
+
+class FileCache():
+    """Content-addressed file cache with size-bounded LRU eviction.
+    按内容寻址、总大小受限并按 LRU 淘汰的文件缓存。
+
+    A file is named by the sha1 digest of its key parts, so the same content
+    is found again after restart. Files are written to a unique temporary
+    name and renamed into place, so concurrent writers and readers in
+    threads or processes never see a partial file. Reading a file touches
+    its modified time, and the least recently used files are removed when
+    the total size exceeds 'max_bytes'. A file that can not be removed, e.g.
+    being played on Windows, is skipped.
+    文件以键各部分的 sha1 摘要命名，重启后仍可找到相同内容。文件先写入唯一的临时文件名再重命名，
+    多线程或多进程并发读写时不会看到不完整的文件。读取文件时更新其修改时间，
+    总大小超过 'max_bytes' 时删除最近最少使用的文件，无法删除的文件（例如在 Windows 上正在播放）被跳过。
+
+    Public attributes:
+    - directory: Cache directory. 缓存目录。
+    - max_bytes: Max total size of files. 文件总大小上限。
+    - suffix: Suffix of file names. 文件名后缀。
+    """
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, suffix=""):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.size = sum(entry.stat().st_size for entry in self.entries())
+
+    @staticmethod
+    def key(*parts):
+        """Key of parts. 由各部分计算键。
+        """
+        return hashlib.sha1("\0".join(str(part) for part in parts).encode("UTF-8")).hexdigest()
+
+    def path(self, key):
+        """Path of file of key. 键对应的文件路径。
+        """
+        return os.path.join(self.directory, key + self.suffix)
+
+    def entries(self):
+        """Cached files. 已缓存的文件。
+        """
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.is_file() and \
+                entry.name.endswith(self.suffix) and ".tmp" not in entry.name]
+
+    def get(self, key):
+        """Get path of cached file and mark it as recently used, None if missing.
+        获取缓存文件路径并标记为最近使用，不存在时返回 None。
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, data):
+        """Write data as file of key atomically, then evict if too large.
+        原子地将数据写为键对应的文件，超过总大小上限时淘汰。
+
+        Returns:
+            Path of cached file. 缓存文件路径。
+        """
+        path = self.path(key)
+        temp = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+        with open(temp, "wb") as file:
+            file.write(data)
+        os.replace(temp, path)
+        with self.lock:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Remove least recently used files until total size is under 'max_bytes'.
+        删除最近最少使用的文件直到总大小不超过 'max_bytes'。
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.size -= size
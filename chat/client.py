@@ -3,6 +3,9 @@
 # PEP 8 check with Pylint
 """Chat client. 聊天客户端。
 
+Available classes:
+- Client: Thread-safe client with connection pool. 带连接池的线程安全客户端。
+
 Available functions:
 - question_pack: Package the question as the JSON format specified by the server.
 将问题打包为服务器指定的json格式。
@@ -12,16 +15,198 @@ Available functions:
 从语义知识数据库搜索答案。
 - config：Configure the semantic knowledge database.
 配置语义知识数据库。
+- reload：Reload knowledge base and word tables of server.
+热加载服务器的知识库和词表。
+- batch_run：Concurrent batch test with latency statistics.
+并发批量测试及延迟统计。
 """
 
+import os
 import json
+import time
+import queue
+import select
 import socket
-from .mytools import time_me
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .mytools import time_me, latency_summary
+
+
+class NotSentError(ConnectionError):
+    """Connection was lost before the request was completely sent.
+    请求完整发出前连接已断开。
+    """
+    pass
+
+
+def is_closed(sock):
+    """Whether an idle connection was closed by the server.
+    空闲连接是否已被服务器关闭。
+
+    An idle connection has nothing to read, so a readable one is either
+    closed or out of sync with the server. 空闲连接无数据可读，可读即已关闭或与服务器不同步。
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class Client():
+    """Thread-safe chat client with connection pool.
+    带连接池的线程安全聊天客户端。
+
+    Connections are created lazily on first use and checked out for each
+    call, so threads never share a socket. A broken connection is closed and
+    replaced. An idle connection closed by the server is detected and
+    replaced before the request is sent. A request is retried once on a new
+    connection only if sending it failed, so it is never processed twice; a
+    connection lost after the request was sent raises.
+    连接在首次使用时才建立，每次调用独占一个连接，线程之间不共享套接字。
+    损坏的连接会被关闭并替换。发送请求前检测并替换已被服务器关闭的空闲连接。
+    只有发送失败时才用新连接重试一次，请求不会被处理两次；请求发出后连接断开则抛出异常。
+
+    Public attributes:
+    - host: Server IP address. 服务器IP地址。
+    - port: Server port. 服务器端口。
+    - pool_size: Max number of connections. 最大连接数。
+    - timeout: Socket timeout in seconds. 套接字超时时间（秒）。
+    """
+    def __init__(self, host="localhost", port=7000, pool_size=4, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    def connect(self):
+        """Create new connection to server. 建立到服务器的新连接。
+        """
+        return socket.create_connection((self.host, self.port), timeout=self.timeout)
+
+    def request(self, send):
+        """Send packaged JSON data and receive the answer.
+        发送打包好的json数据并接收回答。
+
+        Args:
+            send: Packaged JSON format data. 打包好的json格式数据。
+
+        Returns:
+            Received JSON format data. 接收到的json格式数据。
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise socket.timeout("No idle connection in pool.")
+        try:
+            sock = self.checkout()
+            try:
+                received = self.exchange(sock, send)
+            except NotSentError:
+                # 请求未发出，服务器不会处理，可安全重试
+                sock.close()
+                sock = self.connect()
+                try:
+                    received = self.exchange(sock, send)
+                except:
+                    sock.close()
+                    raise
+            except:
+                sock.close()
+                raise
+            self.idle.put(sock)
+            return received
+        finally:
+            self.slots.release()
 
-mysock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-mysock.connect(("localhost", 7000))
+    def checkout(self):
+        """Get an idle connection that is still open, or a new connection.
+        获取仍然打开的空闲连接，没有时建立新连接。
+        """
+        while True:
+            try:
+                sock = self.idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if not is_closed(sock):
+                return sock
+            sock.close()
 
-def question_pack(info="", userid="userid"):
+    @staticmethod
+    def exchange(sock, send):
+        """Send data on connection and receive one complete JSON answer.
+        在连接上发送数据并接收一个完整的json回答。
+
+        Raises:
+            NotSentError: Connection was lost while sending the request.
+            ConnectionError: Connection was closed before any response.
+        """
+        try:
+            sock.sendall(send.encode("UTF-8"))
+        except (BrokenPipeError, ConnectionResetError) as error:
+            raise NotSentError("Connection lost before request was sent.") from error
+        try:
+            data = sock.recv(4096)
+        except ConnectionResetError as error:
+            raise ConnectionError("Connection lost before response.") from error
+        if not data:
+            raise ConnectionError("Connection closed by server.")
+        while True:
+            try:
+                return recv_text(data)
+            except ValueError:
+                pass
+            try:
+                chunk = sock.recv(4096)
+            except ConnectionError as error:
+                raise OSError("Connection lost with incomplete response.") from error
+            if not chunk:
+                raise OSError("Connection closed with incomplete response.")
+            data += chunk
+
+    def match(self, question="question", userid="userid"):
+        """Match the answers from the semantic knowledge database.
+        从语义知识数据库搜索答案。
+        """
+        return self.request(question_pack(question, userid))
+
+    def config(self, info="", userid="userid"):
+        """Configure the semantic knowledge database.
+        配置语义知识数据库。
+        """
+        return self.request(config_pack(info, userid))
+
+    def reload(self, info="", userid="userid"):
+        """Reload knowledge base and word tables of server in background.
+        在后台热加载服务器的知识库和词表。
+        """
+        return self.request(reload_pack(info, userid))
+
+    def close(self):
+        """Close all idle connections. 关闭所有空闲连接。
+        """
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def recv_text(data):
+    """Decode received bytes if they contain a complete JSON document.
+    若接收到的字节包含完整的json文档则解码。
+
+    Raises:
+        ValueError: The JSON document is incomplete. json文档不完整。
+    """
+    text = data.decode("UTF-8")
+    json.loads(text)
+    return text
+
+# 默认客户端，首次调用时才连接服务器
+client = Client()
+
+def question_pack(info="", userid="userid", reqid=None):
     """Package the question as the JSON format specified by the server.
     将问题打包为服务器指定的json格式。
 
@@ -30,6 +215,8 @@ def question_pack(info="", userid="userid"):
             Defaults to "".
         userid: User id. 用户唯一标识。
             Defaults to "userid".
+        reqid: Request id echoed by server. 由服务器回显的请求 id。
+            Defaults to None.
 
     Returns:
         Packaged JSON format data. 打包好的json格式数据。
@@ -41,9 +228,11 @@ def question_pack(info="", userid="userid"):
         "ask_content": info, # 问题内容
         "state": "robotstate" # 机器人状态
         }
+    if reqid is not None:
+        data["id"] = reqid
     return json.dumps(data)
 
-def config_pack(info="", userid="userid"):
+def config_pack(info="", userid="userid", reqid=None):
     """Package the config info as the JSON format specified by the server.
     将配置信息打包为服务器指定的json格式。
 
@@ -52,6 +241,8 @@ def config_pack(info="", userid="userid"):
             Defaults to "".
         userid: User id. 用户唯一标识。
             Defaults to "userid".
+        reqid: Request id echoed by server. 由服务器回显的请求 id。
+            Defaults to None.
 
     Returns:
         Packaged JSON format data. 打包好的json格式数据。
@@ -63,6 +254,33 @@ def config_pack(info="", userid="userid"):
         "config_content": info, # 配置内容
         "state": "robotstate" # 机器人状态
         }
+    if reqid is not None:
+        data["id"] = reqid
+    return json.dumps(data)
+
+def reload_pack(info="", userid="userid", reqid=None):
+    """Package the reload info as the JSON format specified by the server.
+    将热加载信息打包为服务器指定的json格式。
+
+    Args:
+        info: Reload targets. 热加载对象，以空格分隔的 "kb" 和 "dict"。
+            Defaults to "" represents all.
+        userid: User id. 用户唯一标识。
+            Defaults to "userid".
+        reqid: Request id echoed by server. 由服务器回显的请求 id。
+            Defaults to None.
+
+    Returns:
+        Packaged JSON format data. 打包好的json格式数据。
+    """
+    data = {
+        "userid": userid, # 用户唯一标识
+        "key": "yourkey", # API密钥
+        "reload_content": info, # 热加载对象
+        "state": "robotstate" # 机器人状态
+        }
+    if reqid is not None:
+        data["id"] = reqid
     return json.dumps(data)
 
 def match(question="question", userid="userid"):
@@ -78,11 +296,7 @@ def match(question="question", userid="userid"):
     Returns:
         Packaged JSON format data of answer. 打包好的答案json格式数据。
     """
-    send = question_pack(question, userid)
-    mysock.sendall(send.encode("UTF-8"))
-    received = mysock.recv(4096) # 2048->4096(2018-1-5 添加了 xml 后扩充)
-    received = received.decode("UTF-8")
-    return received
+    return client.match(question, userid)
 
 def config(info="", userid="userid"):
     """Configure the semantic knowledge database.
@@ -97,11 +311,22 @@ def config(info="", userid="userid"):
     Returns:
         Packaged JSON format data of config result. 打包好的配置结果json格式数据。
     """
-    send = config_pack(info, userid)
-    mysock.sendall(send.encode("UTF-8"))
-    received = mysock.recv(4096) # 2048->4096(2018-1-5 添加了 xml 后扩充)
-    received = received.decode("UTF-8")
-    return received
+    return client.config(info, userid)
+
+def reload(info="", userid="userid"):
+    """Reload knowledge base and word tables of server in background.
+    在后台热加载服务器的知识库和词表。
+
+    Args:
+        info: Reload targets. 热加载对象，以空格分隔的 "kb" 和 "dict"。
+            Defaults to "" represents all.
+        userid: User id. 用户唯一标识。
+            Defaults to "userid".
+
+    Returns:
+        Packaged JSON format data of reload targets. 打包好的热加载对象json格式数据。
+    """
+    return client.reload(info, userid)
 
 def start():
     """Start Client.
@@ -136,3 +361,105 @@ def batch_test(filename, userid="A0001"):
                     file.write(key + ": " + str(result[key]) + "\n")
                 file.write("\n")
     return data
+
+def batch_run(filename, output="testresult.jsonl", userid="A0001", concurrency=8, \
+    resume=True, host="localhost", port=7000):
+    """Concurrent batch test with latency statistics.
+    并发批量测试及延迟统计。
+
+    Questions are sent over 'concurrency' connections, every answer is
+    appended to 'output' as one JSON line as soon as it arrives. With 'resume',
+    lines of 'filename' already answered without error in 'output' are
+    skipped, so an interrupted run continues where it stopped and failed
+    cases are retried. The summary counts the last record of every line.
+    问题通过 'concurrency' 个连接并发发送，每个回答到达后立即作为一行json追加到
+    'output'。'resume' 为真时跳过 'output' 中已成功回答的测试用例行，中断后可继续执行，
+    失败的用例会被重试。统计只计入每行最后一条记录。
+
+    Args:
+        filename: Test case file with one question per line. 每行一个问题的测试用例文件。
+        output: JSON Lines result file. JSON Lines 格式的测试结果文件。
+            Defaults to "testresult.jsonl".
+        userid: User id. 用户唯一标识。
+            Defaults to "A0001".
+        concurrency: Number of concurrent connections. 并发连接数。
+            Defaults to 8.
+        resume: Skip test cases recorded in output. 是否跳过已记录的测试用例。
+            Defaults to True.
+
+    Returns:
+        Summary of throughput and latency (ms) of all records, with breakdown by context.
+        吞吐量及所有记录的延迟（毫秒）统计，包含按 context 分组的统计。
+    """
+    assert filename is not None, "filename can not be None"
+    done = set()
+    if resume and os.path.exists(output):
+        with open(output, 'r', encoding="UTF-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                    if not record["error"]:
+                        done.add(record["line"])
+                except (ValueError, KeyError):
+                    continue # 中断时可能写入了不完整的行
+    with open(filename, 'r', encoding="UTF-8") as testcase:
+        cases = [(lineno, line.rstrip()) for lineno, line in enumerate(testcase, 1) \
+            if line.strip() and lineno not in done]
+    pool = Client(host=host, port=port, pool_size=concurrency)
+    lock = threading.Lock()
+
+    with open(output, 'a+', encoding="UTF-8") as file:
+        # 补全中断时写了一半的行
+        if file.tell() > 0:
+            file.seek(file.tell() - 1)
+            if file.read(1) != "\n":
+                file.write("\n")
+
+        def ask(case):
+            lineno, question = case
+            record = dict(line=lineno, question=question, answer={}, error="")
+            start = time.perf_counter()
+            try:
+                record["answer"] = json.loads(pool.match(question=question, userid=userid))
+            except Exception as error:
+                record["error"] = repr(error)
+            record["latency"] = 1000 * (time.perf_counter() - start)
+            with lock:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                file.flush()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in executor.map(ask, cases):
+                pass
+        elapsed = time.perf_counter() - start
+    pool.close()
+
+    # 重试过的用例只保留最后一条记录
+    records = {}
+    with open(output, 'r', encoding="UTF-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+                records[record["line"]] = record
+            except (ValueError, KeyError):
+                continue
+    latencies = []
+    contexts = {}
+    errors = 0
+    for record in records.values():
+        if record["error"]:
+            errors += 1
+            continue
+        latencies.append(record["latency"])
+        contexts.setdefault(record["answer"].get("context", ""), []).append(record["latency"])
+    summary = dict(
+        sent=len(cases),
+        seconds=elapsed,
+        throughput=len(cases) / elapsed if elapsed else 0.0,
+        errors=errors,
+        latency=latency_summary(latencies),
+        contexts={key: latency_summary(value) for key, value in contexts.items()}
+        )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
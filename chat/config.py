@@ -1,10 +1,177 @@
 # -*- coding:utf8 -*-
+# PEP 8 check with Pylint
+"""config
 
+Configuration of nlu server, parsed once from conf/self.conf.
+语义服务器配置，只从 conf/self.conf 解析一次。
+
+Any option can be overridden by an environment variable named
+CHAT_<SECTION>_<KEY> in upper case, e.g. CHAT_SERVER_MAX_INFLIGHT=64.
+Typed accessors validate values and raise ValueError naming the option.
+'Config.reload' parses the file again only if it was modified and then calls
+the hooks registered with 'Config.on_reload'; the server Watcher calls it
+periodically. If parsing or any hook fails, the previous configuration is
+kept and re-applied, so a bad edit never leaves the server half reloaded.
+任一配置项都可用名为 CHAT_<SECTION>_<KEY>（大写）的环境变量覆盖，例如 CHAT_SERVER_MAX_INFLIGHT=64。
+类型化访问方法校验取值，出错时抛出注明配置项的 ValueError。
+'Config.reload' 仅在文件修改后重新解析，并调用用 'Config.on_reload' 注册的钩子；
+服务器的 Watcher 会定期调用它。解析或任一钩子失败时保留并重新应用之前的配置，
+错误的修改不会使服务器处于部分加载的状态。
+
+Available classes:
+- Config: Parsed configuration with typed accessors. 带类型化访问方法的已解析配置。
+
+Available functions:
+- getConfig: Get option of the default config as string. 以字符串获取默认配置的配置项。
+
+Usage:
+    from .config import config
+    max_inflight = config.getint("server", "max_inflight", minimum=1)
+"""
 import os
+import threading
 from configparser import ConfigParser
 
+MISSING = object()
+# 'Config.convert' 内部使用，表示配置项不存在且有 fallback
+ABSENT = object()
+
+
+class Config():
+    """Parsed configuration with typed accessors.
+    带类型化访问方法的已解析配置。
+
+    Public attributes:
+    - path: Path of configuration file. 配置文件路径。
+    - environ: Mapping of environment variables. 环境变量映射。
+    """
+    def __init__(self, path, environ=os.environ):
+        self.path = path
+        self.environ = environ
+        self.hooks = []
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.parser = None
+        self.load()
+
+    def load(self):
+        """Parse configuration file and swap it in. 解析配置文件后替换。
+        """
+        self.mtime = self.get_mtime()
+        self.parser = self.parse()
+
+    def parse(self):
+        """Parse configuration file into a new parser. 将配置文件解析到新的解析器。
+        """
+        parser = ConfigParser()
+        parser.read(self.path, encoding="UTF-8")
+        return parser
+
+    def get_mtime(self):
+        """Get modified time of configuration file. 获取配置文件修改时间。
+        """
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def reload(self):
+        """Parse configuration file again if modified, then call reload hooks.
+        配置文件修改后重新解析，并调用热加载钩子。
+
+        The file is parsed into a new parser first. If a hook raises, the
+        previous parser is restored, the hooks already called are called
+        again to re-apply it, and the error is raised. The file is not
+        parsed again until it is modified again.
+        文件先解析到新的解析器。若钩子抛出异常，则恢复之前的解析器，已调用的钩子重新调用以恢复原配置，
+        并抛出该异常。文件再次修改之前不会重新解析。
+
+        Returns:
+            Whether configuration is reloaded. 是否重新加载。
+        """
+        with self.lock:
+            mtime = self.get_mtime()
+            if mtime == self.mtime:
+                return False
+            # 失败时也记录修改时间，文件再次修改之前不重复报错
+            self.mtime = mtime
+            previous, self.parser = self.parser, self.parse()
+            called = []
+            try:
+                for hook in self.hooks:
+                    called.append(hook)
+                    hook(self)
+            except Exception:
+                self.parser = previous
+                for hook in called:
+                    hook(self)
+                raise
+        return True
+
+    def on_reload(self, hook):
+        """Register hook(config) called after reload. 注册重新加载后调用的 hook(config)。
+        """
+        self.hooks.append(hook)
+        return hook
+
+    def get(self, section, key, fallback=MISSING):
+        """Get option as string, the environment variable takes precedence.
+        以字符串获取配置项，环境变量优先。
+
+        Args:
+            section: Section name. 配置节名称。
+            key: Option name. 配置项名称。
+            fallback: Value if option is missing. 配置项不存在时的取值。
+                Defaults to MISSING represents raising ValueError.
+        """
+        name = "CHAT_%s_%s" % (section.upper(), key.upper())
+        if name in self.environ:
+            return self.environ[name]
+        value = self.parser.get(section, key, fallback=MISSING)
+        if value is MISSING:
+            if fallback is MISSING:
+                raise ValueError("Missing config option [%s] %s in %s" % (section, key, self.path))
+            return fallback
+        return value
+
+    def convert(self, section, key, convert, fallback, minimum=None, maximum=None):
+        """Get option converted by 'convert' and check its range.
+        获取经 'convert' 转换的配置项并检查其范围。
+        """
+        value = self.get(section, key, MISSING if fallback is MISSING else ABSENT)
+        if value is ABSENT:
+            return fallback
+        try:
+            value = convert(value.strip())
+        except (ValueError, KeyError):
+            raise ValueError("Invalid config option [%s] %s: %r" % (section, key, value))
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise ValueError("Config option [%s] %s = %r is out of range [%s, %s]" \
+                % (section, key, value, minimum, maximum))
+        return value
+
+    def getint(self, section, key, fallback=MISSING, minimum=None, maximum=None):
+        """Get option as int. 以整数获取配置项。
+        """
+        return self.convert(section, key, int, fallback, minimum, maximum)
+
+    def getfloat(self, section, key, fallback=MISSING, minimum=None, maximum=None):
+        """Get option as float. 以浮点数获取配置项。
+        """
+        return self.convert(section, key, float, fallback, minimum, maximum)
+
+    def getboolean(self, section, key, fallback=MISSING):
+        """Get option as bool: 1/0, true/false, yes/no or on/off.
+        以布尔值获取配置项：1/0，true/false，yes/no 或 on/off。
+        """
+        return self.convert(section, key, \
+            lambda value: ConfigParser.BOOLEAN_STATES[value.lower()], fallback)
+
+
+# 默认配置
+config = Config(os.path.join(os.path.split(os.path.realpath(__file__))[0], "conf", "self.conf"))
+
 def getConfig(section, key):
-    config = ConfigParser()
-    path = os.path.split(os.path.realpath(__file__))[0] + '/conf/self.conf'
-    config.read(path)
+    """Get option of the default config as string. 以字符串获取默认配置的配置项。
+    """
     return config.get(section, key)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""cypher
+
+Cypher statements of nlu server and database manager. 语义服务器与知识库管理的 Cypher 语句。
+
+Values are always passed as parameters ($name), never formatted into the
+statement, so Neo4j compiles each statement once and reuses its plan, and
+quotes in questions can not break a query. Labels can not be parameters:
+statements with '{label}' are formatted with 'label()'.
+取值总是作为参数（$name）传入而不拼接到语句中，Neo4j 对每条语句只编译一次并复用执行计划，
+问题中的引号也不会破坏查询。标签不能作为参数，含 '{label}' 的语句用 'label()' 格式化。
+
+Available functions:
+- label: Quote label for statement templates. 为语句模板转义标签。
+"""
+
+# ============================用户与配置=============================
+USER = "MATCH (user:User {userid: $userid}) RETURN user LIMIT 1"
+KB_VERSION = "MATCH (user:User) RETURN max(user.kb_version) AS version"
+BUMP_KB_VERSION = "MATCH (user:User) SET user.kb_version = coalesce(user.kb_version, 0) + 1"
+CONFIG_NAMES = "MATCH (config:Config) RETURN config.name AS name"
+USER_CONFIGS = "MATCH (user:User {userid: $userid})-[r:has]->(config:Config) " \
+    "RETURN config.name AS name, r.bselected AS bselected, r.available AS available"
+# 选中 $selected 中的子知识库并禁用其余的，同时更新话题集版本
+SELECT_CONFIGS = "MATCH (user:User {userid: $userid}) " \
+    "SET user.topics_version = coalesce(user.topics_version, 0) + 1 " \
+    "WITH user OPTIONAL MATCH (user)-[r:has]->(config:Config) " \
+    "SET r.bselected = CASE WHEN config.name IN $selected THEN 1 ELSE 0 END " \
+    "RETURN DISTINCT user.topics_version AS version"
+AVAILABLE_CONFIGS = "MATCH (user:User {userid: $userid})-[r:has {available: 1}]->(config:Config) " \
+    "RETURN config.name AS name"
+SELECTED_CONFIGS = "MATCH (user:User {userid: $userid})" \
+    "-[r:has {bselected: 1, available: 1}]->(config:Config) RETURN config"
+# 若子表格名字不存在，新建配置子图并设为可用和已选择，否则更新话题集
+MERGE_CONFIG = "MATCH (user:User {userid: $userid}) " \
+    "MERGE (config:Config {name: $name}) SET config.topic = $topic " \
+    "MERGE (user)-[r:has]->(config) " \
+    "ON CREATE SET r.bselected = 1, r.available = 1"
+CONFIG_TOPIC = "MATCH (config:Config {name: $name}) RETURN config.topic AS topic LIMIT 1"
+SCENE_CONFIG = "MATCH (config:Config) WHERE config.topic CONTAINS $topic " \
+    "RETURN config.name AS name LIMIT 1"
+
+# ============================知识节点=============================
+ALL_NODES = "MATCH (n:NluCell) RETURN n"
+KEY_SENTENCE = "MATCH (n:NluCell) WHERE $question CONTAINS n.name AND n.topic IN $topics " \
+    "RETURN n LIMIT 1"
+NEXT_STEP = "MATCH (n:NluCell {name: $name, topic: $topic, tid: $tid}) RETURN n"
+NODE_DIGESTS = "MATCH (n:NluCell) " \
+    "RETURN id(n) AS nid, n.name AS name, n.topic AS topic, n.digest AS digest"
+CREATE_NODES = "UNWIND $rows AS row CREATE (n:{label}) SET n = row"
+UPDATE_NODES = "UNWIND $rows AS row MATCH (n:NluCell) WHERE id(n) = row.nid SET n += row.props"
+DELETE_NODES = "UNWIND $ids AS nid MATCH (n:NluCell) WHERE id(n) = nid DETACH DELETE n"
+TOPIC_NODES = "MATCH (n:{label}) WHERE n.topic = $topic RETURN n"
+# 按 names 的顺序返回各 Config 话题下的节点，同一子表格内按话题排序
+EXPORT_NODES = "UNWIND range(0, size($names) - 1) AS i " \
+    "MATCH (config:Config {name: $names[i]}) " \
+    "UNWIND split(config.topic, ',') AS topic " \
+    "MATCH (n:NluCell {topic: topic}) RETURN config.name AS name, n ORDER BY i, n.topic"
+
+# ============================对话记忆=============================
+MEMORY = "MATCH (memory:Memory {qa_id: $qa_id}) RETURN memory LIMIT 1"
+
+# ============================批量删除=============================
+# Database.delete 的子图类型
+DELETE = {
+    "n": "MATCH (n:{label}) DETACH DELETE n",
+    "r": "MATCH (n)-[r:{label}]-(m) DETACH DELETE r",
+    "nr": "MATCH (n)<-[r:{label}]-(m) DETACH DELETE r, n",
+    "rm": "MATCH (n)-[r:{label}]->(m) DETACH DELETE r, m",
+    "nrm": "MATCH (n)-[r:{label}]-(m) DETACH DELETE r, n, m",
+    }
+
+
+def label(name):
+    """Quote label or relationship type for statement templates.
+    转义标签或关系类型以用于语句模板。
+
+    Usage:
+        graph.run(cypher.DELETE["n"].format(label=cypher.label("NluCell")))
+    """
+    assert name, "label can not be empty."
+    return "`" + name.replace("`", "``") + "`"
@@ -3,14 +3,89 @@
 自然语言理解知识库管理。
 """
 import os
-import string
+import hashlib
 import xlwt
-from collections import OrderedDict
+from itertools import repeat, groupby
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from py2neo import Graph, Node, Relationship, NodeSelector
 from tkinter.filedialog import askopenfilename
-from .mytools import read_excel, write_excel, set_excel_style
+from .mytools import iter_excel, write_excel, set_excel_style
+from .trace import traced
 from .semantic import get_tag
+from .kb import export_columns
+from . import schema, cypher
 
+# 知识库表格各列对应的节点属性（前两行为表头）
+qa_columns = ('name', 'content', 'topic', 'tid', 'behavior', 'parameter', 'url', 'tag', \
+    'keywords', 'api', 'txt', 'img', 'button', 'description')
+QARow = namedtuple("QARow", qa_columns)
+# 测试标准表格各列
+TSRow = namedtuple("TSRow", ('question', 'content', 'context', 'behavior', 'parameter', 'url'))
+
+def row_digest(node):
+    """Digest of question, answer and attributes of a knowledge node.
+    知识节点问题、回答及各属性的摘要，用于增量同步时比较是否变更。
+    """
+    text = "\x1f".join(str(node.get(key, "")) for key in qa_columns if key != "tag")
+    return hashlib.md5(text.encode("UTF-8")).hexdigest()
+
+def diff_nodes(records, sheets, partial=False):
+    """Classify questions of workbook sheets against existing nodes by digest.
+    按摘要将工作簿各子表格的问题与已有节点比较并分类。
+
+    Args:
+        records: Existing nodes with 'nid', 'name', 'topic' and 'digest', such
+            as the result of 'cypher.NODE_DIGESTS'. 已有节点。
+        sheets: Iterable of (sheet name, QARow rows). (子表格名, QARow 行) 序列。
+        partial: Only delete nodes of the topics in sheets. 只删除这些子表格话题下的节点。
+            Defaults to False.
+
+    Returns:
+        (sheets, inserts, updates, stale, kept): Topics of each sheet, nodes to
+        insert, (nid, node) to update, nids to delete and nids kept.
+        各子表格的话题，待新建的节点，待更新的 (nid, 节点)，待删除及保留的节点 id。
+    """
+    # 已有节点：摘要 -> 节点 id 列表，(问题, 话题) -> 节点 id 列表
+    by_digest = {}
+    by_key = {}
+    for record in records:
+        by_digest.setdefault(record["digest"], []).append(record["nid"])
+        by_key.setdefault((record["name"], record["topic"]), []).append(record["nid"])
+    kept = set()
+    inserts = []
+    updates = []
+    topics_of = OrderedDict()
+    for sheet_name, rows in sheets:
+        topics = topics_of.setdefault(sheet_name, [])
+        for row in rows:
+            # 场景 topic 必须填写，问答 topic 可不填，若填写必须为 sheet_name
+            row = row._replace(topic=row.topic if row.topic else sheet_name)
+            topics.append(row.topic)
+            # 问题不能为空，避免因知识库表格填写格式不对而导致存入空问答对
+            for question in row.name.split("|"):
+                if not question:
+                    continue
+                node = dict(row._asdict(), name=question)
+                node["digest"] = row_digest(node)
+                same = [nid for nid in by_digest.get(node["digest"], []) if nid not in kept]
+                if same:
+                    kept.add(same[0])
+                    continue
+                similar = [nid for nid in by_key.get((question, row.topic), []) if nid not in kept]
+                if similar:
+                    kept.add(similar[0])
+                    updates.append((similar[0], node))
+                else:
+                    node["hot"] = "0"
+                    inserts.append(node)
+    if partial:
+        alltopics = set(topic for topics in topics_of.values() for topic in topics)
+        stale = [nid for (_, topic), nids in by_key.items() if topic in alltopics \
+            for nid in nids if nid not in kept]
+    else:
+        stale = [nid for nids in by_key.values() for nid in nids if nid not in kept]
+    return topics_of, inserts, updates, stale, kept
 
 class Database():
     """Manage Database.
@@ -44,26 +119,46 @@ class Database():
         """
         if pattern == "all":
             self.graph.delete_all()
-        elif pattern == "n":
-            self.graph.run("MATCH(n:" + label + ") DETACH DELETE n")
-        elif pattern == "r":
-            self.graph.run("MATCH (n)-[r:" + label + "]-(m) DETACH DELETE r")
-        elif pattern == "nr":
-            self.graph.run("MATCH (n)<-[r:" + label + "]-(m) DETACH DELETE r, n")
-        elif pattern == "rm":
-            self.graph.run("MATCH (n)-[r:" + label + "]->(m) DETACH DELETE r, m")
-        elif pattern == "nrm":
-            self.graph.run("MATCH (n)-[r:" + label + "]-(m) DETACH DELETE r, n, m")
-
-    def reset(self, pattern="n", label=None, filename=None):
+        elif pattern in cypher.DELETE:
+            self.graph.run(cypher.DELETE[pattern].format(label=cypher.label(label)))
+        self.bump_kb_version()
+
+    def migrate(self):
+        """Create and verify indexes and constraints of graph database.
+        创建并校验图数据库的索引与约束，见 'chat.schema'。
+
+        Returns:
+            (indexes, constraints): Lists of (label, property) still missing. 仍缺少的 (标签, 属性) 列表。
+        """
+        indexes, constraints = schema.migrate(self.graph)
+        if indexes or constraints:
+            print("Missing indexes: %s, constraints: %s" % (indexes, constraints))
+        else:
+            print("Migrate successfully!")
+        return indexes, constraints
+
+    def bump_kb_version(self):
+        """Increase version of knowledge base after it was changed.
+        知识库变更后更新版本号，使语义服务器的问答缓存失效。
+        """
+        self.graph.run(cypher.BUMP_KB_VERSION)
+
+    def reset(self, pattern="n", label=None, filename=None, sync=False):
         """Reset data of label in database.
         重置数据库子图。
 
         Args:
             pattern: Type of subgraph. 子图类型。
             label: Label of subgraph. 子图标签。
+            sync: Only write changed rows with 'sync_excel' instead of
+                deleting and reloading all. 用 'sync_excel' 只写入变更的行，而不是全部删除后重新导入。
+                Defaults to False.
         """ 
         assert filename is not None, "filename can not be None."
+        if sync and os.path.exists(filename):
+            self.sync_excel(filename)
+            print("Sync successfully!")
+            return
         self.delete(pattern="n", label="NluCell")
         print("Delete successfully!")
         if os.path.exists(filename):
@@ -101,10 +196,12 @@ class Database():
         for question in questions:
             if question: # 问题不能为空，避免因知识库表格填写格式不对而导致存入空问答对
                 tag = get_tag(question, self.user)
-                node = Node(label, name=question, content=content, topic=topic, \
+                properties = dict(name=question, content=content, topic=topic, \
                 tid=tid, behavior=behavior, parameter=parameter, url=url, tag=tag, \
                 keywords=keywords, api=api, txt=txt, img=img, button=button, \
-                description=description, hot="0")
+                description=description)
+                # 保存摘要，之后的 'sync_excel' 不会重写未变更的节点
+                node = Node(label, digest=row_digest(properties), hot="0", **properties)
                 self.graph.create(node)
 
     def add_ts(self, label="TestStandard", question=None, content=None, context="", \
@@ -124,119 +221,245 @@ class Database():
         """Processing data of test standard.
         """
         assert filename is not None, "filename can not be None."
-        data = read_excel(filename)
-        data_sheets = data.sheet_names()
-        if custom_sheets:
-            sheet_names = list(set(data_sheets).intersection(set(custom_sheets)))
-        else:
-            sheet_names = data_sheets
-        for sheet_name in sheet_names: # 可自定义要导入的子表格
-            table = data.sheet_by_name(sheet_name)
-            # 1.Select specified table
-            # table = data.sheet_by_index(0)
-            if table:
-                # 2.Select specified column
-                col_format = ['A', 'B', 'C', 'D', 'E', 'F']
-                try:
-                    nrows = table.nrows
-                    # ncols = table.ncols
-                    str_upcase = [i for i in string.ascii_uppercase]
-                    i_upcase = range(len(str_upcase))
-                    ncols_dir = dict(zip(str_upcase, i_upcase))
-                    col_index = [ncols_dir.get(i) for i in col_format]
-                    # 前两行为表头
-                    for i in range(2, nrows):
-                        question = table.cell(i, col_index[0]).value
-                        content = table.cell(i, col_index[1]).value
-                        context = table.cell(i, col_index[2]).value
-                        behavior = table.cell(i, col_index[3]).value
-                        parameter = table.cell(i, col_index[4]).value
-                        url = table.cell(i, col_index[5]).value
-                        self.add_ts(question=question, content=content, context=context, \
-                        behavior=behavior, parameter=parameter, url=url)
-                except Exception as error:
-                    print('Error: %s' %error)
-                    return None
-            else:
-                print('Error! Data of %s is empty!' %sheet_name)
+        # 可自定义要导入的子表格
+        for sheet_name, rows in iter_excel(filename, TSRow, custom_sheets):
+            try:
+                for row in rows:
+                    self.add_ts(question=row.question, content=row.content, \
+                    context=row.context, behavior=row.behavior, \
+                    parameter=row.parameter, url=row.url)
+            except Exception as error:
+                print('Error: %s' %error)
                 return None
 
+    @traced()
     def handle_excel(self, filename=None, custom_sheets=[]):
         """Processing data of excel.
         """
         assert filename is not None, "filename can not be None"
-        data = read_excel(filename)
-        data_sheets = data.sheet_names()
-        if custom_sheets:
-            sheet_names = list(set(data_sheets).intersection(set(custom_sheets)))
-        else:
-            sheet_names = data_sheets
-        for sheet_name in sheet_names: # 可自定义要导入的子表格
-            table = data.sheet_by_name(sheet_name)
+        # 可自定义要导入的子表格
+        for sheet_name, rows in iter_excel(filename, QARow, custom_sheets):
             topics = []
-            # 1.Select specified table
-            # table = data.sheet_by_index(0)
-            if data:
-                # 2.Select specified column
-                col_format = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N']
-                try:
-                    nrows = table.nrows
-                    # ncols = table.ncols
-                    str_upcase = [i for i in string.ascii_uppercase]
-                    i_upcase = range(len(str_upcase))
-                    ncols_dir = dict(zip(str_upcase, i_upcase))
-                    col_index = [ncols_dir.get(i) for i in col_format]
-                    # 前两行为表头
-                    for i in range(2, nrows):
-                        name = table.cell(i, col_index[0]).value
-                        content = table.cell(i, col_index[1]).value
-                        # Modify：2018-1-17
-                        # 场景 topic 必须填写，问答 topic 可不填，若填写必须为 sheet_name
-                        temp = table.cell(i, col_index[2]).value
-                        topic =  temp if temp else sheet_name
-                        tid = table.cell(i, col_index[3]).value
-                        behavior = table.cell(i, col_index[4]).value
-                        parameter = table.cell(i, col_index[5]).value
-                        url = table.cell(i, col_index[6]).value
-                        tag = table.cell(i, col_index[7]).value
-                        keywords = table.cell(i, col_index[8]).value
-                        api = table.cell(i, col_index[9]).value
-                        txt = table.cell(i, col_index[10]).value
-                        img = table.cell(i, col_index[11]).value
-                        button = table.cell(i, col_index[12]).value
-                        description = table.cell(i, col_index[13]).value
-                        # hot = 0 table.cell(i, col_index[14]).value
-					    # 3.Your processing function of excel data here
-                        self.add_qa(name=name, content=content, topic=topic, \
-                        tid=tid, behavior=behavior, parameter=parameter, url=url, tag=tag, \
-                        keywords=keywords, api=api, txt=txt, img=img, button=button, \
-                        description=description, delimiter="|")
-                        # 添加到场景标签列表
-                        if topic:
-                            topics.append(topic)
-                except Exception as error:
-                    print('Error: %s' %error)
-                    return None
-            else:
-                print('Error! Data of %s is empty!' %sheet_name)
+            try:
+                for row in rows:
+                    # Modify：2018-1-17
+                    # 场景 topic 必须填写，问答 topic 可不填，若填写必须为 sheet_name
+                    topic = row.topic if row.topic else sheet_name
+				    # 3.Your processing function of excel data here
+                    self.add_qa(name=row.name, content=row.content, topic=topic, \
+                    tid=row.tid, behavior=row.behavior, parameter=row.parameter, \
+                    url=row.url, tag=row.tag, keywords=row.keywords, api=row.api, \
+                    txt=row.txt, img=row.img, button=row.button, \
+                    description=row.description, delimiter="|")
+                    # 添加到场景标签列表
+                    if topic:
+                        topics.append(topic)
+            except Exception as error:
+                print('Error: %s' %error)
                 return None
             # Modify in 2017.4.28
             # 若子表格名字不存在，新建配置子图，否则只修改topic属性
-            # DeprecationWarning: Graph.find_one is deprecated, use NodeSelector instead. 2017-5-18
-            # config_node = self.graph.find_one("Config", "name", sheet_name)
-            config_node = self.selector.select("Config", name=sheet_name).first()
-            if not config_node:
-                # 默认User类型节点已经存在了
-                self.graph.run('MATCH (user:User {userid: "' + self.user["userid"] + \
-                '"})\nCREATE (config:Config {name: "' + sheet_name + '", topic: "' + \
-                ",".join(set(topics)) + '"})\nCREATE (user)-[:has {bselected: 1, available: 1}]->(config)')
-            else:
-                # 追加并更新可用话题集
-                alltopics = config_node["topic"].split(",") if config_node["topic"] else []
-                alltopics.extend(topics)
-                config_node["topic"] = ",".join(set(alltopics))
-                self.graph.push(config_node)
+            self.merge_config(self.graph, sheet_name, topics)
+        self.bump_kb_version()
 
+    @traced()
+    def get_tags(self, questions, processes=None):
+        """Compute semantic tags of questions in a process pool.
+        在进程池中批量计算问题的语义标签。
+
+        Args:
+            questions: List of questions. 问题列表。
+            processes: Number of processes. 进程数。
+                Defaults to None represents the number of CPUs.
+        """
+        config = dict(self.user)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(get_tag, questions, repeat(config), chunksize=256))
+
+    @traced()
+    def bulk_create(self, nodes, label="NluCell", sheet_name=None, topics=(), \
+    batch_size=1000, processes=None):
+        """Create nodes in one transaction with batched UNWIND statements.
+        在一个事务中以批量 UNWIND 语句创建节点。
+
+        Tags of all nodes are computed first in a process pool. Then nodes are
+        written 'batch_size' at a time, and if 'sheet_name' is given the topics
+        of its Config node are updated in the same transaction. Nothing is
+        written if any statement fails.
+        先在进程池中计算所有节点的语义标签，再每次写入 'batch_size' 个节点；
+        若指定了 'sheet_name'，在同一事务中更新其 Config 节点的话题集。任一语句失败则全部不写入。
+
+        Args:
+            nodes: List of node property dicts without tag and digest.
+                不含语义标签和摘要的节点属性字典列表。
+            label: Label of nodes. 节点标签。
+            sheet_name: Name of Config node to update. 需要更新的 Config 节点名称。
+                Defaults to None.
+            topics: Topics to add to Config node. 追加到 Config 节点的话题。
+            batch_size: Nodes per UNWIND statement. 每条 UNWIND 语句写入的节点数。
+                Defaults to 1000.
+            processes: Number of processes to compute tags. 计算语义标签的进程数。
+                Defaults to None represents the number of CPUs.
+        """
+        tags = self.get_tags([node["name"] for node in nodes], processes)
+        for node, tag in zip(nodes, tags):
+            node["tag"] = tag
+            node["digest"] = row_digest(node)
+        name = sheet_name if sheet_name else "全部"
+        tx = self.graph.begin()
+        try:
+            for start in range(0, len(nodes), batch_size):
+                tx.run(cypher.CREATE_NODES.format(label=cypher.label(label)), \
+                    rows=nodes[start:start + batch_size])
+                # 发送本批语句，进度才是已写入的节点数
+                tx.process()
+                print("%s: %d/%d" % (name, min(start + batch_size, len(nodes)), len(nodes)))
+            if sheet_name:
+                self.merge_config(tx, sheet_name, topics)
+            tx.commit()
+        except:
+            tx.rollback()
+            raise
+
+    def merge_config(self, tx, sheet_name, topics):
+        """Add topics to Config node of sheet in transaction or graph.
+        在事务或图数据库中追加子表格 Config 节点的话题集。
+
+        若子表格名字不存在，新建配置子图并设为用户可用和已选择。
+        已有话题在同一事务中读取，不会丢失并发写入或本事务未提交的话题。
+        """
+        topic = tx.evaluate(cypher.CONFIG_TOPIC, name=sheet_name)
+        alltopics = topic.split(",") if topic else []
+        alltopics.extend(topics)
+        tx.run(cypher.MERGE_CONFIG, userid=self.user["userid"], name=sheet_name, \
+            topic=",".join(set(alltopics)))
+
+    @traced()
+    def sync_excel(self, filename=None, custom_sheets=[], batch_size=1000, processes=None):
+        """Synchronize knowledge base with excel, only changed rows are written.
+        将知识库与excel增量同步，只写入变更的行。
+
+        Every question of the workbook is hashed with 'row_digest' and
+        compared with the digest stored on NluCell nodes:
+        - same digest: unchanged, nothing is written;
+        - same name and topic but another digest: properties are updated in
+          place, so 'hot' and relationships are kept;
+        - otherwise: inserted.
+        Nodes left over are deleted. With 'custom_sheets' only nodes of the
+        topics in those sheets are deleted. All changes are written in one
+        transaction and semantic tags are only computed for written nodes.
+        工作簿中每个问题用 'row_digest' 计算摘要并与 NluCell 节点上保存的摘要比较：
+        摘要相同则不写入；问题与话题相同而摘要不同则原地更新属性，保留 'hot' 与关系；
+        否则新建。剩余的节点被删除，指定 'custom_sheets' 时只删除这些子表格话题下的节点。
+        所有变更在一个事务中写入，只为写入的节点计算语义标签。
+
+        Args:
+            filename: Full path of excel. excel文件完整路径。
+            custom_sheets: Sheets to synchronize. 要同步的子表格。
+                Defaults to [] represents all sheets.
+            batch_size: Nodes per UNWIND statement. 每条 UNWIND 语句写入的节点数。
+                Defaults to 1000.
+            processes: Number of processes to compute tags. 计算语义标签的进程数。
+                Defaults to None represents the number of CPUs.
+
+        Returns:
+            Dict of the number of inserted, updated, deleted and unchanged nodes.
+            新建、更新、删除及未变更的节点数。
+        """
+        assert filename is not None, "filename can not be None"
+        sheets, inserts, updates, stale, kept = diff_nodes(self.graph.run(cypher.NODE_DIGESTS), \
+            iter_excel(filename, QARow, custom_sheets), partial=bool(custom_sheets))
+        changed = inserts + [node for _, node in updates]
+        tags = self.get_tags([node["name"] for node in changed], processes) if changed else []
+        for node, tag in zip(changed, tags):
+            node["tag"] = tag
+        updates = [dict(nid=nid, props=node) for nid, node in updates]
+        tx = self.graph.begin()
+        try:
+            for start in range(0, len(inserts), batch_size):
+                tx.run(cypher.CREATE_NODES.format(label=cypher.label("NluCell")), \
+                    rows=inserts[start:start + batch_size])
+            for start in range(0, len(updates), batch_size):
+                tx.run(cypher.UPDATE_NODES, rows=updates[start:start + batch_size])
+            for start in range(0, len(stale), batch_size):
+                tx.run(cypher.DELETE_NODES, ids=stale[start:start + batch_size])
+            for sheet_name, topics in sheets.items():
+                self.merge_config(tx, sheet_name, topics)
+            tx.commit()
+        except:
+            tx.rollback()
+            raise
+        if changed or stale:
+            self.bump_kb_version()
+        result = dict(inserted=len(inserts), updated=len(updates), deleted=len(stale), \
+            unchanged=len(kept) - len(updates))
+        print("Sync %s: %s" % (filename, result))
+        return result
+
+    @traced()
+    def bulk_excel(self, filename=None, custom_sheets=[], batch_size=1000, processes=None):
+        """Bulk import data of excel, one transaction per sheet.
+        批量导入excel数据，每个子表格一个事务。
+
+        Same columns as 'handle_excel'. Call it under 'if __name__ == "__main__":'
+        on Windows because of the process pool.
+        与 'handle_excel' 的表格格式相同。因使用进程池，在 Windows 上需在
+        'if __name__ == "__main__":' 下调用。
+
+        Args:
+            filename: Full path of excel. excel文件完整路径。
+            custom_sheets: Sheets to import. 要导入的子表格。
+                Defaults to [] represents all sheets.
+            batch_size: Nodes per UNWIND statement. 每条 UNWIND 语句写入的节点数。
+                Defaults to 1000.
+            processes: Number of processes to compute tags. 计算语义标签的进程数。
+                Defaults to None represents the number of CPUs.
+        """
+        assert filename is not None, "filename can not be None"
+        # 可自定义要导入的子表格
+        for sheet_name, rows in iter_excel(filename, QARow, custom_sheets):
+            nodes = []
+            topics = []
+            for row in rows:
+                # 场景 topic 必须填写，问答 topic 可不填，若填写必须为 sheet_name
+                row = row._replace(topic=row.topic if row.topic else sheet_name)
+                # 问题不能为空，避免因知识库表格填写格式不对而导致存入空问答对
+                for question in row.name.split("|"):
+                    if question:
+                        nodes.append(dict(row._asdict(), name=question, hot="0"))
+                topics.append(row.topic)
+            self.bulk_create(nodes, sheet_name=sheet_name, topics=topics, \
+                batch_size=batch_size, processes=processes)
+        self.bump_kb_version()
+
+    @traced()
+    def bulk_txt(self, filename=None, batch_size=1000, processes=None):
+        """Bulk import text file of question and answer lines in one transaction.
+        在一个事务中批量导入问题与回答交替成行的文本文件。
+
+        Args:
+            filename: Full path of text file. 文本文件完整路径。
+            batch_size: Nodes per UNWIND statement. 每条 UNWIND 语句写入的节点数。
+                Defaults to 1000.
+            processes: Number of processes to compute tags. 计算语义标签的进程数。
+                Defaults to None represents the number of CPUs.
+        """
+        assert filename is not None, "filename can not be None!"
+        nodes = []
+        with open(filename, encoding="UTF-8") as file:
+            lines = [line.rstrip() for line in file]
+        for question, answer in zip(lines[0::2], lines[1::2]):
+            if not question:
+                break
+            for item in question.split("|"):
+                if item:
+                    node = dict.fromkeys(qa_columns, "")
+                    node.update(name=item, content=answer, hot="0")
+                    nodes.append(node)
+        self.bulk_create(nodes, batch_size=batch_size, processes=processes)
+        self.bump_kb_version()
+
+    @traced()
     def handle_txt(self, filename=None):
         """
         Processing text file to generate subgraph.
@@ -250,69 +473,55 @@ class Database():
                 print("answer: " + answer)
                 self.add_qa(name=question, content=answer, delimiter="|")
                 question = file.readline().rstrip()
+        self.bump_kb_version()
 
     def get_available_kb(self):
         kb = []
-        match_str = "MATCH (user:User {userid: '" + self.user['userid'] + "'})\
-            -[r:has {available:1}]->(config:Config) RETURN config.name as name"
-        for item in self.graph.run(match_str):
+        for item in self.graph.run(cypher.AVAILABLE_CONFIGS, userid=self.user['userid']):
             kb.append(item['name'])
         return kb
     
     def get_selected_kb(self):
         kb = []
-        match_str = "MATCH (user:User {userid: '" + self.user['userid'] + "'})\
-            -[r:has {bselected:1, available:1}]->(config:Config) RETURN config.name as name"
-        for item in self.graph.run(match_str):
-            kb.append(item['name'])
+        for item in self.graph.run(cypher.SELECTED_CONFIGS, userid=self.user['userid']):
+            kb.append(item['config']['name'])
         return kb
 
+    @traced()
     def download(self, filename=None, names=[]):
         """下载知识库
+
+        All nodes are read by one query over the topics of Config 'names' and
+        streamed to the excel writer sheet by sheet.
+        用一条查询读取 'names' 对应 Config 话题下的所有节点，并按子表格流式写入excel。
         """
         assert filename is not None, "Filename must be *.xls!"
         assert names is not [], "Subgraph names can not be empty!"
-        cypher_info = "MATCH (n:NluCell) WHERE n.topic='{topic}' RETURN n"
-        # Modify：使键值按照指定顺序导出 excel (2018-1-8)
-        info = [('name', '问题'), ('content', '回答'), ('topic', '场景标签'), ('tid', '场景ID'), 
-            ('behavior', '行为'), ('parameter', '动作参数'), ('url', '资源'), ('tag', '语义标签'),
-            ('keywords', '关键词'), ('api', '内置功能'), ('txt', '显示文本'), ('img', '显示图片'),
-            ('button', '显示按钮'), ('description', '场景描述'), ("hot", '搜索热度')]
-        # Modify：若采用字典，可用如下方案(2018-1-9)
-        # import collections
-        # info = collections.OrderedDict(info)
-        sheets = []
-        
-        for name in names:
-            subgraph = self.selector.select('Config', name=name).first()
-            topics = subgraph["topic"].split(",") if subgraph else []
-            items = []
-            for topic in topics:
-                match_str = cypher_info.format(topic=topic)
-                item = list(self.graph.run(match_str).data())
-                items.extend(item)
-            sheets.append({"name": name, "info": info, "items": items})
-            
-        write_excel(filename=filename, sheets=sheets)
-        
+        names = list(OrderedDict.fromkeys(names))
+        cursor = self.graph.run(cypher.EXPORT_NODES, names=names)
+        groups = groupby(cursor, key=lambda record: record["name"])
+
+        def sheets():
+            # 查询结果按 names 的顺序分组，没有节点的子表格只写表头
+            name, items = next(groups, (None, ()))
+            for sheet_name in names:
+                if name == sheet_name:
+                    yield {"name": sheet_name, "info": export_columns, "items": items}
+                    name, items = next(groups, (None, ()))
+                else:
+                    yield {"name": sheet_name, "info": export_columns, "items": ()}
+
+        write_excel(filename=filename, sheets=sheets(), reserved=names)
+
     def download_scene(self, label="NluCell", filename=None, topic=''):
         """Match scene and download.
         """
         assert filename is not None, "Filename must be *.xls!"
         assert topic is not '', "Topic can not be ''!"
-        info = [('name', '问题'), ('content', '回答'), ('topic', '场景标签'), ('tid', '场景ID'), 
-            ('behavior', '行为'), ('parameter', '动作参数'), ('url', '资源'), ('tag', '语义标签'),
-            ('keywords', '关键词'), ('api', '内置功能'), ('txt', '显示文本'), ('img', '显示图片'),
-            ('button', '显示按钮'), ('description', '场景描述'), ("hot", '搜索热度')]
-        cypher_info = "MATCH (n:{label}) WHERE n.topic='{topic}' RETURN n"
-        match_str = cypher_info.format(label=label, topic=topic)
-        
-        config_info = "MATCH (n:Config) WHERE n.topic contains '{topic}' RETURN n.name as name"
-        config = self.graph.run(config_info.format(topic=topic)).data()
-        name = list(config)[0]['name'] if config else "业务场景"
-        
-        items = list(self.graph.run(match_str).data())
-        sheets = [{"name": name, "info": info, "items": items}]
+        config = self.graph.run(cypher.SCENE_CONFIG, topic=topic).data()
+        name = config[0]['name'] if config else "业务场景"
+        items = self.graph.run(cypher.TOPIC_NODES.format(label=cypher.label(label)), topic=topic)
+        sheets = [{"name": name, "info": export_columns, "items": items}]
         write_excel(filename=filename, sheets=sheets)
     
     def upload(self, pattern='qa', names=[]):
@@ -329,15 +538,9 @@ class Database():
         """Generating test cases from data of excel.
         
         custom_sheets 选择的子表格集合
+        同时将场景根节点（tid 为 0）的问题写入 scene.txt，供压力测试开始场景漫游。
         """
         assert filename is not None, "filename can not be None"
-        data = read_excel(filename) # 读取已有excel-知识库
-        data_sheets = data.sheet_names()
-        if custom_sheets:
-            sheet_names = list(set(data_sheets).intersection(set(custom_sheets)))
-        else:
-            sheet_names = data_sheets
-            
         file = xlwt.Workbook() # 创建新excel-测试用例
         new_sheet = file.add_sheet("NluTest", cell_overwrite_ok=True) # 创建sheet
         keys = ["问题", "答案", "是否通过", "改进建议"]
@@ -345,40 +548,28 @@ class Database():
         new_sheet.write(0, 0, "本地语义常见命令问答测试", set_excel_style('Arial Black', 220, True))
         for col, key in enumerate(keys):
             new_sheet.write(1, col, key, set_excel_style('Arial Black', 220, True))
-        count = 0
         testlist = []
-        # 生成内容       
-        for sheet_name in sheet_names:
-            table = data.sheet_by_name(sheet_name)
-            # 1.Select specified table
-            # table = data.sheet_by_index(0)
-            if data:
-                # 2.Select specified column
-                col_format = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N']
-                try:
-                    nrows = table.nrows
-                    # ncols = table.ncols
-                    str_upcase = [i for i in string.ascii_uppercase]
-                    i_upcase = range(len(str_upcase))
-                    ncols_dir = dict(zip(str_upcase, i_upcase))
-                    col_index = [ncols_dir.get(i) for i in col_format]
-                    # 前两行为表头
-                    for i in range(2, nrows):
-                        name = table.cell(i, col_index[0]).value
-                        content = table.cell(i, col_index[1]).value
-                        questions = name.format(**self.user).split("|")
-                        answers = content.format(**self.user).split("|")
-                        testlist.extend(questions)
-                        new_sheet.write(i+count, 0, "\n".join(questions))
-                        new_sheet.write(i+count, 1, "\n".join(answers))
-                    count += nrows - 2
-                except Exception as error:
-                    print('Error: %s' %error)
-                    return None
-            else:
-                print('Error! Data of %s is empty!' %sheet_name)
+        scenelist = []
+        # 生成内容，前两行为表头
+        index = 2
+        for sheet_name, rows in iter_excel(filename, QARow, custom_sheets):
+            try:
+                for row in rows:
+                    questions = row.name.format(**self.user).split("|")
+                    answers = row.content.format(**self.user).split("|")
+                    testlist.extend(questions)
+                    if str(row.tid).strip() in ("0", "0.0"):
+                        scenelist.extend(questions)
+                    new_sheet.write(index, 0, "\n".join(questions))
+                    new_sheet.write(index, 1, "\n".join(answers))
+                    index += 1
+            except Exception as error:
+                print('Error: %s' %error)
                 return None
         file.save(savedir + "/testcase.xls") # 保存文件
         with open(savedir + "/testcase.txt", 'w', encoding="UTF-8") as newfile:
             for item in testlist:
                 newfile.write(item + "\n")
+        with open(savedir + "/scene.txt", 'w', encoding="UTF-8") as newfile:
+            for item in scenelist:
+                newfile.write(item + "\n")
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""download
+
+Resumable concurrent file downloader. 可断点续传的并发文件下载器。
+
+Files are downloaded to '<filename>.part' with large buffered reads. After a
+network error the download is retried from where it stopped with an HTTP
+Range request, and the partial file is kept across restarts. A size or md5
+mismatch is not retried: the partial file is removed and DownloadError is
+raised at once. A finished file is verified by size and optional md5, then
+atomically renamed into place, so an existing file is always complete. At
+most 'workers' files are downloaded at the same time, the rest wait in
+queue, and requesting the same file twice shares one download.
+文件以大块缓冲读取下载到 '<filename>.part'。网络错误后用 HTTP Range 请求从中断处重试，
+部分文件在重启后仍保留。大小或 md5 不符时不重试，删除部分文件并立即抛出
+DownloadError。下载完成的文件经大小与可选的 md5 校验后原子重命名，
+因此已存在的文件总是完整的。同时下载的文件数不超过 'workers'，其余排队等待，
+重复请求同一文件时共享一次下载。
+
+Available classes:
+- DownloadError: Download failed. 下载失败。
+- Downloader: Resumable concurrent downloader. 可断点续传的并发下载器。
+
+Usage:
+    downloader = Downloader("music", workers=4)
+    futures = [downloader.submit(song["url"], song["title"] + ".mp3", size=song["file_size"])
+        for song in songs]
+"""
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from .httpclient import HttpClient
+
+
+class DownloadError(Exception):
+    """Download failed. 下载失败。
+    """
+    pass
+
+
+def file_md5(path, block_size=1024 * 1024):
+    """Md5 hex digest of file. 文件的 md5 摘要。
+    """
+    md5 = hashlib.md5()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class Downloader():
+    """Resumable concurrent downloader. 可断点续传的并发下载器。
+
+    Public attributes:
+    - directory: Directory of downloaded files. 下载文件目录。
+    - block_size: Bytes per read. 每次读取的字节数。
+    - timeout: Seconds or (connect, read) seconds of requests. 请求超时秒数。
+    - retries: Retries after network errors. 网络错误后的重试次数。
+    """
+    def __init__(self, directory=".", workers=4, block_size=256 * 1024, timeout=(5, 30), \
+        retries=3, client=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.block_size = block_size
+        self.timeout = timeout
+        self.retries = retries
+        self.client = client if client else HttpClient(pool_maxsize=workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit(self, url, filename, size=None, md5=None):
+        """Queue download of url, see 'download'. 将下载加入队列，参见 'download'。
+
+        Returns:
+            Future of path of downloaded file. 下载文件路径的 Future。
+        """
+        path = os.path.join(self.directory, filename)
+        with self.lock:
+            future = self.pending.get(path)
+            if future is None:
+                future = self.executor.submit(self.download, url, filename, size, md5)
+                self.pending[path] = future
+                future.add_done_callback(lambda _: self.done(path))
+            return future
+
+    def done(self, path):
+        """Forget finished download of path. 移除已结束的下载。
+        """
+        with self.lock:
+            self.pending.pop(path, None)
+
+    def download(self, url, filename, size=None, md5=None):
+        """Download url to file in directory, resuming a partial download.
+        将 url 下载到目录中的文件，续传已下载的部分。
+
+        Args:
+            url: File url. 文件地址。
+            filename: File name in directory. 目录中的文件名。
+            size: Expected size in bytes. 预期字节数。
+                Defaults to None represents Content-Length of response.
+            md5: Expected md5 hex digest. 预期 md5 摘要。
+                Defaults to None represents no md5 check.
+
+        Returns:
+            Path of downloaded file. 下载文件路径。
+
+        Raises:
+            DownloadError: Retries after network errors are exhausted, or size
+                or md5 does not match, which is not retried.
+                网络错误后重试次数用尽，或大小、md5 不符（不重试）。
+        """
+        path = os.path.join(self.directory, filename)
+        if os.path.exists(path) and (size is None or os.path.getsize(path) == size):
+            return path
+        part = path + ".part"
+        for attempt in range(self.retries + 1):
+            try:
+                total = self.fetch(url, part, size)
+                break
+            except (requests.RequestException, OSError) as error:
+                print("Download %s failed (%d/%d): %s" % (filename, attempt + 1, \
+                    self.retries + 1, error))
+                if attempt == self.retries:
+                    raise DownloadError("Failed to download %s from %s" % (filename, url))
+                time.sleep(min(2 ** attempt, 10))
+        if os.path.getsize(part) != total or (md5 and file_md5(part) != md5):
+            # 内容与预期不符，不可续传
+            os.remove(part)
+            raise DownloadError("Verification failed: %s" % filename)
+        os.replace(part, path)
+        return path
+
+    def fetch(self, url, part, size=None):
+        """Download url to partial file from its current end.
+        从部分文件的当前末尾继续下载。
+
+        Returns:
+            Total size of file. 文件总字节数。
+
+        Raises:
+            requests.RequestException, OSError: Network error, retryable.
+                网络错误，可重试。
+            DownloadError: Size of file is not 'size'. 文件大小与 'size' 不符。
+        """
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if size is not None and offset == size:
+            return size
+        headers = {"Range": "bytes=%d-" % offset} if offset else {}
+        with self.client.session.get(url, headers=headers, stream=True, \
+            timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # 部分文件超出服务器文件长度，删除后由重试重新下载
+                os.remove(part)
+            response.raise_for_status()
+            if response.status_code == 206:
+                total = int(response.headers["Content-Range"].rsplit("/", 1)[1])
+            else:
+                # 服务器不支持 Range，从头下载
+                offset = 0
+                length = response.headers.get("Content-Length")
+                total = int(length) if length else size
+            if size is not None and total is not None and total != size:
+                # 服务器文件与预期不符，重试也不会成功
+                if os.path.exists(part):
+                    os.remove(part)
+                raise DownloadError("Size %s of %s is not %d" % (total, url, size))
+            with open(part, "ab" if offset else "wb", buffering=self.block_size) as file:
+                for block in response.iter_content(self.block_size):
+                    file.write(block)
+        if total is None:
+            total = os.path.getsize(part)
+        if os.path.getsize(part) < total:
+            raise ConnectionError("Connection closed at %d of %d" % (os.path.getsize(part), total))
+        return total
+
+    def close(self, wait=True):
+        """Stop accepting downloads and close connections.
+        停止接受下载并关闭连接。
+        """
+        self.executor.shutdown(wait=wait)
+        self.client.close()
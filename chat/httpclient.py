@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""httpclient
+
+Shared HTTP layer of online apis. 在线 api 共享的 HTTP 层。
+
+All online apis share one requests.Session, so connections to the same host
+are pooled and kept alive. Every endpoint has its own timeout and circuit
+breaker: after 'failures' consecutive errors the breaker opens and calls
+return the fallback at once for 'reset_timeout' seconds, then one trial call
+is let through. Responses can be cached in a TTLCache by a caller supplied
+key. A slow or dead upstream therefore costs a server thread at most one
+timeout per 'reset_timeout', not one per request.
+所有在线 api 共享一个 requests.Session，同一主机的连接被复用并保持。每个端点有各自的超时与熔断器：
+连续失败 'failures' 次后熔断器打开，'reset_timeout' 秒内的调用直接返回降级值，之后放行一次试探调用。
+响应可按调用方给出的键缓存在 TTLCache 中。因此上游变慢或不可用时，
+每 'reset_timeout' 秒最多占用服务器线程一次超时，而不是每个请求一次。
+
+Available classes:
+- CircuitBreaker: Consecutive failure circuit breaker. 连续失败熔断器。
+- Endpoint: Online api endpoint. 在线 api 端点。
+- HttpClient: Pooled HTTP client. 连接池 HTTP 客户端。
+
+Usage:
+    client = HttpClient(pool_maxsize=16)
+    tuling = Endpoint("tuling", "http://www.tuling123.com/openapi/api", timeout=3.0)
+    answer = client.request(tuling, data=data, fallback=None)
+"""
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .cache import TTLCache
+from .trace import span
+
+MISSING = object()
+
+
+class CircuitBreaker():
+    """Consecutive failure circuit breaker. 连续失败熔断器。
+
+    Public attributes:
+    - failures: Consecutive failures to open. 打开熔断器的连续失败次数。
+    - reset_timeout: Seconds to stay open before a trial call. 打开后到放行试探调用的秒数。
+    - state: 'closed', 'open' or 'half-open'. 熔断器状态。
+    """
+    def __init__(self, failures=5, reset_timeout=30.0, timer=time.monotonic):
+        assert failures > 0, "failures must be positive."
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.state = "closed"
+        self.count = 0
+        self.opened = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go to upstream. 是否允许调用上游。
+
+        Only one trial call is let through in half-open state.
+        半开状态下只放行一次试探调用。
+        """
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.timer() - self.opened >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            return False
+
+    def success(self):
+        """Record a successful call. 记录一次成功调用。
+        """
+        with self.lock:
+            self.state = "closed"
+            self.count = 0
+
+    def failure(self):
+        """Record a failed call. 记录一次失败调用。
+        """
+        with self.lock:
+            self.count += 1
+            if self.state == "half-open" or self.count >= self.failures:
+                self.state = "open"
+                self.opened = self.timer()
+
+
+class Endpoint():
+    """Online api endpoint. 在线 api 端点。
+
+    Public attributes:
+    - name: Endpoint name used in traces. 追踪中使用的端点名称。
+    - url: Request url. 请求地址。
+    - method: HTTP method. 请求方法。
+    - timeout: Seconds or (connect, read) seconds. 超时秒数或 (连接, 读取) 秒数。
+    - breaker: CircuitBreaker of endpoint. 端点的熔断器。
+    - cache: TTLCache of parsed responses or None. 解析后响应的 TTLCache 或 None。
+    """
+    def __init__(self, name, url, method="POST", timeout=5.0, breaker=None, cache=None):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.timeout = timeout
+        self.breaker = breaker if breaker else CircuitBreaker()
+        self.cache = cache
+
+
+class HttpClient():
+    """Pooled HTTP client. 连接池 HTTP 客户端。
+
+    Public attributes:
+    - session: Shared requests.Session. 共享的 requests.Session。
+    """
+    def __init__(self, pool_connections=8, pool_maxsize=16):
+        self.session = requests.Session()
+        # 不自动重试：超时与重试由端点超时和熔断器控制
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, \
+            max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, endpoint, params=None, data=None, cache_key=None, fallback=None, \
+        parse="json", stream=False):
+        """Request endpoint with cache, timeout and circuit breaker.
+        经缓存、超时与熔断器请求端点。
+
+        Args:
+            endpoint: Endpoint to request. 请求的端点。
+            params: Query string parameters. 查询参数。
+            data: Form data. 表单数据。
+            cache_key: Key of endpoint cache, None to skip cache.
+                端点缓存的键，为 None 时不使用缓存。
+            fallback: Returned if the breaker is open or the request fails.
+                熔断器打开或请求失败时的返回值。
+            parse: 'json' to parse response as json, 'text', 'content', or
+                None to return the response. 'json' 解析为 json，'text'，'content'，
+                或 None 返回响应对象。
+            stream: Do not read the response body at once. 不立即读取响应体。
+
+        Returns:
+            Parsed response or fallback. 解析后的响应或降级值。
+        """
+        if cache_key is not None and endpoint.cache is not None:
+            value = endpoint.cache.get(cache_key, MISSING)
+            if value is not MISSING:
+                return value
+        if not endpoint.breaker.allow():
+            return fallback
+        try:
+            with span("http." + endpoint.name):
+                response = self.session.request(endpoint.method, endpoint.url, params=params, \
+                    data=data, timeout=endpoint.timeout, stream=stream)
+                response.raise_for_status()
+                if parse == "json":
+                    value = response.json()
+                elif parse:
+                    value = getattr(response, parse)
+                else:
+                    value = response
+        except (requests.RequestException, ValueError) as error:
+            print("%s request failed: %s" % (endpoint.name, error))
+            endpoint.breaker.failure()
+            return fallback
+        endpoint.breaker.success()
+        if cache_key is not None and endpoint.cache is not None:
+            endpoint.cache.set(cache_key, value)
+        return value
+
+    def close(self):
+        """Close pooled connections. 关闭连接池中的连接。
+        """
+        self.session.close()
@@ -1,41 +1,62 @@
 # -*- coding:utf8 -*-
+# PEP 8 check with Pylint
+"""ianswer
+
+Render answers of scene nodes as xml for the kiosk client.
+将场景节点的回答渲染为终端客户端使用的 xml。
+
+The xml of a scene node depends only on the node apart from the timestamp
+and the spoken content, which is chosen at random among alternatives. The
+rest is pre-rendered once per node into fragments cached by node id and
+knowledge base version, so a request only joins the fragments with its
+timestamp and content instead of parsing the button and img json again.
+场景节点的 xml 除时间戳和随机选取的回答内容外只取决于节点本身。其余部分按节点预先渲染为片段，
+以节点 id 和知识库版本为键缓存，每次请求只需将片段与时间戳和回答内容拼接，无需再解析 button 和 img json。
+
+Available functions:
+- render_fragments: Render fragments of scene xml. 渲染场景 xml 片段。
+- answer2xml: Convert answer to the result of nlu server. 将回答转换为语义服务器的返回结果。
+"""
 import os
 import json
+from .cache import LRUCache
+from .config import config
 from .mytools import get_timestamp
 
 thispath = os.path.split(os.path.realpath(__file__))[0]
 with open(thispath + '/data/answer.xml', 'r', encoding="UTF-8") as file:
     answer = file.read()
 
+# 模板切分为：head + 时间戳 + middle + 回答内容 + tail
+head, rest = answer.split('{timestamp}')
+head = head.format()
+middle, tail = rest.split('{content}')
+
 item = '''<item><Title><![CDATA[]]></Title><Description><![CDATA[]]></Description><PicUrl><![CDATA[{img_url}]]></PicUrl><Url><![CDATA[]]></Url></item>'''
 
-def answer2xml(data):
+# 场景 xml 片段缓存：(节点 id, 知识库快照版本) -> (button, img, context, middle, tail)
+fragment_cache = LRUCache(maxsize=config.getint("cache", "xml_maxsize", fallback=4096, minimum=1))
+
+def render_fragments(data):
+    """Render fragments of scene xml around timestamp and content.
+    渲染场景 xml 中时间戳与回答内容之外的片段。
+
+    Args:
+        data: Answer with button, img and context. 含 button，img 及 context 的回答。
+
+    Returns:
+        Tuple of the fragments between timestamp and content and after content.
+        时间戳与回答内容之间的片段及回答内容之后的片段。
+    """
     previous = '0'
     next = '0'
     buttons = ''
     imgs = ''
     img_urls = []
     items = ''
-    result = {
-        # ===========================原接口==============================
-        "question": data['question'],
-        "content": data['content'],
-        "context": data['context'],
-        "url": data['url'],
-        "behavior": data['behavior'],
-        "parameter": data['parameter'],
-        # ===========================新扩展==============================
-        "picurl": ""
-    }
-    # 对于无按钮图片的场景节点和问答节点，"picurl" 直接返回 "" 而不是格式化为 xml.
-    # Modify：2018-1-8
-    if data['button'] == '' and data['img'] == '':
-        return result
-
     if data['button'] != '':
         button = json.loads(data['button'])
         button_names = [item['content'] for item in button['area'].values()]
-        button_tids = [item['url'] for item in button['area'].values()]
         if button_names:
             buttons = ('|'.join(button_names) + '|')
         if button['previous']:
@@ -46,18 +67,14 @@ def answer2xml(data):
         img = json.loads(data['img'])
         img_urls = [item['iurl'] for item in img.values()]
         img_names = [item['content'] for item in img.values()]
-        img_tids = [item['url'] for item in img.values()]
         if img_names:
             imgs = '|'.join(img_names)
         if len(img_urls) > 1:
             xml_items = [item.format(img_url=url) for url in img_urls[1:]]
             items = '\n'.join(xml_items)
-    
-    result['picurl'] = answer.format(
-        timestamp=str(get_timestamp()),
+    fields = dict(
         news='news',
         article_count=str(len(img_urls)),
-        content=data['content'],
         context=data['context'],
         previous=previous,
         buttons=buttons,
@@ -66,5 +83,42 @@ def answer2xml(data):
         img_url=img_urls[0] if img_urls else '',
         items=items
     )
+    return middle.format(**fields), tail.format(**fields)
+
+def answer2xml(data, version=None):
+    """Convert answer to the result of nlu server, scene answers as xml.
+    将回答转换为语义服务器的返回结果，场景回答渲染为 xml。
+
+    Args:
+        data: Answer of 'Robot.search'. 'Robot.search' 的回答。
+        version: Version of knowledge base snapshot that answered, fragments
+            are cached only if given. 给出回答的知识库快照版本，给出时才缓存片段。
+            Defaults to None.
+    """
+    result = {
+        # ===========================原接口==============================
+        "question": data['question'],
+        "content": data['content'],
+        "context": data['context'],
+        "url": data['url'],
+        "behavior": data['behavior'],
+        "parameter": data['parameter'],
+        # ===========================新扩展==============================
+        "picurl": ""
+    }
+    # 对于无按钮图片的场景节点和问答节点，"picurl" 直接返回 "" 而不是格式化为 xml.
+    # Modify：2018-1-8
+    if data['button'] == '' and data['img'] == '':
+        return result
+
+    nid = data.get('nid')
+    key = (nid, version)
+    entry = fragment_cache.get(key) if nid is not None and version is not None else None
+    # 场景下一步等从存储后端取得的节点 id 可能与快照不同，校验片段来源
+    if entry is None or entry[:3] != (data['button'], data['img'], data['context']):
+        entry = (data['button'], data['img'], data['context']) + render_fragments(data)
+        if nid is not None and version is not None:
+            fragment_cache.set(key, entry)
+    result['picurl'] = ''.join((head, str(get_timestamp()), entry[3], data['content'], entry[4]))
     result['content'] = "" # Modify：场景中要说的话放到 picurl 中。(2018-1-8)
     return result
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""kb
+
+In-memory snapshot of NLU knowledge base.
+语义知识库内存快照。
+
+Robot searches a KnowledgeBase instead of querying graph database for every
+request. A new snapshot can be loaded in background and swapped in, requests
+that hold the old snapshot finish on it. A KnowledgeBase is loaded from a
+store, or from a precompiled snapshot file, see 'chat.snapshot'.
+机器人从内存快照而不是每次请求都查询图数据库。新快照可在后台加载后替换，
+持有旧快照的请求仍在旧快照上完成。知识库快照从存储后端或预编译的快照文件加载。
+
+Available classes:
+- KnowledgeBase: In-memory knowledge base with tag index. 带语义标签索引的内存知识库。
+"""
+import itertools
+from collections import defaultdict
+
+# 每次加载快照都分配新的版本号，用于缓存失效
+_versions = itertools.count(1)
+# NluCell 节点属性
+FIELDS = ('name', 'content', 'topic', 'tid', 'behavior', 'parameter', 'url', 'tag', \
+    'keywords', 'api', 'txt', 'img', 'button', 'description', 'hot')
+# 导出excel的列：(节点属性, 表头)
+# Modify：使键值按照指定顺序导出 excel (2018-1-8)
+export_columns = [('name', '问题'), ('content', '回答'), ('topic', '场景标签'), ('tid', '场景ID'), 
+    ('behavior', '行为'), ('parameter', '动作参数'), ('url', '资源'), ('tag', '语义标签'),
+    ('keywords', '关键词'), ('api', '内置功能'), ('txt', '显示文本'), ('img', '显示图片'),
+    ('button', '显示按钮'), ('description', '场景描述'), ("hot", '搜索热度')]
+
+
+class KnowledgeBase():
+    """In-memory knowledge base with tag index.
+    带语义标签索引的内存知识库。
+
+    Nodes are plain dicts of NluCell properties with an extra key 'nid',
+    the id of node in database. Nodes of a compiled snapshot may also carry
+    'vector', the precomputed synonym vector of question.
+    节点为 NluCell 属性字典，额外的 'nid' 为节点在数据库中的 id。
+    预编译快照的节点还可能带有 'vector'，即预先计算的问题同义词向量。
+
+    Public attributes:
+    - version: Unique version of this snapshot. 快照版本号。
+    - nodes: Mapping of nid to node. 节点 id 到节点的映射。
+    - tags: Dict of semantic tag to nid list. 语义标签到节点 id 列表的索引。
+    - automaton: Key sentence automaton of node questions, None to search
+        key sentences in store. 节点问题的关键句自动机，为 None 时在存储后端中查找关键句。
+    """
+    def __init__(self, nodes=(), tags=None, automaton=None):
+        self.version = next(_versions)
+        self.automaton = automaton
+        if tags is not None:
+            # 预编译快照：节点映射与索引已构建好
+            self.nodes = nodes
+            self.tags = tags
+            return
+        self.nodes = {}
+        self.tags = defaultdict(list)
+        for node in nodes:
+            self.nodes[node["nid"]] = node
+            self.tags[node["tag"]].append(node["nid"])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_store(cls, store):
+        """Load all NluCell nodes from store, see 'chat.store'.
+        从存储后端加载所有 NluCell 节点。
+        """
+        return cls(store.nodes())
+
+    def find(self, tag):
+        """Get nodes with semantic tag. 获取指定语义标签的节点。
+        """
+        return [self.nodes[nid] for nid in self.tags.get(tag, ())]
+
+    def node(self, nid):
+        """Get node by id. 根据 id 获取节点。
+        """
+        return self.nodes.get(nid)
+
+    def key_sentence(self, question, topics):
+        """Get a node of topics whose question is contained in 'question'
+        with the key sentence automaton.
+        用关键句自动机获取话题中问题被 'question' 包含的一个知识节点。
+        """
+        topics = set(topics)
+        for nid in self.automaton.search(question):
+            node = self.nodes[nid]
+            if node["topic"] in topics:
+                return node
+        return None
+
+    def retag(self, get_tag):
+        """Copy knowledge base with tags recomputed by 'get_tag(node)'.
+        复制知识库并用 'get_tag(node)' 重新计算语义标签。
+
+        Precomputed synonym vectors depend on word tables too, so they are
+        dropped. The key sentence automaton is kept.
+        预先计算的同义词向量同样依赖词表，因此被丢弃；关键句自动机保留。
+        """
+        nodes = [dict(node, tag=get_tag(node), vector=None) for node in self.nodes.values()]
+        return KnowledgeBase(nodes, automaton=self.automaton)
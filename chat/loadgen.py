@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""loadgen
+
+Open-loop load generator for nlu server. 语义服务器开环压力测试工具。
+
+Questions replayed from logs are sent at a target arrival rate whatever the
+server answers, so a slow server builds up a queue just like real devices.
+Latency is measured from the intended send time of each request rather than
+from the actual send time, which corrects coordinated omission.
+从日志回放的问题按目标到达率发送，与服务器响应速度无关，服务器变慢时请求会像真实
+设备一样排队。延迟从每个请求的计划发送时间开始计算而不是实际发送时间，
+以修正协同遗漏（coordinated omission）。
+
+Available functions:
+- read_questions: Read questions from test case file or logs. 从测试用例或日志读取问题。
+- schedule: Generate requests of simulated users. 生成模拟用户的请求序列。
+- run: Replay requests at target rate and report latency. 按目标速率回放请求并统计延迟。
+"""
+import re
+import json
+import time
+import random
+import asyncio
+from .aioclient import AsyncClient
+from .mytools import latency_summary
+
+# 服务器日志中每条记录以时间开头
+log_time = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+# 场景漫游使用的指令
+cmd_walk = ["下一步", "上一步"]
+cmd_exit = "退出"
+
+
+def read_questions(filename, pattern="txt"):
+    """Read questions from test case file or logs.
+    从测试用例或日志读取问题。
+
+    Args:
+        filename: Full path of file. 文件完整路径。
+        pattern: 'txt' for one question per line, such as testcase.txt of
+            'Database.generate_testcases' and the do_not_know log; 'log' for
+            the server log. 'txt' 为每行一个问题，例如 'Database.generate_testcases'
+            生成的 testcase.txt 和 do_not_know 日志；'log' 为服务器日志。
+            Defaults to "txt".
+
+    Returns:
+        List of questions. 问题列表。
+    """
+    with open(filename, 'r', encoding="UTF-8") as file:
+        lines = [line.rstrip("\n") for line in file]
+    if pattern == "txt":
+        return [line.strip() for line in lines if line.strip()]
+    # 服务器日志：时间，问题，之后是以 "question: " 开头的回答字段；配置等其他记录跳过
+    questions = []
+    for i in range(len(lines) - 2):
+        if log_time.match(lines[i]) and lines[i + 2].startswith("question: "):
+            questions.append(lines[i + 1])
+    return questions
+
+def schedule(questions, number=1000, userids=None, scene_ratio=0.1, walk_steps=3, roots=None):
+    """Generate requests of simulated users.
+    生成模拟用户的请求序列。
+
+    Every request is a question picked at random for a user picked at random
+    from 'userids'. The users must exist in the store, the server cannot
+    answer unknown userids. With
+    probability 'scene_ratio' the user starts a scene walk instead: a scene
+    root question picked from 'roots', then up to 'walk_steps' next/previous
+    commands and exit. Without 'roots' a random question starts the walk, so
+    most walks never enter a scene and only exercise the unmatched commands.
+    每个请求为从 'userids' 中随机选取的用户随机选取的问题。用户必须已存在于存储后端，
+    服务器无法回答未知用户的请求。以 'scene_ratio' 的概率改为开始场景漫游：
+    从 'roots' 中选取场景根问题，随后发送最多 'walk_steps' 个上一步/下一步指令并退出场景。
+    未给出 'roots' 时以随机问题开始漫游，大多数漫游不会进入场景，只测试未匹配的指令。
+
+    Args:
+        questions: List of questions. 问题列表。
+        number: Number of requests. 请求总数。
+            Defaults to 1000.
+        userids: Userids of existing users. 已存在用户的 userid 列表。
+            Defaults to None represents ["A0001"].
+        scene_ratio: Probability of scene walk. 场景漫游的概率。
+            Defaults to 0.1.
+        walk_steps: Max next/previous commands of a walk. 场景漫游的最大步数。
+            Defaults to 3.
+        roots: Scene root questions, such as scene.txt of
+            'Database.generate_testcases'. 场景根问题，例如 'Database.generate_testcases'
+            生成的 scene.txt。
+            Defaults to None represents random questions.
+
+    Returns:
+        List of (userid, question). 请求列表。
+    """
+    assert questions, "questions can not be empty."
+    userids = list(userids) if userids else ["A0001"]
+    requests = []
+    while len(requests) < number:
+        userid = random.choice(userids)
+        if random.random() >= scene_ratio:
+            requests.append((userid, random.choice(questions)))
+        else:
+            requests.append((userid, random.choice(roots if roots else questions)))
+            for _ in range(random.randint(1, walk_steps)):
+                requests.append((userid, random.choice(cmd_walk)))
+            requests.append((userid, cmd_exit))
+    return requests[:number]
+
+async def replay(requests, rate, client, poisson=True):
+    """Send requests at target arrival rate. 按目标到达率发送请求。
+
+    Returns:
+        List of (intended, sent, done, error) times from time.perf_counter().
+        计划发送时间、实际发送时间、完成时间及错误信息的列表。
+    """
+    records = []
+
+    async def send(intended, userid, question):
+        sent = time.perf_counter()
+        error = ""
+        try:
+            await client.match(question=question, userid=userid)
+        except Exception as exc:
+            error = repr(exc)
+        records.append((intended, sent, time.perf_counter(), error))
+
+    tasks = []
+    intended = time.perf_counter()
+    for userid, question in requests:
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(intended, userid, question)))
+        # 开环：下一个请求的计划发送时间只取决于到达率
+        intended += random.expovariate(rate) if poisson else 1.0 / rate
+    await asyncio.gather(*tasks)
+    return records
+
+def run(filename, pattern="txt", rate=100.0, number=1000, userids=None, scene_ratio=0.1, \
+    connections=32, poisson=True, host="localhost", port=7000, scene_filename=None):
+    """Replay questions at target rate and report latency.
+    按目标速率回放问题并统计延迟。
+
+    Args:
+        filename: Question source file. 问题来源文件。
+        pattern: Pattern of source file, see 'read_questions'. 来源文件格式。
+            Defaults to "txt".
+        rate: Target arrival rate per second. 目标到达率（请求/秒）。
+            Defaults to 100.0.
+        number: Number of requests. 请求总数。
+            Defaults to 1000.
+        userids: Userids of existing users, see 'schedule'. 已存在用户的 userid 列表。
+            Defaults to None represents ["A0001"].
+        scene_ratio: Probability of scene walk. 场景漫游的概率。
+            Defaults to 0.1.
+        connections: Number of connections. 连接数。
+            Defaults to 32.
+        poisson: Poisson arrivals, otherwise constant interval. 泊松到达，否则为固定间隔。
+            Defaults to True.
+        scene_filename: File of scene root questions, one per line, see
+            'schedule'. 场景根问题文件，每行一个，参见 'schedule'。
+            Defaults to None.
+
+    Returns:
+        Summary of achieved rate, latency from intended send time and service
+        time from actual send time, both in ms.
+        实际速率，从计划发送时间计算的延迟以及从实际发送时间计算的服务时间（毫秒）。
+    """
+    roots = read_questions(scene_filename) if scene_filename else None
+    requests = schedule(read_questions(filename, pattern), number, userids, scene_ratio, \
+        roots=roots)
+    client = AsyncClient(host=host, port=port, connections=connections)
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    try:
+        records = loop.run_until_complete(replay(requests, rate, client, poisson))
+    finally:
+        client.close()
+        # 让关闭的连接在事件循环中完成清理
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+    elapsed = time.perf_counter() - start
+    ok = [record for record in records if not record[3]]
+    summary = dict(
+        target_rate=rate,
+        achieved_rate=len(records) / elapsed if elapsed else 0.0,
+        sent=len(records),
+        errors=len(records) - len(ok),
+        latency=latency_summary([1000 * (done - intended) for intended, _, done, _ in ok]),
+        service=latency_summary([1000 * (done - sent) for _, sent, done, _ in ok])
+        )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
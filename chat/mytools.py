@@ -11,6 +11,8 @@ Available functions:
 """
 
 import os
+import re
+import math
 import time
 import datetime
 import inspect
@@ -20,7 +22,11 @@ import socket
 import uuid
 import xlrd
 import xlwt
-from functools import wraps
+from fnmatch import fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import wraps, lru_cache
+from .trace import tracer
 
 class Error(Exception):
     """Base class for exceptions in this module."""
@@ -53,6 +59,30 @@ class MyEncoder(json.JSONEncoder):
         else:
             return json.JSONEncoder.default(self, obj)
 
+# 可以继续输入成为合法 json 的未完成记号：true/false/null 的前缀、数字及数字的小数或指数部分
+json_token_prefix = re.compile(r"t(r(ue?)?)?|f(a(l(se?)?)?)?|n(u(ll?)?)?|-|\.|[eE][+-]?")
+
+def json_incomplete(text, error):
+    """Whether json text that failed to decode can still become valid.
+    解码失败的 json 文本在继续输入后是否仍可能合法。
+
+    Used to frame a stream of json objects or arrays: an incomplete text waits
+    for more data, a text that can not continue is a malformed request.
+    用于切分 json 对象或数组组成的数据流：未完成的文本等待更多数据，无法继续的文本为错误请求。
+
+    Args:
+        text: Text starting at a json document. 以 json 文档开头的文本。
+        error: json.JSONDecodeError raised by 'raw_decode' of text.
+            对该文本调用 'raw_decode' 抛出的 json.JSONDecodeError。
+    """
+    if not text.startswith(("{", "[")):
+        return False
+    if error.pos >= len(text) or error.msg.startswith("Unterminated string"):
+        return True
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        return len(text) - error.pos < 6
+    return json_token_prefix.fullmatch(text, error.pos) is not None
+
 def get_mac_address():
     """Get mac address.
     """
@@ -82,6 +112,12 @@ class Walk():
     Subclasses may override the 'handle_file' method to provide custom file processing mode.
     子类可以重写'handle_file'方法来实现自定义的文件处理方式。
 
+    'walk' and 'process' are generators over os.scandir that keep nothing in
+    memory, 'process' can run 'handle_file' in a thread or process pool.
+    'dir_process' keeps the lists of all paths and prints every file.
+    'walk' 与 'process' 是基于 os.scandir 的生成器，不在内存中保存路径，
+    'process' 可在线程池或进程池中运行 'handle_file'。'dir_process' 保存所有路径的列表并打印每个文件。
+
     Public attributes:
     - filelist: All filenames with full path in directory.
     - fnamelist: All filenames in directory.
@@ -159,16 +195,18 @@ class Walk():
             filenum. 遍历目录下的所有文件总数。
         """
         if os.path.exists(path):
-            files = os.listdir(path)
-            for file in files:
+            # scandir 的目录项自带文件类型，无需逐个 stat
+            with os.scandir(path) as entries:
+                entries = list(entries)
+            for entry in entries:
                 # Exclude hidden folders and files
-                if file[0] == '.':
+                if entry.name[0] == '.':
                     continue
                 else:
-                    subpath = os.path.join(path, file)
-                if os.path.isfile(subpath):
+                    subpath = entry.path
+                if entry.is_file():
                     # Get filelist and fnamelist
-                    fname = os.path.basename(subpath)
+                    fname = entry.name
                     self.filelist.append(subpath)
                     self.fnamelist.append(fname)
                     print(self.str_file(level) + fname)
@@ -177,7 +215,7 @@ class Walk():
                 else:
                     leveli = level + 1
                     # Get dirlist and dnamelist
-                    dname = os.path.basename(subpath)
+                    dname = entry.name
                     self.dirlist.append(subpath)
                     self.dnamelist.append(dname)
                     print(self.str_dir(level) + dname)
@@ -185,6 +223,92 @@ class Walk():
         # Return the specified list by style
         return self.__dict__[style]
 
+    def walk(self, path, include=None, exclude=None):
+        """Generate paths of files in a directory, depth first.
+        深度优先生成目录中的文件路径。
+
+        Hidden folders and files are skipped. Symbolic links to folders are
+        not followed. 跳过隐藏文件夹和文件，不进入指向文件夹的符号链接。
+
+        Args:
+            path: Full path of directory. 目录的完整路径。
+            include: Glob patterns of file names to generate, e.g. "*.xls".
+                要生成的文件名通配模式，例如 "*.xls"。
+                Defaults to None represents all files.
+            exclude: Glob patterns of file and folder names to skip.
+                要跳过的文件名和文件夹名通配模式。
+                Defaults to None.
+        """
+        include = (include,) if isinstance(include, str) else include
+        exclude = (exclude,) if isinstance(exclude, str) else exclude
+        dirs = [path]
+        while dirs:
+            try:
+                with os.scandir(dirs.pop()) as entries:
+                    entries = list(entries)
+            except OSError as error:
+                print('Error: %s' % error)
+                continue
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                if name[0] == '.' or (exclude and any(fnmatch(name, item) for item in exclude)):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif not include or any(fnmatch(name, item) for item in include):
+                    yield entry.path
+            dirs.extend(reversed(subdirs))
+
+    def process(self, path, include=None, exclude=None, pool=None, workers=None, \
+        max_inflight=None, pattern=None):
+        """Handle files of a directory and generate results in order of files.
+        处理目录中的文件并按文件顺序生成结果。
+
+        With a pool at most 'max_inflight' files are being handled or waiting
+        at the same time, so results stream out while the directory is still
+        being walked. A process pool pickles this walker with 'handle_file'.
+        使用池时同时处理或等待的文件数不超过 'max_inflight'，遍历目录的同时即可流式获取结果。
+        进程池会将本对象连同 'handle_file' 序列化。
+
+        Args:
+            path: Full path of directory. 目录的完整路径。
+            include: Glob patterns of file names to handle, see 'walk'. 要处理的文件名通配模式。
+                Defaults to None represents all files.
+            exclude: Glob patterns of file and folder names to skip. 要跳过的文件名和文件夹名通配模式。
+                Defaults to None.
+            pool: None to handle files in this thread, 'thread' or 'process'.
+                为 None 时在当前线程中处理，或为 'thread'，'process'。
+                Defaults to None.
+            workers: Number of workers of pool. 池的工作者数。
+                Defaults to None represents the number of CPUs.
+            max_inflight: Max number of submitted files. 已提交文件数上限。
+                Defaults to None represents twice the number of workers.
+            pattern: Passed to 'handle_file'. 传给 'handle_file'。
+
+        Yields:
+            Tuple of file path and result of 'handle_file'. 文件路径与 'handle_file' 的结果。
+        """
+        files = self.walk(path, include, exclude)
+        if pool is None:
+            for filepath in files:
+                yield filepath, self.handle_file(filepath, pattern)
+            return
+        executors = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+        assert pool in executors, "pool must be None, 'thread' or 'process'."
+        workers = workers if workers else os.cpu_count() or 1
+        max_inflight = max_inflight if max_inflight else 2 * workers
+        with executors[pool](max_workers=workers) as executor:
+            pending = deque()
+            for filepath in files:
+                pending.append((filepath, executor.submit(self.handle_file, filepath, pattern)))
+                if len(pending) >= max_inflight:
+                    filepath, future = pending.popleft()
+                    yield filepath, future.result()
+            while pending:
+                filepath, future = pending.popleft()
+                yield filepath, future.result()
+
     def handle_file(self, filepath, pattern=None):
         """Handle file with specified method by pattern.
         根据pattern指定的模式处理文件。
@@ -209,38 +333,72 @@ def time_me(info="used", format_string="ms"):
 
     Decorator of time performance analysis.
     性能分析——计时统计
-    系统时间(wall clock time, elapsed time)是指一段程序从运行到终止，系统时钟走过的时间。
-    一般系统时间都是要大于CPU时间的。通常可以由系统提供，在C++/Windows中，可以由<time.h>提供。
-    注意得到的时间精度是和系统有关系的。
-    1.time.clock()以浮点数计算的秒数返回当前的CPU时间。用来衡量不同程序的耗时，比time.time()更有用。
-    time.clock()在不同的系统上含义不同。在UNIX系统上，它返回的是"进程时间"，它是用秒表示的浮点数（时间戳）。
-    而在WINDOWS中，第一次调用，返回的是进程运行的实际时间。而第二次之后的调用是自第一次
-    调用以后到现在的运行时间。（实际上是以WIN32上QueryPerformanceCounter()为基础，它比毫秒表示更为精确）
-    2.time.perf_counter()能够提供给定平台上精度最高的计时器。计算的仍然是系统时间，
-    这会受到许多不同因素的影响，例如机器当前负载。
-    3.time.process_time()提供进程时间。
+
+    The function is timed with time.perf_counter(), the highest resolution
+    wall clock of the platform, and runs in a span of 'trace.tracer' named by
+    its qualified name, so it is also counted in trace statistics and exports.
+    Elapsed time is printed only if 'trace.tracer.echo' is True.
+    用平台精度最高的系统时钟 time.perf_counter() 计时，并在以函数限定名命名的
+    'trace.tracer' span 中运行，因此同时计入追踪统计与导出。
+    只有 'trace.tracer.echo' 为 True 时才打印耗时。
 
     Args:
         info: Customize print info. 自定义提示信息。
         format_string: Specifies the timing unit. 指定计时单位，例如's': 秒，'ms': 毫秒。
-            Defaults to 's'.
+            Defaults to 'ms'.
     """
+    scale = 1000 if format_string == "ms" else 1
     def _time_me(func):
+        name = func.__qualname__
         @wraps(func)
         def _wrapper(*args, **kwargs):
-            start = time.clock()
-            # start = time.perf_counter()
-            # start = time.process_time()
-            result = func(*args, **kwargs)
-            end = time.clock()
-            if format_string == "s":
-                print("%s %s %s"%(func.__name__, info, end - start), "s")
-            elif format_string == "ms":
-                print("%s %s %s" % (func.__name__, info, 1000*(end - start)), "ms")
+            if not tracer.enabled and not tracer.echo:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            with tracer.span(name):
+                result = func(*args, **kwargs)
+            if tracer.echo:
+                print("%s %s %s" % (func.__name__, info, scale * (time.perf_counter() - start)), \
+                    format_string)
             return result
         return _wrapper
     return _time_me
 
+def percentile(data, percent):
+    """Performance analysis - percentile
+
+    Get percentile of data with nearest rank method.
+    以最近秩方法计算数据的百分位数。
+
+    Args:
+        data: Sorted list of numbers. 已排序的数值列表。
+        percent: Percent in [0, 100]. 百分位，取值范围[0, 100]。
+    """
+    assert data, "The data can not be empty."
+    rank = math.ceil(percent / 100 * len(data))
+    return data[max(rank - 1, 0)]
+
+def latency_summary(latencies):
+    """Performance analysis - latency distribution
+
+    Summary of latencies with count, mean, p50, p95, p99 and max.
+    延迟分布统计：次数，均值，p50，p95，p99 及最大值。
+
+    Args:
+        latencies: List of latencies. 延迟列表。
+    """
+    if not latencies:
+        return dict(count=0)
+    data = sorted(latencies)
+    return dict(
+        count=len(data),
+        mean=sum(data) / len(data),
+        p50=percentile(data, 50),
+        p95=percentile(data, 95),
+        p99=percentile(data, 99),
+        max=data[-1]
+        )
+
 def get_timestamp(s=None, style='%Y-%m-%d %H:%M:%S', pattern='s'):
     """Get timestamp. 获取指定日期表示方式的时间戳或者当前时间戳。
     
@@ -332,11 +490,13 @@ def file_replace(source_file, destination_file):
         with open(destination_file, 'w') as destination:
             destination.write(source.read())
 
-def read_excel(filepath):
+def read_excel(filepath, on_demand=False):
     """Get excel source
 
     Args:
         filepath: The full path of excel file. excel文件完整路径。
+        on_demand: Load sheets only when they are requested. 按需加载子表格。
+            Defaults to False.
 
     Returns:
         data: Data of excel. excel数据。
@@ -349,13 +509,66 @@ def read_excel(filepath):
                 is_valid = True
         data = None
         if is_valid:
-            data = xlrd.open_workbook(filepath)
+            data = xlrd.open_workbook(filepath, on_demand=on_demand)
     except Exception as xls_error:
         raise TypeError("Can't get data from excel!") from xls_error
     return data
 
+def iter_rows(table, record, start=2):
+    """Iterate rows of excel sheet as typed records.
+    以指定记录类型逐行遍历excel子表格。
+
+    Args:
+        table: Excel sheet. excel子表格。
+        record: Namedtuple type, its fields are the columns from 'A'. 记录类型，字段依次对应从'A'开始的列。
+        start: Index of first data row. 第一个数据行的序号。
+            Defaults to 2 because the first two rows are headers. 前两行为表头。
+    """
+    width = len(record._fields)
+    for i in range(start, table.nrows):
+        values = table.row_values(i, 0, min(width, table.ncols))
+        values += [""] * (width - len(values))
+        yield record(*values)
+
+def iter_excel(filepath, record, custom_sheets=None, start=2):
+    """Iterate sheets of excel, loading one sheet at a time.
+    逐个加载并遍历excel子表格。
+
+    Sheets are loaded on demand and unloaded after their rows are consumed,
+    so only one sheet is kept in memory.
+    子表格按需加载，行遍历完后卸载，内存中只保留一个子表格。
+
+    Args:
+        filepath: The full path of excel file. excel文件完整路径。
+        record: Namedtuple type of rows. 行记录类型。
+        custom_sheets: Names of sheets to iterate. 需要遍历的子表格名称。
+            Defaults to None represents all sheets.
+        start: Index of first data row. 第一个数据行的序号。
+            Defaults to 2.
+
+    Yields:
+        (sheet_name, rows): Name of sheet and generator of its rows. 子表格名称及其行生成器。
+    """
+    data = read_excel(filepath, on_demand=True)
+    try:
+        sheet_names = data.sheet_names()
+        if custom_sheets:
+            sheet_names = [name for name in sheet_names if name in custom_sheets]
+        for sheet_name in sheet_names:
+            yield sheet_name, iter_rows(data.sheet_by_name(sheet_name), record, start)
+            data.unload_sheet(sheet_name)
+    finally:
+        data.release_resources()
+
+# xls 格式每个子表格最多 65536 行
+excel_max_rows = 65536
+
+@lru_cache(maxsize=None)
 def set_excel_style(name, height, bold=False):
     """Set excel style.
+
+    Styles are cached and shared by cells, do not modify the returned style.
+    样式被缓存并由各单元格共享，不要修改返回的样式。
     """
     style = xlwt.XFStyle() # 初始化样式
     font = xlwt.Font() # 为样式创建字体
@@ -373,30 +586,67 @@ def set_excel_style(name, height, bold=False):
     style.font = font
     return style
 
-def write_excel(filename="demo.xlsx", sheets=None):
+def write_excel(filename="demo.xlsx", sheets=None, flush_rows=1000, reserved=()):
     """Write excel from data.
+
+    Rows are written as they are read from the items of each sheet, which may
+    be any iterable such as a query cursor. A sheet with more rows than the
+    xls limit is continued in new sheets named 'name(2)', 'name(3)'...,
+    skipping names already written or listed in 'reserved'.
+    逐行写入各子表格的 items（可为查询游标等任意可迭代对象）。超过 xls 行数上限的
+    子表格自动续写到名为 'name(2)'，'name(3)'... 的新子表格，跳过已写入或 'reserved' 中的名称。
+
+    Args:
+        filename: The full path of excel file. excel文件完整路径。
+        sheets: Iterable of dicts with keys 'name', 'info' and 'items'. 'info'
+            is a list of (key, title) and every item is a mapping with node
+            'n'. 子表格字典，'info' 为 (键, 标题) 列表，每个 item 的 'n' 为节点。
+        flush_rows: Rows kept in memory before flushing. 刷新前在内存中保留的行数。
+            Defaults to 1000.
+        reserved: Names of sheets written later when 'sheets' is a
+            generator. 'sheets' 为生成器时之后写入的子表格名称。
+            Defaults to ().
     """
     file = xlwt.Workbook() # 创建工作簿
-    for sheet in sheets:
-        new_sheet = file.add_sheet(sheet["name"], cell_overwrite_ok=True) # 创建sheet
-        info = sheet["info"]
-        # 原始方案：键值没有固定顺序导出 excel
-        # 生成表头
-        # for col, key in enumerate(info.keys()):
-            # new_sheet.write(0, col, info[key], set_excel_style('Arial Black', 220, True))
-            # new_sheet.write(1, col, key, set_excel_style('Arial Black', 220, True))
-        # 生成内容
-        # for index, item in enumerate(sheet["items"]):
-            # for col, key in enumerate(info.keys()):
-                # new_sheet.write(index+2, col, item['n'][key])
-
+    header = set_excel_style('Arial Black', 220, True)
+    # 子表格名不区分大小写
+    if isinstance(sheets, (list, tuple)):
+        reserved = list(reserved) + [sheet["name"] for sheet in sheets]
+    used = set(name.lower() for name in reserved)
+
+    def add_sheet(name, info):
+        used.add(name.lower())
+        new_sheet = file.add_sheet(name, cell_overwrite_ok=True) # 创建sheet
         # Modify：使键值按照指定顺序导出 excel (2018-1-8)
         for col, key in enumerate(info):
-            new_sheet.write(0, col, key[1], set_excel_style('Arial Black', 220, True))
-            new_sheet.write(1, col, key[0], set_excel_style('Arial Black', 220, True))
-        for index, item in enumerate(sheet["items"]):
-            for col, key in enumerate(info):
-                new_sheet.write(index+2, col, item['n'][key[0]])
+            new_sheet.write(0, col, key[1], header)
+            new_sheet.write(1, col, key[0], header)
+        return new_sheet
+
+    for sheet in sheets:
+        info = sheet["info"]
+        keys = [key[0] for key in info]
+        part = 1
+        new_sheet = add_sheet(sheet["name"], info)
+        index = 2
+        for item in sheet["items"]:
+            if index == excel_max_rows:
+                # 子表格名最长 31 个字符
+                while True:
+                    part += 1
+                    suffix = "(%d)" % part
+                    name = sheet["name"][:31 - len(suffix)] + suffix
+                    if name.lower() not in used:
+                        break
+                new_sheet = add_sheet(name, info)
+                index = 2
+            node = item['n']
+            row = new_sheet.row(index)
+            for col, key in enumerate(keys):
+                row.write(col, node[key])
+            index += 1
+            if index % flush_rows == 0:
+                new_sheet.flush_row_data()
     file.save(filename) # 保存文件
 
 def generate_dict(dictpath, sourcepath):
@@ -11,15 +11,24 @@ Available functions:
 import sqlite3
 import copy
 import json
+import threading
 from collections import deque
-from py2neo import Graph, Node, Relationship
-from .config import getConfig
-from .api import nlu_tuling, get_location_by_ip
-from .semantic import synonym_cut, get_tag, similarity, check_swords, get_location
+from .config import config
+from .api import nlu_tuling, get_location_by_ip, get_weather
+from .semantic import synonym_cut, get_tag, similarity, check_swords, get_location, \
+    load_lexicon, set_lexicon
 from .mytools import time_me, get_current_time, random_item, get_age
+from .trace import traced
+from .cache import LRUCache
+from .kb import KnowledgeBase
+from .snapshot import load_snapshot
+from .store import get_store
 from .word2pinyin import pinyin_cut, jaccard_pinyin
 
-log_do_not_know = getConfig("path", "do_not_know")
+log_do_not_know = config.get("path", "do_not_know")
+# 场景外问答缓存：(userid, 问题, 话题集版本, 知识库快照版本) -> 匹配到的节点 id
+answer_cache = LRUCache(maxsize=config.getint("cache", "answer_maxsize", minimum=1))
+MISSING = object()
 cmd_end_scene = ["退出业务场景", "退出场景", "退出", "返回", "结束", "发挥"]
 # 上一步功能为通用模式
 cmd_previous_step = ["上一步", "上一部", "上一页", "上一个"]
@@ -31,8 +40,8 @@ def get_navigation_location():
     """获取导航地点 
     """
     try:
-        nav_db = getConfig("nav", "db")
-        key = getConfig("nav", "key")
+        nav_db = config.get("nav", "db")
+        key = config.get("nav", "key")
         db = sqlite3.connect(nav_db)
     except:
         print("导航数据库连接失败！请检查是否存在文件：" + nav_db)
@@ -52,13 +61,21 @@ class Robot():
     自然语言理解机器人。
 
     Public attributes:
-    - graph: The connection of graph database. 图形数据库连接。
+    - store: Storage backend of knowledge base, see 'chat.store'. 知识库存储后端。
+    - snapshot: Path of precompiled snapshot file of knowledge base, see
+        'chat.snapshot'. 知识库预编译快照文件路径。
     - pattern: The pattern for NLU tool: 'semantic' or 'vec'. 语义标签或词向量模式。
     - memory: The context memory of robot. 机器人对话上下文记忆。
     """
-    def __init__(self, password="train"):
-        # 连接图知识库
-        self.graph = Graph("http://localhost:7474/db/data/", password=password)
+    def __init__(self, password="train", store=None, snapshot=None):
+        # 连接知识库，默认使用配置文件指定的存储后端
+        self.store = store if store else get_store(password=password)
+        # 预编译快照文件，默认使用配置文件指定的路径，为空时从存储后端加载
+        self.snapshot = snapshot if snapshot is not None else config.get("snapshot", "path", "")
+        # 知识库内存快照及其对应的知识库版本
+        self.kb = self.load_kb()
+        self.kb_version = self.get_kb_version()
+        self.reload_lock = threading.Lock()
         # 语义模式：'semantic' or 'vec'
         self.pattern = 'semantic'
         # 获取导航地点数据库
@@ -66,7 +83,7 @@ class Robot():
         # 在线场景标志，默认为False
         self.is_scene = False
         # 在线调用百度地图IP定位api，网络异常时返回默认地址：上海市/从配置信息获取
-        self.address = get_location_by_ip(self.graph.find_one("User", "userid", "A0001")['city'])
+        self.address = get_location_by_ip(self.get_user("A0001")['city'])
         # 机器人配置信息
         self.user = None
         # 可用话题列表
@@ -105,55 +122,105 @@ class Robot():
     def configure(self, info="", userid="userid"):
         """Configure knowledge base.
         配置知识库。
+
+        The knowledge bases in 'info' are selected and the others of user
+        are forbidden in one transaction, which also increases the version of
+        topics of user that the answer cache is keyed on.
+        在一个事务中选中 'info' 中的子知识库并禁用用户的其余子知识库，
+        同时增加问答缓存所依赖的用户话题集版本号。
+
+        Args:
+            info: Names of knowledge bases separated by spaces, or empty to get
+                current configuration. 以空格分隔的子知识库名称，为空时返回当前配置。
+            userid: User id. 用户唯一标识。
         """
         assert userid is not "", "The userid can not be empty!"
         # TO UPGRADE 对传入的userid参数分析，若不合适则报相应消息 2017-6-7
         if userid != "A0001":
             userid = "A0001"
             print("userid 不是标准A0001，已经更改为A0001")
-        match_string = "MATCH (config:Config) RETURN config.name as name"
-        subgraphs = [item[0] for item in self.graph.run(match_string)]
-        print("所有知识库：", subgraphs)
         if not info:
-            config = {"databases": []}
-            match_string = "MATCH (user:User)-[r:has]->(config:Config)" + \
-                "where user.userid='" + userid + \
-                "' RETURN config.name as name, r.bselected as bselected, r.available as available"
-            for item in self.graph.run(match_string):
-                config["databases"].append(dict(name=item[0], bselected=item[1], available=item[2]))
+            config = {"databases": self.store.user_configs(userid)}
             print("可配置信息：", config)
             return config
-        else:
-            selected_names = info.split()
-        forbidden_names = list(set(subgraphs).difference(set(selected_names)))
-        print("选中知识库：", selected_names)
-        print("禁用知识库：", forbidden_names)
-        # TODO：待合并精简
-        for name in selected_names:
-            match_string = "MATCH (user:User)-[r:has]->(config:Config) where user.userid='" \
-                + userid + "' AND config.name='" + name + "' SET r.bselected=1"
-            # print(match_string)
-            self.graph.run(match_string)
-        for name in forbidden_names:
-            match_string = "MATCH (user:User)-[r:has]->(config:Config) where user.userid='" \
-                + userid + "' AND config.name='" + name + "' SET r.bselected=0"
-            # print(match_string)
-            self.graph.run(match_string)
+        selected_names = info.split()
+        # 话题集版本更新后场景外问答缓存失效
+        version = self.store.select_configs(userid, selected_names)
+        print("选中知识库：", selected_names, "话题集版本：", version)
+        answer_cache.clear()
         return self.get_usertopics(userid=userid)
 
+    def get_kb_version(self):
+        """Get version of knowledge base in store.
+        获取存储后端中的知识库版本号。
+        """
+        return self.store.kb_version()
+
+    def load_kb(self):
+        """Load knowledge base from snapshot file if configured, or else from store.
+        若配置了快照文件则从快照文件加载知识库，否则从存储后端加载。
+
+        A snapshot compiled from another version of knowledge base, such as
+        before a database import, is not used and the knowledge base is
+        loaded from store until the snapshot is compiled again.
+        快照编译自其他版本的知识库（例如数据库导入之前）时不使用该快照，
+        改为从存储后端加载，直到重新编译快照。
+        """
+        if self.snapshot:
+            kb = load_snapshot(self.snapshot)
+            version = self.get_kb_version()
+            if kb.header["kb_version"] == version:
+                return kb
+            print("Warning: snapshot %s is compiled from knowledge base version %s, " \
+                "not %s, load from store instead." % (self.snapshot, kb.header["kb_version"], \
+                version))
+        return KnowledgeBase.from_store(self.store)
+
+    def get_user(self, userid):
+        """Get user properties by userid. 根据 userid 获取用户属性。
+        """
+        return self.store.get_user(userid)
+
+    @time_me()
+    def reload(self, kb=True, lexicon=True):
+        """Reload knowledge base and word tables, then swap them in.
+        重新加载知识库快照和词表，加载完成后再替换。
+
+        It is called in a background thread. Requests that already hold the
+        old snapshot finish on it. When word tables change, semantic tags of
+        nodes are recomputed in memory with the new word tables.
+        在后台线程中调用，已持有旧快照的请求仍在旧快照上完成。
+        词表变化时在内存中用新词表重新计算节点的语义标签。
+
+        Args:
+            kb: Reload knowledge base. 是否重新加载知识库。
+                Defaults to True.
+            lexicon: Reload word tables. 是否重新加载词表。
+                Defaults to True.
+        """
+        with self.reload_lock:
+            version = self.get_kb_version()
+            new_kb = self.load_kb() if kb else self.kb
+            if lexicon:
+                tables = load_lexicon()
+                config = self.get_user("A0001")
+                new_kb = new_kb.retag(lambda node: get_tag(node["name"], config, tables))
+            # 原子替换
+            if lexicon:
+                set_lexicon(tables)
+            self.kb = new_kb
+            self.kb_version = version
+            answer_cache.clear()
+            print("知识库已重新加载，节点数：", len(new_kb))
+
     # @time_me()
     def get_usertopics(self, userid="A0001"):
         """Get usertopics list.
         """
-        usertopics = []
         if not userid:
             userid = "A0001"
         # 从知识库获取用户拥有权限的子知识库列表
-        match_string = "MATCH (user:User)-[r:has {bselected:1, available:1}]->(config:Config)" + \
-            "where user.userid='" + userid + "' RETURN config"
-        data = self.graph.run(match_string).data()
-        for item in data:
-            usertopics.extend(item["config"]["topic"].split(","))
+        usertopics = self.store.user_topics(userid)
         print("用户：", userid, "\n已有知识库列表：", usertopics)
         return usertopics
 
@@ -174,17 +241,13 @@ class Robot():
             userid: 用户唯一标识。
                 Defaults to "userid".
         """
-        previous_node = self.graph.find_one("Memory", "qa_id", self.qa_id)
+        previous_qa_id = self.qa_id
         self.qa_id = get_current_time()
-        node = Node("Memory", question=question, userid=userid, qa_id=self.qa_id)
-        if previous_node:
-            relation = Relationship(previous_node, "next", node)
-            self.graph.create(relation)
-        else:
-            self.graph.create(node)
+        self.store.add_memory(question, userid, self.qa_id, previous_qa_id)
 
     # Development requirements from Mr Tang in 2017-5-11.
     # 由模糊匹配->全匹配 from Mr Tang in 2017-6-1.
+    @traced()
     def extract_navigation(self, question):
         """Extract navigation。抽取导航地点。
         QA匹配模式：从导航地点列表选取匹配度最高的地点。
@@ -243,31 +306,21 @@ class Robot():
             if temp_sim > 0.75:
                 print("Q: " + iquestion + " Similarity Score: " + str(temp_sim))
                 result['name'] = iquestion
-                result["content"] = self.iformat(random_item(node["content"].split("|")))
-                result["context"] = node["topic"]
-                result["tid"] = node["tid"]
-                result["txt"] = node["txt"]
-                result["img"] = node["img"]
-                result["button"] = node["button"]
-                if node["url"]:
-                    result["url"] = random_item(node["url"].split("|"))
-                if node["behavior"]:
-                    result["behavior"] = int(node["behavior"], 16)
-                if node["parameter"]:
-                    result["parameter"] = node["parameter"]
-                func = node["api"]
-                if func:
-                    exec("result['content'] = " + func + "('" + result["content"] + "')")
+                self.fill_result(result, node)
                 return result
         return result
 
-    def extract_synonym(self, question, subgraph):
+    @traced()
+    def extract_synonym(self, question, subgraph, degraded=False):
         """Extract synonymous QA in NLU database。
         QA匹配模式：从知识库选取匹配度最高的问答对。
 
         Args:
             question: User question. 用户问题。
             subgraph: Sub graphs corresponding to the current dialogue. 当前对话领域对应的子图。
+            degraded: Skip similarity computing and only match original sentence.
+                过载降级模式：跳过相似度计算，只做原句匹配。
+                Defaults to False.
         """
         temp_sim = 0
         result = dict(question=question, name='', content=self.iformat(random_item(self.do_not_know)), \
@@ -276,56 +329,31 @@ class Robot():
 	    # vec: 切分为词向量，根据词向量计算相似度矩阵，再由相似性矩阵计算句子相似度
         if self.pattern == 'semantic':
         # elif self.pattern == 'vec':
-            sv1 = synonym_cut(question, 'wf')
-            if not sv1:
+            sv1 = [] if degraded else synonym_cut(question, 'wf')
+            if not sv1 and not degraded:
                 return result
             for node in subgraph:
                 iquestion = self.iformat(node["name"])
                 if question == iquestion:
                     print("Similarity Score: Original sentence")
                     result['name'] = iquestion
-                    result["content"] = self.iformat(random_item(node["content"].split("|")))
-                    result["context"] = node["topic"]
-                    result["tid"] = node["tid"]
-                    result["txt"] = node["txt"]
-                    result["img"] = node["img"]
-                    result["button"] = node["button"]
-                    if node["url"]:
-                        result["url"] = random_item(node["url"].split("|"))
-                    if node["behavior"]:
-                        result["behavior"] = int(node["behavior"], 16)
-                    if node["parameter"]:
-                        result["parameter"] = node["parameter"]
-                    # 知识实体节点api抽取原始问题中的关键信息，据此本地查询/在线调用第三方api/在线爬取
-                    func = node["api"]
-                    if func:
-                        exec("result['content'] = " + func + "('" + result["content"] + "')")
+                    self.fill_result(result, node)
                     return result
-                sv2 = synonym_cut(iquestion, 'wf')
+                if degraded:
+                    continue
+                # 预编译快照中已有问题的同义词向量
+                sv2 = node.get("vector") or synonym_cut(iquestion, 'wf')
                 if sv2:
                     temp_sim = similarity(sv1, sv2, 'j')
 			    # 匹配加速，不必选取最高相似度，只要达到阈值就终止匹配
                 if temp_sim > 0.92:
                     print("Q: " + iquestion + " Similarity Score: " + str(temp_sim))
                     result['name'] = iquestion
-                    result["content"] = self.iformat(random_item(node["content"].split("|")))
-                    result["context"] = node["topic"]
-                    result["tid"] = node["tid"]
-                    result["txt"] = node["txt"]
-                    result["img"] = node["img"]
-                    result["button"] = node["button"]
-                    if node["url"]:
-                        result["url"] = random_item(node["url"].split("|"))
-                    if node["behavior"]:
-                        result["behavior"] = int(node["behavior"], 16)
-                    if node["parameter"]:
-                        result["parameter"] = node["parameter"]
-                    func = node["api"]
-                    if func:
-                        exec("result['content'] = " + func + "('" + result["content"] + "')")
+                    self.fill_result(result, node)
                     return result
         return result
 
+    @traced()
     def extract_keysentence(self, question, data=None):
         """Extract keysentence QA in NLU database。
         QA匹配模式：从知识库选取包含关键句的问答对。
@@ -339,36 +367,60 @@ class Robot():
             # subgraph = [node for node in data if node["name"] in question]
             # TODO：从包含关键句的问答对中选取和当前问答的跳转链接最接近的
             # node = 和当前问答的跳转链接最接近的 in subgraph
-        usertopics = ' '.join(self.usertopics)
-        # 只从目前挂接的知识库中匹配
-        match_string = "MATCH (n:NluCell) WHERE '" + question + \
-            "' CONTAINS n.name and '" + usertopics +  \
-            "' CONTAINS n.topic RETURN n LIMIT 1"
-        subgraph = self.graph.run(match_string).data()
-        if subgraph:
+        # 只从目前挂接的知识库中匹配，快照带有关键句自动机时无需查询存储后端
+        kb = self.kb
+        if kb.automaton:
+            node = kb.key_sentence(question, self.usertopics)
+        else:
+            node = self.store.key_sentence(question, self.usertopics)
+        if node:
             # TODO：判断 subgraph 中是否包含场景根节点
-            node = list(subgraph)[0]['n']
             print("Similarity Score: Key sentence")
             result['name'] = node['name']
-            result["content"] = self.iformat(random_item(node["content"].split("|")))
-            result["context"] = node["topic"]
-            result["tid"] = node["tid"]
-            result["txt"] = node["txt"]
-            result["img"] = node["img"]
-            result["button"] = node["button"]
-            if node["url"]:
-                result["url"] = random_item(node["url"].split("|"))
-            if node["behavior"]:
-                result["behavior"] = int(node["behavior"], 16)
-            if node["parameter"]:
-                result["parameter"] = node["parameter"]
-            # 知识实体节点api抽取原始问题中的关键信息，据此本地查询/在线调用第三方api/在线爬取
-            func = node["api"]
-            if func:
-                exec("result['content'] = " + func + "('" + result["content"] + "')")
+            self.fill_result(result, node)
             return result
         return result
 
+    @traced()
+    def get_usergraph(self, question, kb):
+        """Get knowledge nodes with the same semantic tag as question in usertopics.
+        获取用户可用话题中与问题语义标签相同的知识节点。
+        """
+        tag = get_tag(question, self.user)
+        # subgraph_all = list(self.graph.find("NluCell", "tag", tag)) # 列表
+        subgraph_all = kb.find(tag)
+        return [node for node in subgraph_all if node["topic"] in self.usertopics]
+
+    def fill_result(self, result, node):
+        """Fill answer of knowledge node into result.
+        将知识节点的回答填入结果。
+
+        Random choice among alternatives and the api of node are applied on
+        every call. 每次调用都会重新随机选取回答并执行节点的api。
+
+        Args:
+            result: Result dict to fill. 待填充的结果字典。
+            node: Knowledge node. 知识节点。
+        """
+        result["nid"] = node["nid"]
+        result["content"] = self.iformat(random_item(node["content"].split("|")))
+        result["context"] = node["topic"]
+        result["tid"] = node["tid"]
+        result["txt"] = node["txt"]
+        result["img"] = node["img"]
+        result["button"] = node["button"]
+        if node["url"]:
+            result["url"] = random_item(node["url"].split("|"))
+        if node["behavior"]:
+            result["behavior"] = int(node["behavior"], 16)
+        if node["parameter"]:
+            result["parameter"] = node["parameter"]
+        # 知识实体节点api抽取原始问题中的关键信息，据此本地查询/在线调用第三方api/在线爬取
+        func = node["api"]
+        if func:
+            exec("result['content'] = " + func + "('" + result["content"] + "')")
+        return result
+
     def remove_name(self, question):
         # 姓氏误匹配重定义
         if question.startswith("小") and len(question) == 2:
@@ -381,30 +433,10 @@ class Robot():
             question = self.user['robotname']
         return question
 
-    @time_me()
-    def search(self, question="question", tid="", userid="userid"):
-        """Nlu search. 语义搜索。
-
-        Args:
-            question: 用户问题。
-                Defaults to "question".
-            userid: 用户唯一标识。
-                Defaults to "userid"
-
-        Returns:
-            Dict contains:
-            question, answer, topic, tid, url, behavior, parameter, txt, img, button.
-            返回包含问题，答案，话题，资源，行为，动作，文本，图片及按钮的字典。
+    def get_do_not_know(self, question="question"):
+        """Empty answer without content. 无法回答时的空回答。
         """
-        # 添加到问题记忆
-        # self.qmemory.append(question)
-        # self.add_to_memory(question, userid)
-
-        # 语义：场景+全图+用户配置模式（用户根据 userid 动态获取其配置信息）
-        # ========================初始化配置信息==========================
-        self.user = self.graph.find_one("User", "userid", userid)
-        self.usertopics = self.get_usertopics(userid=userid)
-        do_not_know = dict(
+        return dict(
             question=question,
             name="",
             # content=self.iformat(random_item(self.do_not_know)),
@@ -418,7 +450,11 @@ class Robot():
             img="",
             button="",
             valid=1)
-        error_page = dict(
+
+    def get_error_page(self, question="question"):
+        """Custom error prompt of current user. 当前用户自定义的错误提示。
+        """
+        return dict(
             question=question,
             name="",
             content=self.user['error_page'],
@@ -432,6 +468,48 @@ class Robot():
             button="",
             valid=0)
 
+    def reject(self, question="question", userid="userid"):
+        """Answer immediately without searching knowledge base.
+        过载时不查询知识库，直接返回错误提示。
+
+        The error_page of the last loaded user is reused if it is the same user,
+        otherwise the do_not_know answer is returned.
+        若最近加载的用户即为当前用户则返回其 error_page，否则返回 do_not_know。
+        """
+        if self.user and self.user['userid'] == userid:
+            return self.get_error_page(question)
+        return self.get_do_not_know(question)
+
+    @time_me()
+    def search(self, question="question", tid="", userid="userid", degraded=False):
+        """Nlu search. 语义搜索。
+
+        Args:
+            question: 用户问题。
+                Defaults to "question".
+            userid: 用户唯一标识。
+                Defaults to "userid"
+            degraded: 过载降级模式，跳过相似度匹配阶段。
+                Defaults to False.
+
+        Returns:
+            Dict contains:
+            question, answer, topic, tid, url, behavior, parameter, txt, img, button.
+            返回包含问题，答案，话题，资源，行为，动作，文本，图片及按钮的字典。
+        """
+        # 添加到问题记忆
+        # self.qmemory.append(question)
+        # self.add_to_memory(question, userid)
+
+        # 语义：场景+全图+用户配置模式（用户根据 userid 动态获取其配置信息）
+        # ========================初始化配置信息==========================
+        # 本次请求始终使用同一个知识库快照，热加载不影响处理中的请求
+        kb = self.kb
+        self.user = self.get_user(userid)
+        self.usertopics = self.get_usertopics(userid=userid)
+        do_not_know = self.get_do_not_know(question)
+        error_page = self.get_error_page(question)
+
         # ========================一、预处理=============================
         # 问题过滤(添加敏感词过滤 2017-5-25)
         if check_swords(question):
@@ -504,28 +582,15 @@ class Robot():
                         if next:
                             next_tid = next['url']
                             next_question = next['content']
-                            match_string = "MATCH (n:NluCell {name:'" + \
-                                next_question + "', topic:'" + self.topic + \
-                                "', tid:" + next_tid + "}) RETURN n"
-                            match_data = list(self.graph.run(match_string).data())
-                            if match_data:
-                                node = match_data[0]['n']
+                            # 场景ID在表格中为数字
+                            try:
+                                next_tid = float(next_tid)
+                            except ValueError:
+                                pass
+                            node = self.store.find_node(next_question, self.topic, next_tid)
+                            if node:
                                 result['name'] = self.iformat(node["name"])
-                                result["content"] = self.iformat(random_item(node["content"].split("|")))
-                                result["context"] = node["topic"]
-                                result["tid"] = node["tid"]
-                                result["txt"] = node["txt"]
-                                result["img"] = node["img"]
-                                result["button"] = node["button"]
-                                if node["url"]:
-                                    result["url"] = random_item(node["url"].split("|"))
-                                if node["behavior"]:
-                                    result["behavior"] = int(node["behavior"], 16)
-                                if node["parameter"]:
-                                    result["parameter"] = node["parameter"]
-                                func = node["api"]
-                                if func:
-                                    exec("result['content'] = " + func + "('" + result["content"] + "')")
+                                self.fill_result(result, node)
                                 # 添加到场景记忆
                                 self.pmemory.append(self.amemory[-1])
                                 self.amemory.append(result)
@@ -533,15 +598,11 @@ class Robot():
                     return error_page
           
         # ==========================场景匹配=============================
-        tag = get_tag(question, self.user)
-        # subgraph_all = list(self.graph.find("NluCell", "tag", tag)) # 列表
-        subgraph_all = self.graph.find("NluCell", "tag", tag) # 迭代器
-        usergraph_all = [node for node in subgraph_all if node["topic"] in self.usertopics]
-        usergraph_scene = [node for node in usergraph_all if node["topic"] == self.topic]
-       
         if self.is_scene: # 在场景中：语义模式+关键句模式
+            usergraph_scene = [node for node in self.get_usergraph(question, kb) \
+                if node["topic"] == self.topic]
             if usergraph_scene:
-                result = self.extract_synonym(question, usergraph_scene)
+                result = self.extract_synonym(question, usergraph_scene, degraded)
                 if not result["context"]:
                     result = self.extract_keysentence(question, usergraph_scene)
                 # result = self.extract_pinyin(question, usergraph_scene)
@@ -575,9 +636,32 @@ class Robot():
             return error_page
 
         else: # 不在场景中：语义模式+关键句模式
-            result = self.extract_synonym(question, usergraph_all)
-            if not result["context"]:
-                result = self.extract_keysentence(question)
+            # 场景外的匹配结果只取决于问题与用户配置，缓存匹配到的节点 id
+            key = (userid, question.strip(), self.user.get("topics_version"), kb.version)
+            nid = answer_cache.get(key, MISSING)
+            node = None
+            if nid is not MISSING and nid is not None:
+                node = kb.node(nid)
+                if node is None:
+                    # 缓存的节点已不在当前知识库中，按未命中处理
+                    nid = MISSING
+            if nid is MISSING:
+                result = self.extract_synonym(question, self.get_usergraph(question, kb), degraded)
+                # 没有关键句自动机时关键句来自存储后端，其节点 id 不属于 kb，不写入缓存
+                from_kb = True
+                if not result["context"]:
+                    result = self.extract_keysentence(question)
+                    from_kb = kb.automaton is not None or result.get("nid") is None
+                # 降级模式可能漏配，不写入缓存
+                if not degraded and from_kb:
+                    answer_cache.set(key, result.get("nid"))
+            else:
+                result = self.get_do_not_know(question)
+                if nid is None:
+                    result["content"] = self.iformat(random_item(self.do_not_know))
+                else:
+                    result['name'] = self.iformat(node["name"])
+                    self.fill_result(result, node)
             # result = self.extract_pinyin(question, usergraph_all)         
             if result["tid"] != '': # 匹配到场景节点
                 if int(result["tid"]) == 0:
@@ -611,13 +695,9 @@ class Robot():
             # 3.nlu_tuling(天气)
             elif "天气" in question:
                 # 图灵API变更之后 Add in 2017-8-4
+                # 问句中不包含地址时使用当前所在城市，天气按城市、日期词和小时缓存
                 location = get_location(question)
-                if not location:
-                    # 问句中不包含地址
-                    weather = nlu_tuling(self.address + question)
-                else:
-                    # 问句中包含地址
-                    weather = nlu_tuling(question)
+                weather = get_weather(location if location else self.address, question)
                 # 图灵API变更之前    
                 # weather = nlu_tuling(question, loc=self.address)
                 result["behavior"] = int("0x0000", 16)
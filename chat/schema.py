@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""schema
+
+Indexes and constraints of graph database. 图数据库的索引与约束。
+
+Every lookup of nlu server and database manager by label and property needs
+an index, otherwise Neo4j scans all nodes of the label.
+语义服务器与知识库管理按标签和属性的查找都需要索引，否则 Neo4j 会扫描该标签的所有节点。
+
+Available functions:
+- missing_schema: Indexes and constraints not declared yet. 尚未声明的索引与约束。
+- migrate: Create missing indexes and constraints. 创建缺少的索引与约束。
+"""
+
+# (标签, 属性)：普通索引
+INDEXES = (
+    ("NluCell", "tag"), # 语义标签匹配
+    ("NluCell", "topic"), # 场景及子表格导出
+    ("NluCell", "name"), # 问题查找与增量同步
+    ("Memory", "qa_id"), # 对话记忆
+    )
+# (标签, 属性)：唯一性约束，同时创建索引
+CONSTRAINTS = (
+    ("User", "userid"),
+    ("Config", "name"),
+    )
+
+
+def missing_schema(graph):
+    """Get indexes and constraints not declared in graph database.
+    获取图数据库中尚未声明的索引与约束。
+
+    Returns:
+        (indexes, constraints): Lists of missing (label, property). 缺少的 (标签, 属性) 列表。
+    """
+    schema = graph.schema
+    constraints = [(label, key) for label, key in CONSTRAINTS \
+        if key not in schema.get_uniqueness_constraints(label)]
+    # 唯一性约束自带索引
+    indexes = [(label, key) for label, key in INDEXES \
+        if key not in schema.get_indexes(label) \
+        and key not in schema.get_uniqueness_constraints(label)]
+    return indexes, constraints
+
+def migrate(graph):
+    """Create missing indexes and constraints and verify them.
+    创建缺少的索引与约束并校验。
+
+    A constraint can not be created while existing nodes violate it, such
+    as two Config nodes with the same name. The error is printed and the
+    constraint is reported as missing.
+    已有节点违反约束时（例如两个同名的 Config 节点）无法创建约束，打印错误并报告为缺少。
+
+    Returns:
+        (indexes, constraints): Lists of (label, property) still missing. 仍缺少的 (标签, 属性) 列表。
+    """
+    indexes, constraints = missing_schema(graph)
+    for label, key in constraints:
+        try:
+            graph.schema.create_uniqueness_constraint(label, key)
+            print("Create constraint :%s(%s)" % (label, key))
+        except Exception as error:
+            print("Error: can not create constraint :%s(%s): %s" % (label, key, error))
+    for label, key in indexes:
+        try:
+            graph.schema.create_index(label, key)
+            print("Create index :%s(%s)" % (label, key))
+        except Exception as error:
+            print("Error: can not create index :%s(%s): %s" % (label, key, error))
+    return missing_schema(graph)
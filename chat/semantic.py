@@ -26,12 +26,73 @@ punctuation_zh = " 、，。°？！：；“”’‘～…【】（）《》
 punctuation_all = set(punctuation) | set(punctuation_zh)
 # 句尾语气词过滤
 tone_words = "。？！的了呢吧吗啊啦呀"
+# 词表文件：同义词词典，用户词典，敏感词库
+dictfiles = [
+    thispath + "\\dict\\synonymdict.txt",
+    thispath + "\\dict\\userdict.txt",
+    thispath + "\\dict\\swords.txt"
+    ]
+
+def load_swords():
+    """Load sensitive words. 加载敏感词库。
+    """
+    try:
+        with codecs.open(dictfiles[2], "r", "UTF-8") as file:
+            return set(file.read().split())
+    except:
+        return []
+
 # 敏感词库 Modified in 2017-5-25
-try:
-    with codecs.open(thispath + "\\dict\\swords.txt", "r", "UTF-8") as file:
-        sensitive_words = set(file.read().split())
-except:
-    sensitive_words = []
+sensitive_words = load_swords()
+
+
+class Lexicon():
+    """Word tables used by semantic tools.
+    语义工具使用的词表。
+
+    The semantic tools always read the current module level 'lexicon', so a
+    new one can be built in background with 'load_lexicon' and swapped in
+    with 'set_lexicon' without restarting server.
+    语义工具总是读取当前模块级 'lexicon'，可在后台用 'load_lexicon' 构建新词表，
+    再用 'set_lexicon' 原子替换，无需重启服务器。
+
+    Public attributes:
+    - tokenizer: Word segmentation tool. 分词工具。
+    - postokenizer: Part of speech tagging tool. 词性（同义词标签）标注工具。
+    - tfidf: Keyword extraction tool. 关键词抽取工具。
+    - sensitive_words: Sensitive words. 敏感词库。
+    """
+    def __init__(self, tokenizer, postokenizer, tfidf, sensitive_words):
+        self.tokenizer = tokenizer
+        self.postokenizer = postokenizer
+        self.tfidf = tfidf
+        self.sensitive_words = sensitive_words
+
+
+def load_lexicon():
+    """Build new word tables from dictionary files.
+    从词典文件构建新词表。
+
+    The prefix dictionary is built immediately, so the cost is paid by the
+    caller rather than the first request.
+    立即构建前缀词典，加载耗时由调用者承担而不是第一个请求。
+    """
+    tokenizer = jieba.Tokenizer(dictfiles[0])
+    tokenizer.initialize()
+    tokenizer.load_userdict(dictfiles[1])
+    postokenizer = posseg.POSTokenizer(tokenizer)
+    tfidf = analyse.TFIDF()
+    tfidf.tokenizer = tokenizer
+    tfidf.postokenizer = postokenizer
+    return Lexicon(tokenizer, postokenizer, tfidf, load_swords())
+
+def set_lexicon(new_lexicon):
+    """Swap in new word tables. 替换当前词表。
+    """
+    global lexicon
+    lexicon = new_lexicon
+
+lexicon = Lexicon(jieba.dt, posseg.dt, analyse.default_tfidf, sensitive_words)
 
 def generate_swords():
     with codecs.open(thispath + "\\dict\\sensitive_words.txt", "r", "UTF-8") as file:
@@ -42,7 +103,7 @@ def generate_swords():
 def check_swords(sentence):
     """检测是否包含敏感词
     """
-    for word in sensitive_words:
+    for word in lexicon.sensitive_words:
         if word in sentence:
             return True
     return False
@@ -53,7 +114,7 @@ def check_swords(sentence):
     # else:
         # return False
 
-def synonym_cut(sentence, pattern="wf"):
+def synonym_cut(sentence, pattern="wf", tables=None):
     """Cut the sentence into a synonym vector tag.
     将句子切分为同义词向量标签。
 
@@ -63,45 +124,49 @@ def synonym_cut(sentence, pattern="wf"):
 
     Args:
         pattern: 'w'-分词, 'k'-唯一关键词，'t'-关键词列表, 'wf'-分词标签, 'tf-关键词标签'。
+        tables: Word tables. 词表。
+            Defaults to None represents current lexicon.
     """
     sentence = sentence.rstrip(tone_words)
+    tables = tables or lexicon
     synonym_vector = []
     if pattern == "w":
-        result = list(jieba.cut(sentence))
+        result = list(tables.tokenizer.cut(sentence))
         synonym_vector = [item for item in result if item not in punctuation_all]
     elif pattern == "k":
-        synonym_vector = analyse.extract_tags(sentence, topK=1)
+        synonym_vector = tables.tfidf.extract_tags(sentence, topK=1)
     elif pattern == "t":
-        synonym_vector = analyse.extract_tags(sentence, topK=10)
+        synonym_vector = tables.tfidf.extract_tags(sentence, topK=10)
     elif pattern == "wf":
-        result = posseg.cut(sentence)
+        result = tables.postokenizer.cut(sentence)
         # synonym_vector = [(item.word, item.flag) for item in result \
         # if item.word not in punctuation_all]
         # Modify in 2017.4.27 
         for item in result:
             if item.word not in punctuation_all:
                 if len(item.flag) < 4:
-                    item.flag = list(posseg.cut(item.word))[0].flag
+                    item.flag = list(tables.postokenizer.cut(item.word))[0].flag
                 synonym_vector.append((item.word, item.flag))
     elif pattern == "tf":
-        result = posseg.cut(sentence)
-        tags = analyse.extract_tags(sentence, topK=10)
+        result = tables.postokenizer.cut(sentence)
+        tags = tables.tfidf.extract_tags(sentence, topK=10)
         for item in result:
             if item.word in tags:
                 synonym_vector.append((item.word, item.flag))
     return synonym_vector
 
-def get_tag(sentence, config):
+def get_tag(sentence, config, tables=None):
     """
     Get semantic tag of sentence.
     """
+    tables = tables or lexicon
     iquestion = sentence.format(**config)
     try:
-        keywords = analyse.extract_tags(iquestion, topK=1)
+        keywords = tables.tfidf.extract_tags(iquestion, topK=1)
         keyword = keywords[0]
     except IndexError:
         keyword = iquestion
-    tags = synonym_cut(keyword, 'wf') # tuple list
+    tags = synonym_cut(keyword, 'wf', tables) # tuple list
     if tags:
         tag = tags[0][1]
         if not tag:
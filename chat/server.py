@@ -6,16 +6,155 @@
 The socketserver module simplifies the task of writing network servers.
 """
 import os
+import atexit
 import json
+import time
+import codecs
+import threading
 import socketserver
-from .config import getConfig
+from .config import config
 from .qa import Robot
-from .mytools import get_current_time
+from .mytools import get_current_time, json_incomplete
 from .ianswer import answer2xml
+from .semantic import dictfiles
+from . import trace
+
+
+class Admission():
+    """Admission control of nlu server.
+    语义服务器准入控制。
+
+    At most 'max_inflight' requests are searched at the same time, the others
+    wait in queue until their deadline. A request that can not get a slot
+    before its deadline is rejected immediately. When the number of waiting
+    requests reaches 'degrade_threshold', admitted requests are searched in
+    degraded mode which skips the similarity stage.
+    同时处理的请求数不超过 'max_inflight'，其余请求排队等待直到超时后被快速拒绝。
+    排队请求数达到 'degrade_threshold' 时进入降级模式，跳过相似度匹配阶段。
+
+    Public attributes:
+    - deadline: Max seconds from arrival to admission. 请求从到达到被处理的最长等待时间（秒）。
+    - degrade_threshold: Queue length to enable degraded mode. 触发降级模式的排队长度。
+    - waiting: Number of requests in queue. 当前排队的请求数。
+    """
+    def __init__(self, max_inflight=32, deadline=2.0, degrade_threshold=16):
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.deadline = deadline
+        self.degrade_threshold = degrade_threshold
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, arrival):
+        """Wait for a free slot until the deadline of request.
+        在请求截止时间之前等待空闲处理槽。
+
+        Args:
+            arrival: Arrival time of request from time.monotonic(). 请求到达时间。
+
+        Returns:
+            True if admitted, False if the deadline is exceeded. 是否准入。
+        """
+        remaining = self.deadline - (time.monotonic() - arrival)
+        if remaining <= 0:
+            return False
+        with self.lock:
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=remaining)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def release(self):
+        """Release the slot of an admitted request. 释放处理槽。
+        """
+        self.slots.release()
+
+    def degraded(self):
+        """Whether the queue is long enough to enable degraded mode.
+        排队长度是否达到降级阈值。
+        """
+        return self.waiting >= self.degrade_threshold
+
+
+class Watcher(threading.Thread):
+    """Watch word table files and knowledge base version to reload robot.
+    监视词表文件和知识库版本，变化时热加载。
+
+    Word tables are reloaded when any file in 'semantic.dictfiles' is modified.
+    Knowledge base is reloaded when its version in graph database is increased
+    by 'Database' import. The configuration file is reloaded when modified,
+    see 'Config.reload'.
+    'semantic.dictfiles' 中的文件修改后重新加载词表，
+    'Database' 导入知识库使图数据库中的版本号增加后重新加载知识库。
+    配置文件修改后重新加载配置。
+    """
+    def __init__(self, robot, interval=5.0):
+        threading.Thread.__init__(self, daemon=True)
+        self.robot = robot
+        self.interval = interval
+        self.mtimes = self.get_mtimes()
+
+    def get_mtimes(self):
+        """Get modified time of word table files. 获取词表文件修改时间。
+        """
+        mtimes = []
+        for path in dictfiles:
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                config.reload()
+                mtimes = self.get_mtimes()
+                lexicon = mtimes != self.mtimes
+                kb = self.robot.get_kb_version() != self.robot.kb_version
+                if lexicon or kb:
+                    self.robot.reload(kb=kb, lexicon=lexicon)
+                    self.mtimes = mtimes
+            except Exception as error:
+                print('Error: %s' %error)
+
 
 # 初始化语义服务器
-logpath = getConfig("path", "log")
-robot = Robot(password=getConfig("neo4j", "password"))
+logpath = config.get("path", "log")
+json_parser = json.JSONDecoder()
+# 未解析请求数据的最大长度，超过则认为格式错误
+max_request_size = 65536
+# 追踪：按采样率记录请求各阶段耗时，退出时导出到 file
+trace.configure(enabled=config.getboolean("trace", "enabled"), \
+    sample=config.getfloat("trace", "sample", minimum=0, maximum=1), \
+    echo=config.getboolean("trace", "echo"))
+robot = Robot(password=config.get("neo4j", "password"))
+admission = Admission(
+    max_inflight=config.getint("server", "max_inflight", minimum=1),
+    deadline=config.getfloat("server", "deadline", minimum=0),
+    degrade_threshold=config.getint("server", "degrade_threshold", minimum=0)
+    )
+
+@config.on_reload
+def apply_config(new_config):
+    """Apply reloaded options that can change at runtime.
+    应用可在运行时修改的重新加载配置项。
+
+    The number of slots and the watcher itself are fixed at startup. All
+    options are validated before any of them is applied.
+    处理槽数和监视线程本身在启动时确定。所有配置项校验通过后才开始应用。
+    """
+    tracing = dict(enabled=new_config.getboolean("trace", "enabled"), \
+        sample=new_config.getfloat("trace", "sample", minimum=0, maximum=1), \
+        echo=new_config.getboolean("trace", "echo"))
+    deadline = new_config.getfloat("server", "deadline", minimum=0)
+    degrade_threshold = new_config.getint("server", "degrade_threshold", minimum=0)
+    trace.configure(**tracing)
+    admission.deadline = deadline
+    admission.degrade_threshold = degrade_threshold
+    print("配置已重新加载：", new_config.path)
 
 
 class MyTCPHandler(socketserver.BaseRequestHandler):
@@ -26,50 +165,138 @@ class MyTCPHandler(socketserver.BaseRequestHandler):
     the 'handle' method to implement communication to the client.
     """
     def handle(self):
+        # 按 json 文档切分数据流，支持同一连接上连续发送多个请求（流水线）
+        decoder = codecs.getincrementaldecoder("UTF-8")()
+        buffer = ""
         while True:
 			# self.request is the TCP socket connected to the client
             self.data = self.request.recv(2048)
             if not self.data:
                 break
             print("\n{} wrote:".format(self.client_address[0]))
-            self.data = self.data.decode("UTF-8")
-            print("Data:\n", self.data)
-            # step 1.Bytes to json obj and extract question
-            json_data = json.loads(self.data)
-            # step 2.Get answer
-            if "ask_content" in json_data.keys():
-                answer = robot.search(question=json_data["ask_content"], \
-                userid=json_data["userid"])
-                info = json_data["ask_content"]
-                # 其中 result['picurl'] 为 xml 格式
-                result = answer2xml(answer)
-            elif "config_content" in json_data.keys():
-                answer = robot.configure(info=json_data["config_content"], \
-                userid=json_data["userid"])
-                info = json_data["config_content"]
-                result = answer
-            print(answer)
-            print(result)
-            # step 3.Send
             try:
-                self.request.sendall(json.dumps(result).encode("UTF-8"))
-            except:
+                buffer += decoder.decode(self.data)
+            except UnicodeDecodeError:
+                self.malformed()
+                return
+            while True:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    break
+                try:
+                    # step 1.Bytes to json obj and extract question
+                    json_data, end = json_parser.raw_decode(buffer)
+                except json.JSONDecodeError as error:
+                    # 未完成的请求等待更多数据，无法继续的请求立即回复错误并断开
+                    if json_incomplete(buffer, error) and len(buffer) <= max_request_size:
+                        break
+                    self.malformed()
+                    return
+                if not isinstance(json_data, dict):
+                    self.malformed()
+                    return
+                # 到达时间按请求记录，同一数据块中靠后的请求不计入前面请求的处理时间
+                arrival = time.monotonic()
+                print("Data:\n", buffer[:end])
+                buffer = buffer[end:]
+                self.process(json_data, arrival)
+
+    def malformed(self):
+        """Reply error of malformed request before closing connection.
+        回复请求格式错误，随后断开连接。
+
+        The rest of the stream can not be split into requests any more.
+        之后的数据流已无法再切分为请求。
+        """
+        print("请求数据格式错误，断开连接")
+        try:
+            self.request.sendall(json.dumps({"error": "malformed request"}).encode("UTF-8"))
+        except OSError:
+            pass
+        with open(logpath, "a", encoding="UTF-8") as file:
+            file.write(get_current_time("%Y-%m-%d %H:%M:%S") + "\n" + "请求数据格式错误\n")
+
+    def process(self, json_data, arrival):
+        """Answer one request in a span of 'trace.tracer'.
+        在 'trace.tracer' 的 span 中处理一个请求。
+
+        Args:
+            json_data: Request json obj. 请求json对象。
+            arrival: Arrival time of request from time.monotonic(). 请求到达时间。
+        """
+        kind = next((key for key in ("ask_content", "config_content", "reload_content") \
+            if key in json_data), "")
+        with trace.span("server.process", kind=kind) as current:
+            current.set(queued=time.monotonic() - arrival)
+            self.answer(json_data, arrival)
+
+    def answer(self, json_data, arrival):
+        """Search, send and log answer of one request. 搜索、发送并记录一个请求的回答。
+        """
+        # step 2.Get answer
+        if "ask_content" in json_data.keys():
+            # 过载保护：超过截止时间仍未获得处理槽的请求直接返回错误提示
+            with trace.span("server.admission"):
+                admitted = admission.acquire(arrival)
+            # 场景 xml 片段按回答所用的知识库快照版本缓存
+            version = robot.kb.version
+            if admitted:
+                try:
+                    answer = robot.search(question=json_data["ask_content"], \
+                    userid=json_data["userid"], degraded=admission.degraded())
+                finally:
+                    admission.release()
+            else:
+                answer = robot.reject(question=json_data["ask_content"], \
+                userid=json_data["userid"])
                 with open(logpath, "a", encoding="UTF-8") as file:
                     file.write(get_current_time("%Y-%m-%d %H:%M:%S") + "\n" \
-                    + "发送失败\n")
-            # 追加日志
+                    + "请求超时拒绝\n")
+            info = json_data["ask_content"]
+            # 其中 result['picurl'] 为 xml 格式
+            with trace.span("answer2xml"):
+                result = answer2xml(answer, version=version)
+        elif "config_content" in json_data.keys():
+            answer = robot.configure(info=json_data["config_content"], \
+            userid=json_data["userid"])
+            info = json_data["config_content"]
+            result = answer
+        elif "reload_content" in json_data.keys():
+            # 热加载："kb" 知识库，"dict" 词表，为空时全部重新加载
+            targets = json_data["reload_content"].split() or ["kb", "dict"]
+            threading.Thread(target=robot.reload, daemon=True, kwargs=dict( \
+                kb="kb" in targets, lexicon="dict" in targets)).start()
+            info = json_data["reload_content"]
+            answer = result = {"reload": targets}
+        # 回显请求 id，客户端据此匹配流水线请求的回答
+        if "id" in json_data.keys() and isinstance(result, dict):
+            result["id"] = json_data["id"]
+        print(answer)
+        print(result)
+        # step 3.Send
+        try:
+            with trace.span("server.send"):
+                self.request.sendall(json.dumps(result).encode("UTF-8"))
+        except:
             with open(logpath, "a", encoding="UTF-8") as file:
-                # 写入接收数据中的内容字段
                 file.write(get_current_time("%Y-%m-%d %H:%M:%S") + "\n" \
-                    + info + "\n")
-                # 写入正常问答
-                if "ask_content" in json_data.keys():
-                    for key in ["question", "content", "behavior", "url", "context", "parameter", "picurl"]:
-                        file.write(key + ": " + str(result[key]) + "\n")
-                # 写入配置信息
-                elif "config_content" in json_data.keys():
-                    file.write("Config: " + " ".join(result) + "\n")
-                file.write("\n")
+                + "发送失败\n")
+        # 追加日志
+        with trace.span("server.log"), open(logpath, "a", encoding="UTF-8") as file:
+            # 写入接收数据中的内容字段
+            file.write(get_current_time("%Y-%m-%d %H:%M:%S") + "\n" \
+                + info + "\n")
+            # 写入正常问答
+            if "ask_content" in json_data.keys():
+                for key in ["question", "content", "behavior", "url", "context", "parameter", "picurl"]:
+                    file.write(key + ": " + str(result[key]) + "\n")
+            # 写入配置信息
+            elif "config_content" in json_data.keys():
+                file.write("Config: " + " ".join(result) + "\n")
+            # 写入热加载信息
+            elif "reload_content" in json_data.keys():
+                file.write("Reload: " + " ".join(result["reload"]) + "\n")
+            file.write("\n")
 
 
 def start(host="localhost", port=7000):
@@ -84,6 +311,18 @@ def start(host="localhost", port=7000):
         port: server port. 服务器端口设置。
             Defaults to 7000.
     """
+    # 检查图数据库索引与约束，缺少时可运行 Database.migrate() 创建
+    indexes, constraints = robot.store.missing_schema()
+    if indexes or constraints:
+        print("Warning: missing indexes %s and constraints %s, " \
+            "run Database.migrate() to create them." % (indexes, constraints))
+    # 退出时导出追踪记录：.json 为 Chrome trace 格式，其余为 JSONL
+    tracefile = config.get("trace", "file")
+    if trace.tracer.enabled and tracefile:
+        atexit.register(trace.export, tracefile)
+    # 监视词表和知识库变化，后台热加载
+    if config.getboolean("reload", "watch"):
+        Watcher(robot, interval=config.getfloat("reload", "interval", minimum=0.1)).start()
     # 多线程处理并发请求
     sock = socketserver.ThreadingTCPServer((host, port), MyTCPHandler)
     sock.serve_forever()
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""snapshot
+
+Precompiled knowledge base snapshot file. 预编译的知识库快照文件。
+
+'compile_snapshot' reads the knowledge base from a store or a workbook once,
+offline, and writes everything Robot needs to search it:
+- node payloads, one JSON record per node;
+- synonym vectors of questions, precomputed with current word tables;
+- the semantic tag index;
+- an Aho-Corasick automaton over questions for key sentence search.
+'load_snapshot' maps the file with mmap. Offsets and automaton arrays are
+used in place, node records are decoded on first access, so a server starts
+at full speed without querying the database or segmenting questions.
+'compile_snapshot' 离线地从存储后端或工作簿读取一次知识库，写入机器人搜索所需的全部数据：
+节点数据（每个节点一条 JSON 记录），用当前词表预先计算的问题同义词向量，语义标签索引，
+以及用于关键句搜索的 Aho-Corasick 自动机。'load_snapshot' 用 mmap 映射文件，
+偏移量和自动机数组直接使用，节点记录在首次访问时解码，
+服务器启动后无需查询数据库或切分问题即可全速运行。
+
+File layout: magic, header length (uint32), JSON header with format version,
+knowledge base version, digest of word tables and section offsets, then
+sections aligned to 8 bytes.
+文件格式：魔数，头部长度（uint32），JSON 头部（格式版本、知识库版本、词表摘要及各段偏移量），
+之后为按 8 字节对齐的各段数据。
+
+Available classes:
+- Automaton: Aho-Corasick automaton in flat arrays. 扁平数组表示的 Aho-Corasick 自动机。
+
+Available functions:
+- compile_snapshot: Compile knowledge base into snapshot file. 将知识库编译为快照文件。
+- load_snapshot: Load snapshot file as KnowledgeBase. 将快照文件加载为知识库。
+
+Usage:
+    compile_snapshot("kb.snap", store=get_store())
+    kb = load_snapshot("kb.snap")
+"""
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import defaultdict, deque, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from .kb import FIELDS, KnowledgeBase
+from .mytools import iter_excel
+from .semantic import dictfiles, get_tag, synonym_cut
+
+MAGIC = b"NLUSNAP\x00"
+FORMAT = 1
+# 工作簿各列（前两行为表头）
+Row = namedtuple("Row", FIELDS[:-1])
+# 自动机数组段
+automaton_sections = ("edge_start", "edge_char", "edge_target", "fail", "out_start", \
+    "out_nodes", "out_link")
+
+
+class Automaton():
+    """Aho-Corasick automaton in flat arrays.
+    扁平数组表示的 Aho-Corasick 自动机。
+
+    States are numbered from the root 0. The edges of state s are
+    edge_char/edge_target[edge_start[s]:edge_start[s + 1]] sorted by
+    character, and its outputs are out_nodes[out_start[s]:out_start[s + 1]].
+    out_link[s] is the nearest state on the fail chain with outputs, 0 if none.
+    The arrays may be memoryviews of a mapped file.
+    状态从根节点 0 开始编号。状态 s 的边按字符排序，为
+    edge_char/edge_target[edge_start[s]:edge_start[s + 1]]，输出为
+    out_nodes[out_start[s]:out_start[s + 1]]。out_link[s] 为失败链上最近的有输出的状态，
+    没有时为 0。各数组可为映射文件的 memoryview。
+    """
+    def __init__(self, **arrays):
+        for name in automaton_sections:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def build(cls, patterns):
+        """Build automaton from (pattern, value) pairs. 由 (模式串, 值) 构建自动机。
+        """
+        children = [{}]
+        outputs = [[]]
+        for pattern, value in patterns:
+            state = 0
+            for char in pattern:
+                code = ord(char)
+                if code not in children[state]:
+                    children[state][code] = len(children)
+                    children.append({})
+                    outputs.append([])
+                state = children[state][code]
+            outputs[state].append(value)
+        fail = [0] * len(children)
+        out_link = [0] * len(children)
+        queue = deque(children[0].values())
+        while queue:
+            state = queue.popleft()
+            for code, target in children[state].items():
+                queue.append(target)
+                link = fail[state]
+                while link and code not in children[link]:
+                    link = fail[link]
+                if state and code in children[link]:
+                    fail[target] = children[link][code]
+                out_link[target] = fail[target] if outputs[fail[target]] \
+                    else out_link[fail[target]]
+        arrays = dict(edge_start=array("i", [0]), edge_char=array("I"), \
+            edge_target=array("i"), fail=array("i", fail), out_start=array("i", [0]), \
+            out_nodes=array("i"), out_link=array("i", out_link))
+        for state, edges in enumerate(children):
+            for code in sorted(edges):
+                arrays["edge_char"].append(code)
+                arrays["edge_target"].append(edges[code])
+            arrays["edge_start"].append(len(arrays["edge_char"]))
+            arrays["out_nodes"].extend(outputs[state])
+            arrays["out_start"].append(len(arrays["out_nodes"]))
+        return cls(**arrays)
+
+    def goto(self, state, code):
+        """Target of edge or -1. 边的目标状态，不存在时为 -1。
+        """
+        start, end = self.edge_start[state], self.edge_start[state + 1]
+        index = bisect.bisect_left(self.edge_char, code, start, end)
+        if index < end and self.edge_char[index] == code:
+            return self.edge_target[index]
+        return -1
+
+    def search(self, text):
+        """Yield values of patterns contained in text, in order of end position.
+        按结束位置顺序生成文本中包含的模式串的值。
+        """
+        state = 0
+        for char in text:
+            code = ord(char)
+            target = self.goto(state, code)
+            while target < 0 and state:
+                state = self.fail[state]
+                target = self.goto(state, code)
+            state = max(target, 0)
+            output = state
+            while output:
+                for index in range(self.out_start[output], self.out_start[output + 1]):
+                    yield self.out_nodes[index]
+                output = self.out_link[output]
+
+
+class SnapshotNodes(Mapping):
+    """Node records of snapshot, decoded on first access.
+    快照的节点记录，首次访问时解码。
+    """
+    def __init__(self, records, offsets):
+        self.records = records
+        self.offsets = offsets
+        self.cache = {}
+
+    def __getitem__(self, nid):
+        node = self.cache.get(nid)
+        if node is None:
+            if not 0 <= nid < len(self):
+                raise KeyError(nid)
+            node = json.loads(bytes(self.records[self.offsets[nid]:self.offsets[nid + 1]]) \
+                .decode("UTF-8"))
+            if node.get("vector"):
+                node["vector"] = [tuple(item) for item in node["vector"]]
+            self.cache[nid] = node
+        return node
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def lexicon_digest():
+    """Digest of word tables that synonym vectors and tags depend on.
+    同义词向量与语义标签所依赖的词表的摘要。
+    """
+    md5 = hashlib.md5()
+    for filename in dictfiles[:2]:
+        with open(filename, 'rb') as file:
+            md5.update(file.read())
+    return md5.hexdigest()
+
+def workbook_nodes(filename, custom_sheets=None):
+    """Read knowledge nodes from workbook in format of 'Database.handle_excel'.
+    从 'Database.handle_excel' 格式的工作簿读取知识节点。
+    """
+    for sheet_name, rows in iter_excel(filename, Row, custom_sheets):
+        for row in rows:
+            node = dict(row._asdict(), hot="0")
+            # 场景 topic 必须填写，问答 topic 可不填，若填写必须为 sheet_name
+            node["topic"] = row.topic if row.topic else sheet_name
+            for question in row.name.split("|"):
+                if question:
+                    yield dict(node, name=question)
+
+def analyse(item):
+    """Compute tag and synonym vector of question. 计算问题的语义标签与同义词向量。
+
+    Names with user placeholders are formatted with the user of compiling,
+    and their vectors are left to runtime since the user may change.
+    含用户占位符的问题用编译时的用户格式化，其向量在运行时计算，因为用户可能变化。
+    """
+    name, tag, user = item
+    iquestion = name.format_map(defaultdict(str, user))
+    if not tag:
+        tag = get_tag(iquestion, {})
+    vector = synonym_cut(iquestion, 'wf') if "{" not in name else None
+    return tag, vector
+
+def align(file):
+    """Pad file to 8 bytes. 将文件补齐到 8 字节。
+    """
+    file.write(b"\x00" * (-file.tell() % 8))
+
+def compile_snapshot(filename, store=None, workbook=None, custom_sheets=None, \
+    userid="A0001", processes=None):
+    """Compile knowledge base into snapshot file.
+    将知识库编译为快照文件。
+
+    Args:
+        filename: Path of snapshot file. 快照文件路径。
+        store: Store to read nodes, user and version from, see 'chat.store'.
+            读取节点、用户及版本号的存储后端。
+            Defaults to None.
+        workbook: Path of excel to read nodes from instead of store. Tags are
+            computed from questions. 代替存储后端读取节点的excel路径，语义标签由问题计算。
+            Defaults to None.
+        custom_sheets: Sheets of workbook to compile. 要编译的子表格。
+            Defaults to None represents all sheets.
+        userid: User to format questions with. 格式化问题所用的用户。
+            Defaults to "A0001".
+        processes: Number of processes to analyse questions. 分析问题的进程数。
+            Defaults to None represents the number of CPUs.
+
+    Returns:
+        Header of snapshot. 快照头部。
+    """
+    assert store or workbook, "store or workbook is required."
+    nodes = list(workbook_nodes(workbook, custom_sheets) if workbook else store.nodes())
+    user = (store.get_user(userid) if store else None) or {}
+    # 快照中节点 id 为记录序号，与自动机的输出值一致
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(analyse, [(node["name"], node.get("tag") if not workbook \
+            else "", user) for node in nodes], chunksize=256)
+        for nid, (node, (tag, vector)) in enumerate(zip(nodes, results)):
+            node.update(nid=nid, tag=tag, vector=vector)
+    tags = defaultdict(list)
+    for node in nodes:
+        tags[node["tag"]].append(node["nid"])
+    automaton = Automaton.build((node["name"], node["nid"]) for node in nodes if node["name"])
+    header = dict(format=FORMAT, kb_version=store.kb_version() if store else None, \
+        lexicon=lexicon_digest(), userid=userid, count=len(nodes), created=time.time(), \
+        sections={})
+    # 先写入各段，再回填头部的偏移量
+    with open(filename + ".tmp", 'wb') as file:
+        file.write(b"\x00" * 4096)
+        offsets = array("Q", [0])
+        records = bytearray()
+        for node in nodes:
+            records += json.dumps(node, ensure_ascii=False).encode("UTF-8")
+            offsets.append(len(records))
+        sections = [("offsets", offsets.tobytes()), ("records", bytes(records)), \
+            ("tags", json.dumps(tags, ensure_ascii=False).encode("UTF-8"))]
+        sections.extend((name, getattr(automaton, name).tobytes()) \
+            for name in automaton_sections)
+        for name, data in sections:
+            align(file)
+            header["sections"][name] = [file.tell(), len(data)]
+            file.write(data)
+        head = json.dumps(header).encode("UTF-8")
+        assert len(MAGIC) + 4 + len(head) <= 4096, "header is too large."
+        file.seek(0)
+        file.write(MAGIC + struct.pack("<I", len(head)) + head)
+    # 原子替换，正在加载旧快照的服务器不受影响
+    os.replace(filename + ".tmp", filename)
+    print("Compile %s: %d nodes, %d tags" % (filename, len(nodes), len(tags)))
+    return header
+
+def load_snapshot(filename):
+    """Load snapshot file as KnowledgeBase with mmap.
+    用 mmap 将快照文件加载为知识库。
+
+    If word tables changed after compiling, the precomputed synonym vectors
+    are ignored and computed at runtime.
+    编译后词表若已变化，忽略预先计算的同义词向量，改为运行时计算。
+
+    Returns:
+        KnowledgeBase with 'header' of snapshot. 带快照头部 'header' 的知识库。
+    """
+    with open(filename, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    assert bytes(view[:len(MAGIC)]) == MAGIC, "%s is not a snapshot file." % filename
+    length, = struct.unpack("<I", view[len(MAGIC):len(MAGIC) + 4])
+    header = json.loads(bytes(view[len(MAGIC) + 4:len(MAGIC) + 4 + length]).decode("UTF-8"))
+    assert header["format"] == FORMAT, "Unsupported snapshot format %s." % header["format"]
+
+    def section(name, typecode=None):
+        start, size = header["sections"][name]
+        part = view[start:start + size]
+        return part.cast(typecode) if typecode else part
+
+    nodes = SnapshotNodes(section("records"), section("offsets", "Q"))
+    tags = json.loads(bytes(section("tags")).decode("UTF-8"))
+    automaton = Automaton(**{name: section(name, "I" if name == "edge_char" else "i") \
+        for name in automaton_sections})
+    if header["lexicon"] != lexicon_digest():
+        print("Warning: word tables changed after compiling %s, " \
+            "synonym vectors are computed at runtime." % filename)
+        nodes = {nid: dict(node, vector=None) for nid, node in nodes.items()}
+    kb = KnowledgeBase(nodes, tags=tags, automaton=automaton)
+    kb.header = header
+    return kb
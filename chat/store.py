@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""store
+
+Storage backends of nlu knowledge base. 语义知识库存储后端。
+
+Robot reads users, topic configs, knowledge nodes and writes dialogue memory
+through a Store, so the graph database can be replaced by an embedded SQLite
+file for small deployments and tests.
+机器人通过 Store 读取用户、话题配置、知识节点并写入对话记忆，
+小型部署和测试可用嵌入式 SQLite 文件代替图数据库。
+
+Knowledge nodes are plain dicts of NluCell properties with an extra key 'nid',
+see 'chat.kb'. 知识节点为 NluCell 属性字典，额外的 'nid' 为节点 id。
+
+Available classes:
+- Store: Interface of storage backend. 存储后端接口。
+- Neo4jStore: Neo4j graph database. Neo4j 图数据库。
+- SqliteStore: Embedded SQLite database. 嵌入式 SQLite 数据库。
+
+Available functions:
+- get_store: Create store of configured backend. 创建配置的存储后端。
+"""
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from py2neo import Graph, Node, Relationship, remote
+from .config import config
+from .kb import FIELDS
+from . import cypher, schema
+
+
+class Store(ABC):
+    """Interface of storage backend. 存储后端接口。
+    """
+    @abstractmethod
+    def get_user(self, userid):
+        """Get properties of user. 获取用户属性。
+
+        Returns:
+            Dict of user properties or None. 用户属性字典，不存在时为 None。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def kb_version(self):
+        """Get version of knowledge base. 获取知识库版本号。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def bump_kb_version(self):
+        """Increase version of knowledge base. 增加知识库版本号。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def config_names(self):
+        """Get names of all knowledge bases. 获取所有子知识库名称。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_configs(self, userid):
+        """Get knowledge bases of user. 获取用户的子知识库配置。
+
+        Returns:
+            List of dicts with keys 'name', 'bselected' and 'available'.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def select_configs(self, userid, selected):
+        """Select knowledge bases of user and forbid the others, then increase
+        version of topics of user, all in one transaction.
+        在一个事务中选中用户的子知识库并禁用其余的，同时增加用户话题集版本号。
+
+        Returns:
+            New version of topics. 新的话题集版本号。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_topics(self, userid):
+        """Get topics of selected and available knowledge bases of user.
+        获取用户已选择且可用的子知识库话题。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def nodes(self):
+        """Get all knowledge nodes. 获取所有知识节点。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def topic_nodes(self, topic):
+        """Get knowledge nodes of topic. 获取话题的知识节点。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_node(self, name, topic, tid):
+        """Get knowledge node by question, topic and scene id. 根据问题、话题及场景ID获取知识节点。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def key_sentence(self, question, topics):
+        """Get a node of topics whose question is contained in 'question'.
+        获取话题中问题被 'question' 包含的一个知识节点。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_memory(self, question, userid, qa_id, previous_qa_id):
+        """Append question to dialogue memory. 将问题追加到对话记忆。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_user(self, properties):
+        """Add user if not exists. 用户不存在时添加用户。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def merge_config(self, userid, name, topic):
+        """Create or update knowledge base of user. 新建或更新用户的子知识库。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_nodes(self, nodes):
+        """Add knowledge nodes. 添加知识节点。
+        """
+        raise NotImplementedError
+
+    def missing_schema(self):
+        """Get missing indexes and constraints, see 'chat.schema'.
+        获取缺少的索引与约束。
+        """
+        return [], []
+
+
+class Neo4jStore(Store):
+    """Neo4j graph database. Neo4j 图数据库。
+
+    Public attributes:
+    - graph: The connection of graph database. 图形数据库连接。
+    """
+    def __init__(self, password="train", url="http://localhost:7474/db/data/"):
+        self.graph = Graph(url, password=password)
+
+    def get_user(self, userid):
+        user = self.graph.run(cypher.USER, userid=userid).evaluate()
+        return dict(user) if user else None
+
+    def kb_version(self):
+        return self.graph.run(cypher.KB_VERSION).evaluate()
+
+    def bump_kb_version(self):
+        self.graph.run(cypher.BUMP_KB_VERSION)
+
+    def config_names(self):
+        return [item["name"] for item in self.graph.run(cypher.CONFIG_NAMES)]
+
+    def user_configs(self, userid):
+        return self.graph.run(cypher.USER_CONFIGS, userid=userid).data()
+
+    def select_configs(self, userid, selected):
+        return self.graph.run(cypher.SELECT_CONFIGS, userid=userid, \
+            selected=list(selected)).evaluate()
+
+    def user_topics(self, userid):
+        topics = []
+        for item in self.graph.run(cypher.SELECTED_CONFIGS, userid=userid):
+            topics.extend(item["config"]["topic"].split(","))
+        return topics
+
+    def nodes(self):
+        return [to_dict(item["n"]) for item in self.graph.run(cypher.ALL_NODES)]
+
+    def topic_nodes(self, topic):
+        match_string = cypher.TOPIC_NODES.format(label=cypher.label("NluCell"))
+        return [to_dict(item["n"]) for item in self.graph.run(match_string, topic=topic)]
+
+    def find_node(self, name, topic, tid):
+        node = self.graph.run(cypher.NEXT_STEP, name=name, topic=topic, tid=tid).evaluate()
+        return to_dict(node) if node else None
+
+    def key_sentence(self, question, topics):
+        node = self.graph.run(cypher.KEY_SENTENCE, question=question, topics=topics).evaluate()
+        return to_dict(node) if node else None
+
+    def add_memory(self, question, userid, qa_id, previous_qa_id):
+        previous_node = self.graph.run(cypher.MEMORY, qa_id=previous_qa_id).evaluate()
+        node = Node("Memory", question=question, userid=userid, qa_id=qa_id)
+        if previous_node:
+            self.graph.create(Relationship(previous_node, "next", node))
+        else:
+            self.graph.create(node)
+
+    def add_user(self, properties):
+        if not self.get_user(properties["userid"]):
+            self.graph.create(Node("User", **properties))
+
+    def merge_config(self, userid, name, topic):
+        self.graph.run(cypher.MERGE_CONFIG, userid=userid, name=name, topic=topic)
+
+    def add_nodes(self, nodes):
+        self.graph.run(cypher.CREATE_NODES.format(label=cypher.label("NluCell")), \
+            rows=[{key: value for key, value in node.items() if key != "nid"} for node in nodes])
+
+    def missing_schema(self):
+        return schema.missing_schema(self.graph)
+
+
+class SqliteStore(Store):
+    """Embedded SQLite database. 嵌入式 SQLite 数据库。
+
+    Tables and indexes are created on connection. The version of knowledge
+    base is kept in the one-row table 'meta'. One connection is shared by
+    server threads and serialized with a lock.
+    连接时创建表和索引。知识库版本号保存在只有一行的 'meta' 表中。服务器各线程共享一个连接，通过锁串行访问。
+
+    Public attributes:
+    - path: Path of database file, ':memory:' for in-memory database.
+        数据库文件路径，':memory:' 为内存数据库。
+    """
+    tables = (
+        "CREATE TABLE IF NOT EXISTS user (userid TEXT PRIMARY KEY, properties TEXT, " \
+            "topics_version INTEGER DEFAULT 0)",
+        # 只有一行的元数据表
+        "CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), " \
+            "kb_version INTEGER DEFAULT 0)",
+        "INSERT OR IGNORE INTO meta (id) VALUES (0)",
+        "CREATE TABLE IF NOT EXISTS config (name TEXT PRIMARY KEY, topic TEXT)",
+        "CREATE TABLE IF NOT EXISTS user_config (userid TEXT, name TEXT, " \
+            "bselected INTEGER DEFAULT 1, available INTEGER DEFAULT 1, PRIMARY KEY (userid, name))",
+        "CREATE TABLE IF NOT EXISTS nlucell (nid INTEGER PRIMARY KEY, " \
+            + ", ".join(FIELDS) + ", digest)",
+        "CREATE INDEX IF NOT EXISTS nlucell_tag ON nlucell (tag)",
+        "CREATE INDEX IF NOT EXISTS nlucell_topic ON nlucell (topic)",
+        "CREATE INDEX IF NOT EXISTS nlucell_name ON nlucell (name, topic)",
+        "CREATE TABLE IF NOT EXISTS memory (qa_id TEXT, question TEXT, userid TEXT, previous TEXT)",
+        "CREATE INDEX IF NOT EXISTS memory_qa_id ON memory (qa_id)",
+        )
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            for statement in self.tables:
+                self.conn.execute(statement)
+
+    def query(self, sql, parameters=()):
+        """Fetch all rows of query. 执行查询并返回所有行。
+        """
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchall()
+
+    def execute(self, sql, parameters=()):
+        """Execute statement and commit. 执行语句并提交。
+        """
+        with self.lock, self.conn:
+            self.conn.execute(sql, parameters)
+
+    def get_user(self, userid):
+        rows = self.query("SELECT * FROM user WHERE userid = ?", (userid,))
+        if not rows:
+            return None
+        user = json.loads(rows[0]["properties"])
+        user.update(userid=userid, topics_version=rows[0]["topics_version"])
+        return user
+
+    def kb_version(self):
+        return self.query("SELECT kb_version FROM meta WHERE id = 0")[0][0]
+
+    def bump_kb_version(self):
+        self.execute("UPDATE meta SET kb_version = kb_version + 1 WHERE id = 0")
+
+    def config_names(self):
+        return [row["name"] for row in self.query("SELECT name FROM config")]
+
+    def user_configs(self, userid):
+        rows = self.query("SELECT name, bselected, available FROM user_config " \
+            "WHERE userid = ?", (userid,))
+        return [dict(row) for row in rows]
+
+    def select_configs(self, userid, selected):
+        selected = list(selected)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE user_config SET bselected = name IN (%s) " \
+                "WHERE userid = ?" % ",".join("?" * len(selected)), selected + [userid])
+            self.conn.execute("UPDATE user SET topics_version = topics_version + 1 " \
+                "WHERE userid = ?", (userid,))
+            return self.conn.execute("SELECT topics_version FROM user WHERE userid = ?", \
+                (userid,)).fetchone()[0]
+
+    def user_topics(self, userid):
+        rows = self.query("SELECT config.topic FROM user_config JOIN config " \
+            "ON user_config.name = config.name WHERE user_config.userid = ? " \
+            "AND bselected = 1 AND available = 1", (userid,))
+        topics = []
+        for row in rows:
+            topics.extend(row["topic"].split(","))
+        return topics
+
+    def nodes(self):
+        return [self.to_dict(row) for row in self.query("SELECT * FROM nlucell")]
+
+    def topic_nodes(self, topic):
+        rows = self.query("SELECT * FROM nlucell WHERE topic = ?", (topic,))
+        return [self.to_dict(row) for row in rows]
+
+    def find_node(self, name, topic, tid):
+        rows = self.query("SELECT * FROM nlucell WHERE name = ? AND topic = ? AND tid = ? " \
+            "LIMIT 1", (name, topic, tid))
+        return self.to_dict(rows[0]) if rows else None
+
+    def key_sentence(self, question, topics):
+        rows = self.query("SELECT * FROM nlucell WHERE instr(?, name) > 0 AND topic IN (%s) " \
+            "LIMIT 1" % ",".join("?" * len(topics)), [question] + list(topics))
+        return self.to_dict(rows[0]) if rows else None
+
+    def add_memory(self, question, userid, qa_id, previous_qa_id):
+        self.execute("INSERT INTO memory (qa_id, question, userid, previous) " \
+            "VALUES (?, ?, ?, ?)", (qa_id, question, userid, previous_qa_id))
+
+    def add_user(self, properties):
+        properties = dict(properties)
+        userid = properties.pop("userid")
+        self.execute("INSERT OR IGNORE INTO user (userid, properties) VALUES (?, ?)", \
+            (userid, json.dumps(properties, ensure_ascii=False)))
+
+    def merge_config(self, userid, name, topic):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO config (name, topic) VALUES (?, ?)", \
+                (name, topic))
+            self.conn.execute("INSERT OR IGNORE INTO user_config (userid, name) VALUES (?, ?)", \
+                (userid, name))
+
+    def add_nodes(self, nodes):
+        columns = FIELDS + ("digest",)
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO nlucell (%s) VALUES (%s)" \
+                % (", ".join(columns), ",".join("?" * len(columns))), \
+                [[node.get(key, "") for key in columns] for node in nodes])
+
+    @staticmethod
+    def to_dict(row):
+        """Convert row to knowledge node dict. 将行转换为知识节点字典。
+        """
+        node = dict(row)
+        del node["digest"]
+        return node
+
+
+def to_dict(node):
+    """Convert graph node to knowledge node dict.
+    将图数据库节点转换为知识节点字典。
+    """
+    data = dict.fromkeys(FIELDS, "")
+    data.update(node)
+    data["nid"] = remote(node)._id
+    return data
+
+def get_store(backend=None, password="train"):
+    """Create store of backend in section 'store' of config.
+    创建配置文件 'store' 节指定的存储后端。
+
+    Args:
+        backend: 'neo4j' or 'sqlite'. 存储后端。
+            Defaults to None represents the configured backend.
+        password: Password of Neo4j. Neo4j 密码。
+            Defaults to "train".
+    """
+    backend = backend if backend else config.get("store", "backend")
+    if backend == "sqlite":
+        return SqliteStore(config.get("store", "sqlite"))
+    return Neo4jStore(password=password)
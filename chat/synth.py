@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""synth
+
+Synthetic knowledge base generator for scaling benchmarks.
+用于规模测试的合成知识库生成器。
+
+Questions are built from Cilin synonym groups of 'dict/synonymdict.txt': every
+row of the knowledge base is a family of paraphrases that pick different
+synonyms for the same codes, so they get the same semantic tag like
+paraphrases written by hand. Rows are spread over topics, and a part of them
+forms scene trees linked by tid and the img/button JSON of 'Robot.search'.
+The output is an .xls workbook in the format of 'Database.download', which
+can be imported with 'Database.handle_excel', 'Database.bulk_excel' or
+'Database.sync_excel', and a question set for 'client.batch_run' and 'loadgen'.
+问题由 'dict/synonymdict.txt' 中的词林同义词组构造：知识库的每一行是一组复述，
+对相同的词林编码选取不同的同义词，因此与人工编写的复述一样具有相同的语义标签。
+各行分布在多个话题中，其中一部分组成通过 tid 及 img/button JSON 链接的场景树。
+输出为 'Database.download' 格式的 .xls 工作簿，可用 'Database.handle_excel'，
+'Database.bulk_excel' 或 'Database.sync_excel' 导入，以及用于 'client.batch_run'
+和 'loadgen' 的问题集。
+
+Available functions:
+- load_cilin: Load synonym groups of Cilin. 加载词林同义词组。
+- generate: Generate knowledge base and question set. 生成知识库及问题集。
+
+Usage:
+    from chat.synth import generate
+    generate("synth.xls", cells=100000, question_file="synth.txt")
+"""
+import os
+import json
+import random
+from .mytools import write_excel
+from .kb import export_columns
+
+thispath = os.path.split(os.path.realpath(__file__))[0]
+synonymdict = os.path.join(thispath, "dict", "synonymdict.txt")
+# 问题模板：{0} 为动作，{1} 为对象
+templates = ["{0}{1}", "我想{0}{1}", "请问怎么{0}{1}", "帮我{0}{1}", "{0}{1}怎么办", \
+    "如何{0}{1}", "可以{0}{1}吗", "我要{0}{1}"]
+# 词林大类：动作类（F 动作，H 活动）与对象类（B 物，D 抽象事物）
+verb_classes = "FH"
+noun_classes = "BD"
+
+
+def load_cilin(filename=synonymdict):
+    """Load synonym groups of Cilin. 加载词林同义词组。
+
+    Only groups of synonyms (codes end with '=') with at least two words of
+    two or more characters are kept.
+    只保留至少含两个双字及以上词语的同义词组（编码以 '=' 结尾）。
+
+    Returns:
+        Dict of code to word list. 词林编码到词语列表的字典。
+    """
+    groups = {}
+    with open(filename, 'r', encoding="UTF-8") as file:
+        for line in file:
+            items = line.split()
+            if len(items) == 3 and items[2].endswith("=") and len(items[0]) > 1:
+                groups.setdefault(items[2], []).append(items[0])
+    return {code: words for code, words in groups.items() if len(words) > 1}
+
+def paraphrase(rng, verbs, nouns):
+    """Build one paraphrase from synonym groups of action and object.
+    由动作与对象的同义词组构造一个复述。
+    """
+    return rng.choice(templates).format(rng.choice(verbs), rng.choice(nouns))
+
+def family(rng, groups, verb_codes, noun_codes, size):
+    """Build a family of distinct paraphrases. 构造一组不重复的复述。
+
+    Returns:
+        List of paraphrases, the words of the first one. 复述列表及首个复述的词语。
+    """
+    verbs = groups[rng.choice(verb_codes)]
+    nouns = groups[rng.choice(noun_codes)]
+    questions = []
+    # 同义词组较小时可能凑不满 size 个不同的复述
+    for _ in range(size * 4):
+        question = paraphrase(rng, verbs, nouns)
+        if question not in questions:
+            questions.append(question)
+        if len(questions) == size:
+            break
+    return questions, (verbs[0], nouns[0])
+
+def row(questions, content, topic, **kwargs):
+    """Build a knowledge row in format of 'export_columns'.
+    构造 'export_columns' 格式的知识行。
+    """
+    data = dict.fromkeys((key for key, _ in export_columns), "")
+    data.update(name="|".join(questions), content=content, topic=topic, hot="0", **kwargs)
+    return {"n": data}
+
+def scene(rng, groups, verb_codes, noun_codes, topic, paraphrases, branch, depth):
+    """Build rows of a scene tree in breadth first order.
+    按广度优先顺序构造场景树的各行。
+
+    The root has tid 0. Every node links its children by img and by button
+    'area', its first child by button 'next' and its parent by button
+    'previous', in the img/button format read by 'ianswer.answer2xml'.
+    'previous' of the root and 'next' of a leaf are empty.
+    根节点 tid 为 0，每个节点通过 img 和 button 的 'area' 链接子节点，通过 button 的
+    'next' 链接第一个子节点，通过 'previous' 链接父节点，格式与 'ianswer.answer2xml'
+    读取的 img/button 相同。根节点的 'previous' 与叶节点的 'next' 为空。
+
+    Returns:
+        (rows, held_out): Rows of scene and held-out paraphrases. 场景各行及留出的复述。
+    """
+    held_out = []
+
+    def add(tid, parent):
+        questions, _ = family(rng, groups, verb_codes, noun_codes, paraphrases + 1)
+        held_out.append(questions.pop())
+        nodes.append((tid, questions, parent))
+
+    nodes = [] # (tid, 问题列表, 父节点 tid)
+    add(0, None)
+    frontier = [0]
+    for _ in range(depth):
+        level = []
+        for parent in frontier:
+            for _ in range(branch):
+                level.append(len(nodes))
+                add(len(nodes), parent)
+        frontier = level
+    children = {}
+    names = {}
+    for node_tid, questions, parent in nodes:
+        names[node_tid] = questions[0]
+        if parent is not None:
+            children.setdefault(parent, []).append((node_tid, questions[0]))
+    rows = []
+    for node_tid, questions, parent in nodes:
+        links = children.get(node_tid, [])
+        img = {"area_%d" % pos: {"pos": pos, "content": question, \
+            "iurl": "img/%s/%d.png" % (topic, child), "url": str(child)} \
+            for pos, (child, question) in enumerate(links, 1)}
+        button = {
+            "previous": {"pos": 0, "content": names[parent], "url": str(parent)} \
+                if parent is not None else {},
+            "next": {"pos": len(links) + 1, "content": links[0][1], "url": str(links[0][0])} \
+                if links else {},
+            "area": {"area_%d" % pos: {"pos": pos, "content": question, "url": str(child)} \
+                for pos, (child, question) in enumerate(links, 1)}
+            }
+        rows.append(row(questions, "%s第%d步" % (topic, node_tid), topic, tid=node_tid, \
+            img=json.dumps(img, ensure_ascii=False) if img else "", \
+            button=json.dumps(button, ensure_ascii=False), \
+            description=topic if node_tid == 0 else ""))
+    return rows, held_out
+
+def generate(filename="synth.xls", cells=10000, topics=20, paraphrases=3, scene_ratio=0.1, \
+    branch=3, depth=2, question_file=None, question_ratio=0.1, seed=0):
+    """Generate knowledge base and question set.
+    生成知识库及问题集。
+
+    Args:
+        filename: Path of .xls knowledge base. 知识库 .xls 文件路径。
+            Defaults to "synth.xls".
+        cells: Approximate number of NluCell nodes after import. 导入后的 NluCell 节点数（近似）。
+            Defaults to 10000.
+        topics: Number of QA topics, one sheet each. 问答话题数，每个话题一个子表格。
+            Defaults to 20.
+        paraphrases: Questions per row. 每行的问题复述数。
+            Defaults to 3.
+        scene_ratio: Ratio of cells in scene trees. 场景树中的节点比例。
+            Defaults to 0.1.
+        branch: Children of each scene node. 场景节点的子节点数。
+            Defaults to 3.
+        depth: Depth of scene trees below the root. 场景树根节点以下的深度。
+            Defaults to 2.
+        question_file: Path of question set, one question per line.
+            问题集文件路径，每行一个问题。
+            Defaults to None represents no question set.
+        question_ratio: Ratio of rows that add a question to the set. Half
+            of them are held-out paraphrases not in the knowledge base, the
+            other half are questions of the knowledge base.
+            向问题集添加问题的行比例，一半为知识库中没有的留出复述，一半为知识库中的问题。
+            Defaults to 0.1.
+        seed: Random seed. 随机种子。
+            Defaults to 0.
+
+    Returns:
+        Dict of the number of rows, cells, scenes and questions. 行数、节点数、场景数及问题数。
+    """
+    rng = random.Random(seed)
+    groups = load_cilin()
+    verb_codes = sorted(code for code in groups if code[0] in verb_classes)
+    noun_codes = sorted(code for code in groups if code[0] in noun_classes)
+    scene_size = sum(branch ** level for level in range(depth + 1))
+    scenes = int(cells * scene_ratio / paraphrases / scene_size)
+    qa_rows = max(int(cells / paraphrases) - scenes * scene_size, 0)
+    questions = []
+    summary = dict(rows=0, cells=0, scenes=scenes, questions=0)
+
+    def sample(family_questions, held_out):
+        if question_file and rng.random() < question_ratio:
+            questions.append(held_out if rng.random() < 0.5 else rng.choice(family_questions))
+
+    def qa_items(topic, number):
+        for _ in range(number):
+            family_questions, words = family(rng, groups, verb_codes, noun_codes, paraphrases + 1)
+            held_out = family_questions.pop()
+            sample(family_questions, held_out)
+            summary["rows"] += 1
+            summary["cells"] += len(family_questions)
+            yield row(family_questions, "关于%s%s的回答" % words, topic)
+
+    def scene_items():
+        for index in range(scenes):
+            rows, held_out = scene(rng, groups, verb_codes, noun_codes, "场景%04d" % index, \
+                paraphrases, branch, depth)
+            for item in rows:
+                family_questions = item["n"]["name"].split("|")
+                # 场景入口只能通过根节点问题进入
+                if item["n"]["tid"] == 0:
+                    sample(family_questions, held_out[0])
+                summary["rows"] += 1
+                summary["cells"] += len(family_questions)
+                yield item
+
+    def sheets():
+        for index in range(topics):
+            # 余数分给前面的话题
+            number = qa_rows // topics + (1 if index < qa_rows % topics else 0)
+            topic = "话题%04d" % index
+            yield {"name": topic, "info": export_columns, "items": qa_items(topic, number)}
+        if scenes:
+            yield {"name": "业务场景", "info": export_columns, "items": scene_items()}
+
+    write_excel(filename=filename, sheets=sheets())
+    if question_file:
+        rng.shuffle(questions)
+        with open(question_file, 'w', encoding="UTF-8") as file:
+            for question in questions:
+                file.write(question + "\n")
+        summary["questions"] = len(questions)
+    print("Generate %s: %s" % (filename, summary))
+    return summary
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# PEP 8 check with Pylint
+"""trace
+
+Lightweight tracing of nlu server, robot and database manager.
+语义服务器、机器人与知识库管理的轻量级追踪。
+
+A span times one block of code. Spans opened inside another span in the same
+thread are its children, so a request is recorded as a tree: server.process
+contains Robot.search, which contains get_usergraph, extract_synonym and so
+on. Sampling is decided once per root span and applies to the whole tree.
+For sampled spans the tracer keeps aggregated statistics per span name and
+a bounded buffer of finished spans that can be exported to a JSONL file or a
+Chrome trace file (open in chrome://tracing or Perfetto).
+span 对一段代码计时。同一线程中在另一个 span 内打开的 span 为其子节点，因此一次请求被记录为一棵树：
+server.process 包含 Robot.search，后者又包含 get_usergraph、extract_synonym 等。
+采样在根 span 处决定一次，并作用于整棵树。对采样到的 span，按名称聚合统计，
+并在有界缓冲区中保存已结束的 span，可导出为 JSONL 文件或 Chrome trace 文件
+（在 chrome://tracing 或 Perfetto 中打开）。
+
+Disabled tracing costs one attribute check per span.
+未启用追踪时每个 span 只有一次属性判断的开销。
+
+Available classes:
+- Tracer: Collector of spans. span 收集器。
+
+Available functions:
+- span: Open a span with the default tracer. 用默认追踪器打开 span。
+- traced: Decorator to run function in a span. 在 span 中运行函数的装饰器。
+- configure: Configure the default tracer. 配置默认追踪器。
+- stats: Aggregated statistics of the default tracer. 默认追踪器的聚合统计。
+- export: Export spans of the default tracer. 导出默认追踪器的 span。
+
+Usage:
+    configure(enabled=True, sample=0.1)
+    with span("search", question=question):
+        ...
+    export("trace.json")
+"""
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from functools import wraps
+
+
+class NoopSpan():
+    """Span that records nothing. 不记录任何内容的 span。
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attrs):
+        """Ignore attributes. 忽略属性。
+        """
+        pass
+
+
+NOOP = NoopSpan()
+
+
+class Unsampled(NoopSpan):
+    """Root span not chosen by sampling, marks its children unsampled.
+    未被采样的根 span，其子 span 同样不采样。
+    """
+    __slots__ = ("stack",)
+
+    def __init__(self, stack):
+        self.stack = stack
+
+    def __enter__(self):
+        self.stack.append(None)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.pop()
+        return False
+
+
+class Span():
+    """Sampled span. 采样到的 span。
+
+    Public attributes:
+    - name: Span name. span 名称。
+    - attrs: Attributes recorded with span. 随 span 记录的属性。
+    """
+    __slots__ = ("tracer", "stack", "name", "attrs", "start")
+
+    def __init__(self, tracer, stack, name, attrs):
+        self.tracer = tracer
+        self.stack = stack
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+
+    def __enter__(self):
+        self.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        self.stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self, end, len(self.stack))
+        return False
+
+    def set(self, **attrs):
+        """Add attributes to span. 为 span 添加属性。
+        """
+        self.attrs.update(attrs)
+
+
+class Tracer():
+    """Collector of spans. span 收集器。
+
+    Public attributes:
+    - enabled: Whether spans are recorded. 是否记录 span。
+    - sample: Probability to record a root span and its children.
+        记录一个根 span 及其子 span 的概率。
+    - echo: Whether 'mytools.time_me' prints elapsed time.
+        'mytools.time_me' 是否打印耗时。
+    - events: Finished spans, oldest are dropped when full.
+        已结束的 span，满时丢弃最早的。
+    """
+    def __init__(self, enabled=False, sample=1.0, maxlen=100000, echo=True):
+        self.enabled = enabled
+        self.sample = sample
+        self.echo = echo
+        self.events = deque(maxlen=maxlen)
+        # 名称 -> [次数, 总耗时, 最小耗时, 最大耗时, 错误数]，单位秒
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.epoch = time.perf_counter()
+        self.pid = os.getpid()
+
+    def span(self, name, **attrs):
+        """Open a span as context manager. 以上下文管理器打开 span。
+
+        Args:
+            name: Span name. span 名称。
+            attrs: Attributes recorded with span. 随 span 记录的属性。
+        """
+        if not self.enabled:
+            return NOOP
+        try:
+            stack = self.local.stack
+        except AttributeError:
+            stack = self.local.stack = []
+        if stack:
+            if stack[-1] is None:
+                return NOOP
+        elif self.sample < 1.0 and random.random() >= self.sample:
+            return Unsampled(stack)
+        return Span(self, stack, name, attrs)
+
+    def record(self, span, end, depth):
+        """Record finished span. 记录已结束的 span。
+        """
+        duration = end - span.start
+        with self.lock:
+            total = self.totals.get(span.name)
+            if total is None:
+                self.totals[span.name] = [1, duration, duration, duration, \
+                    int("error" in span.attrs)]
+            else:
+                total[0] += 1
+                total[1] += duration
+                total[2] = min(total[2], duration)
+                total[3] = max(total[3], duration)
+                total[4] += "error" in span.attrs
+        self.events.append((span.name, span.start - self.epoch, duration, \
+            threading.get_ident(), depth, span.attrs))
+
+    def stats(self):
+        """Aggregated statistics per span name in milliseconds.
+        按 span 名称聚合的统计，单位毫秒。
+
+        Returns:
+            Dict of name to dict of count, total, mean, min, max and errors.
+            名称到次数、总耗时、平均耗时、最小耗时、最大耗时及错误数的字典。
+        """
+        with self.lock:
+            totals = {name: list(total) for name, total in self.totals.items()}
+        return {name: dict(count=count, total=1000 * total, mean=1000 * total / count, \
+            min=1000 * least, max=1000 * most, errors=errors) \
+            for name, (count, total, least, most, errors) in totals.items()}
+
+    def reset(self):
+        """Clear statistics and buffered spans. 清空统计与缓冲的 span。
+        """
+        with self.lock:
+            self.totals.clear()
+            self.events.clear()
+
+    def export(self, filename, format=None):
+        """Export buffered spans. 导出缓冲的 span。
+
+        Args:
+            filename: Path of output file. 输出文件路径。
+            format: 'jsonl', one span per line, or 'chrome', Chrome trace
+                event format. 'jsonl' 每行一个 span，'chrome' 为 Chrome trace 事件格式。
+                Defaults to None: 'chrome' for '.json' files, else 'jsonl'.
+
+        Returns:
+            Number of exported spans. 导出的 span 数。
+        """
+        if format is None:
+            format = "chrome" if filename.endswith(".json") else "jsonl"
+        assert format in ("jsonl", "chrome"), "format must be 'jsonl' or 'chrome'."
+        events = list(self.events)
+        with open(filename, "w", encoding="UTF-8") as file:
+            if format == "jsonl":
+                for name, start, duration, tid, depth, attrs in events:
+                    file.write(json.dumps(dict(name=name, start=start, duration=duration, \
+                        tid=tid, depth=depth, attrs=attrs), ensure_ascii=False, \
+                        default=str) + "\n")
+            else:
+                # 完整事件 'X'，时间单位为微秒
+                json.dump(dict(traceEvents=[dict(name=name, cat="chat", ph="X", \
+                    ts=1e6 * start, dur=1e6 * duration, pid=self.pid, tid=tid, args=attrs) \
+                    for name, start, duration, tid, depth, attrs in events], \
+                    displayTimeUnit="ms"), file, ensure_ascii=False, default=str)
+        return len(events)
+
+
+# 默认追踪器
+tracer = Tracer()
+
+def span(name, **attrs):
+    """Open a span with the default tracer. 用默认追踪器打开 span。
+    """
+    return tracer.span(name, **attrs)
+
+def traced(name=None):
+    """Decorator to run function in a span of the default tracer.
+    在默认追踪器的 span 中运行函数的装饰器。
+
+    Args:
+        name: Span name. span 名称。
+            Defaults to None represents qualified name of function.
+    """
+    def _traced(func):
+        span_name = name if name else func.__qualname__
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return _wrapper
+    return _traced
+
+def configure(enabled=None, sample=None, maxlen=None, echo=None):
+    """Configure the default tracer, None keeps current setting.
+    配置默认追踪器，为 None 时保持当前设置。
+    """
+    if sample is not None:
+        assert 0 <= sample <= 1, "sample must be in [0, 1]."
+        tracer.sample = sample
+    if maxlen is not None:
+        tracer.events = deque(tracer.events, maxlen=maxlen)
+    if echo is not None:
+        tracer.echo = echo
+    if enabled is not None:
+        tracer.enabled = enabled
+
+def stats():
+    """Aggregated statistics of the default tracer. 默认追踪器的聚合统计。
+    """
+    return tracer.stats()
+
+def export(filename, format=None):
+    """Export spans of the default tracer. 导出默认追踪器的 span。
+    """
+    return tracer.export(filename, format)
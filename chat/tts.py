@@ -5,14 +5,59 @@
 
 Local and online TTS. 离在线语音合成。
 
+Online audio is cached on disk by text, voice and language, see
+'cache.FileCache', so fixed greetings and scene prompts are synthesized once.
+The access token is cached in the same directory until it expires.
+在线合成的音频按文本、音色与语言缓存在磁盘上（见 'cache.FileCache'），固定的问候语与场景提示只合成一次。
+访问口令缓存在同一目录中直到过期。
+
+'TTS.say_stream' splits long answers into sentences, synthesizes them
+concurrently and starts playing the first one while the rest are fetched.
+'TTS.say_stream' 将长回答切分为句子并发合成，在其余句子获取期间即开始播放第一句。
+
+The default audio player (pygame) and local TTS service (SAPI) are imported
+only when no other one is given. 未指定时才导入默认的音频播放器（pygame）和本地TTS服务（SAPI）。
+
 Available functions:
 - All classes and functions: 所有类和函数
 """
 import os
+import re
+import json
+import time
 import uuid
-import requests
-import pygame.mixer as mixer
-import win32com.client
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .cache import FileCache
+from .config import config
+from .httpclient import Endpoint, HttpClient
+
+client = HttpClient(pool_maxsize=4)
+# 句末标点，切分后标点留在句尾
+sentence_end = re.compile(r"(?<=[。！？；!?;…\n])")
+# 过长句子的次级切分点
+clause_end = re.compile(r"(?<=[，,、：:])")
+
+def split_sentences(text, max_length=60):
+    """Split text at sentence boundaries, then split sentences longer than
+    'max_length' at clause boundaries.
+    在句末切分文本，再将长于 'max_length' 的句子在分句处切分。
+
+    Returns:
+        List of non-empty sentences. 非空句子列表。
+    """
+    sentences = []
+    for sentence in sentence_end.split(text):
+        parts = clause_end.split(sentence) if len(sentence) > max_length else [sentence]
+        # 合并过短的分句，减少请求数
+        merged = ""
+        for part in parts:
+            if merged and len(merged) + len(part) > max_length:
+                sentences.append(merged)
+                merged = ""
+            merged += part
+        sentences.append(merged)
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
 
 
 class RequestError(Exception):
@@ -35,11 +80,14 @@ class TTS():
     - url_get_base: The url of get requests。 GET请求的URL地址。
     - url_post_base: The url of get requests。 POST请求的URL地址。
     - language: The language of send text。 发送文本的语言。
+    - voice: Voice parameters of TTS service. TTS服务的音色参数。
+    - cache: Audio cache. 音频缓存。
     """
-    def __init__(self, audioplayer=None, tempdir="."):
+    def __init__(self, audioplayer=None, tempdir=None):
         if audioplayer:
             self.audioplayer = audioplayer
         else:
+            import pygame.mixer as mixer
             self.audioplayer = mixer
         self.audioplayer.init()
         self.app_key = "QrhsINLcc3Io6w048Ia8kcjS"
@@ -47,23 +95,71 @@ class TTS():
         self.url_tok_base = "https://openapi.baidu.com/oauth/2.0/token"
         self.url_get_base = "http://tsn.baidu.com/text2audio"
         self.url_post_base = "http://tsn.baidu.com/text2audio"
-        self.access_token = self.get_token()
+        timeout = config.getfloat("tts", "timeout", minimum=0.1)
+        self.token_endpoint = Endpoint("tts_token", self.url_tok_base, method="GET", \
+            timeout=timeout)
+        self.audio_endpoint = Endpoint("tts", self.url_get_base, method="GET", timeout=timeout)
         self.mac_address = uuid.UUID(int=uuid.getnode()).hex[-12:]
         self.language = 'zh'
-        self.tempdir = tempdir if os.path.isdir(tempdir) else "."
+        self.voice = {"vol": "9"}
+        self.tempdir = tempdir if tempdir else config.get("tts", "cache_dir")
+        self.cache = FileCache(self.tempdir, suffix=".mp3", \
+            max_bytes=config.getint("tts", "cache_max_mb", minimum=1) * 1024 * 1024)
+        self.token_file = os.path.join(self.tempdir, "token.json")
+        self.token_lock = threading.Lock()
+        self.token = self.load_token()
+        # 每次开始说话时递增，旧的流式播放据此停止
+        self.utterance = 0
+
+    def load_token(self):
+        """Load cached token, or an expired one if missing.
+        加载缓存的口令，不存在时返回已过期的口令。
+        """
+        try:
+            with open(self.token_file, encoding="UTF-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {"access_token": "", "expires_at": 0}
 
     def get_token(self):
-        """Get token.
-        获取API服务口令。
+        """Get token, request a new one when it expires in an hour.
+        获取API服务口令，一小时内过期时重新申请。
         """
-        data = {
-	            "grant_type": "client_credentials",
-	            "client_id": self.app_key,
-	            "client_secret": self.secret_key
-	            }
-        response = requests.get(url=self.url_tok_base, params=data)
-        access_token = response.json()['access_token']
-        return access_token
+        with self.token_lock:
+            if self.token["expires_at"] - time.time() > 3600:
+                return self.token["access_token"]
+            data = {
+	                "grant_type": "client_credentials",
+	                "client_id": self.app_key,
+	                "client_secret": self.secret_key
+	                }
+            result = client.request(self.token_endpoint, params=data)
+            if not result or "access_token" not in result:
+                raise RequestError("Failed to get token: %s" % result)
+            self.token = {"access_token": result["access_token"], \
+                "expires_at": time.time() + result.get("expires_in", 0)}
+            temp = "%s.%s.tmp" % (self.token_file, uuid.uuid4().hex)
+            with open(temp, "w", encoding="UTF-8") as file:
+                json.dump(self.token, file)
+            os.replace(temp, self.token_file)
+            return self.token["access_token"]
+
+    def synthesize(self, info):
+        """Get path of audio of info from cache, or synthesize and cache it.
+        从缓存获取信息的音频路径，不存在时合成并缓存。
+        """
+        key = self.cache.key(info, self.language, sorted(self.voice.items()))
+        filename = self.cache.get(key)
+        if filename:
+            return filename
+        data = dict(self.voice, tex=info, lan=self.language, cuid=self.mac_address, ctp="1", \
+            tok=self.get_token())
+        response = client.request(self.audio_endpoint, params=data, parse=None)
+        # 合成失败时返回 json 格式的错误信息
+        if response is None or not response.headers.get("Content-Type", "").startswith("audio"):
+            raise RequestError("Failed to synthesize %s: %s" % (info, \
+                response.text if response is not None else "no response"))
+        return self.cache.put(key, response.content)
 
     def say(self, info):
         """Baidu TTS service.
@@ -72,25 +168,72 @@ class TTS():
         Official documents: http://yuyin.baidu.com/docs/tts/136
         """
         assert isinstance(info, str), "Info must be a string!"
-        data = {
-	            "tex": info,
-	            "lan": self.language,
-	            "vol": "9",
-	            "cuid": self.mac_address,
-	            "ctp": "1",
-	            "tok": self.access_token
-	            }
-        headers = {"Content-Type": "audio/mp3"}
+        self.utterance += 1
         try:
-            response = requests.get(url=self.url_get_base, params=data, headers=headers)
-            filename = self.tempdir + "/temp.mp3"
-            with open(filename, "wb") as file:
-                file.write(response.content)
+            filename = self.synthesize(info)
             self.audioplayer.music.load(filename)
             self.audioplayer.music.play()
         except RequestError as error:
             print(error)
 
+    def say_stream(self, info, workers=4, max_length=60, interval=0.05):
+        """Say info sentence by sentence while later sentences are synthesized.
+        逐句说出信息，同时合成后续句子。
+
+        Sentences are synthesized concurrently and played in order, each one
+        as soon as it is ready and the previous one has finished. Saying
+        something else stops the rest of the stream.
+        句子并发合成并按顺序播放，每句在就绪且上一句播放结束后立即播放。开始说别的内容时停止剩余的句子。
+
+        Args:
+            info: Text to say. 要说的文本。
+            workers: Number of concurrent synthesis requests. 并发合成请求数。
+                Defaults to 4.
+            max_length: Max length of a sentence, see 'split_sentences'. 句子最大长度。
+                Defaults to 60.
+            interval: Seconds between checks of playback end. 检查播放结束的间隔秒数。
+                Defaults to 0.05.
+
+        Returns:
+            Thread that plays sentences. 播放句子的线程。
+        """
+        assert isinstance(info, str), "Info must be a string!"
+        self.utterance += 1
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(self.synthesize, sentence) \
+            for sentence in split_sentences(info, max_length)]
+        executor.shutdown(wait=False)
+        thread = threading.Thread(target=self.play_in_order, daemon=True, \
+            args=(futures, self.utterance, interval))
+        thread.start()
+        return thread
+
+    def play_in_order(self, futures, utterance, interval):
+        """Play synthesized sentences in order until another utterance starts.
+        按顺序播放合成的句子，直到开始新的说话。
+
+        A sentence that fails to synthesize or play is logged and skipped.
+        合成或播放失败的句子记录后跳过。
+        """
+        music = self.audioplayer.music
+        for future in futures:
+            try:
+                filename = future.result()
+            except (RequestError, OSError, ValueError) as error:
+                print(error)
+                continue
+            while music.get_busy() and utterance == self.utterance:
+                time.sleep(interval)
+            if utterance != self.utterance:
+                break
+            try:
+                music.load(filename)
+                music.play()
+            except (OSError, ValueError) as error:
+                print(error)
+        for future in futures:
+            future.cancel()
+
 
 class LTTS():
     """Local TTS.
@@ -103,6 +246,7 @@ class LTTS():
         if service:
             self.service = service
         else:
+            import win32com.client
             self.service = win32com.client.Dispatch("SAPI.SpVoice")
         self.language = 'zh'
 
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.append("../")
+import json
+import asyncio
+from unittest import TestCase, main
+from chat.aioclient import AsyncClient
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.userid = "A0001"
+
+    def test_match(self):
+        sentences = ['理财产品', '你好', '理财产品取号', '退出', '你好']
+        async def ask():
+            client = AsyncClient(connections=2)
+            results = await asyncio.gather(
+                *[client.match(question=sentence, userid=self.userid) for sentence in sentences])
+            client.close()
+            return results
+        results = asyncio.get_event_loop().run_until_complete(ask())
+        for sentence, result in zip(sentences, results):
+            print(sentence, ':\n', json.loads(result))
+
+    def test_out_of_order(self):
+        async def handle(reader, writer):
+            # 本地桩服务器：收齐两个请求后按相反顺序回答，回答内容为问题本身
+            parser = json.JSONDecoder()
+            buffer = ""
+            requests = []
+            while len(requests) < 2:
+                buffer += (await reader.read(4096)).decode("UTF-8")
+                while buffer.strip():
+                    try:
+                        request, end = parser.raw_decode(buffer.lstrip())
+                    except ValueError:
+                        break
+                    requests.append(request)
+                    buffer = buffer.lstrip()[end:]
+            for request in reversed(requests):
+                writer.write(json.dumps({"content": request["ask_content"], \
+                    "id": request["id"]}).encode("UTF-8"))
+            await writer.drain()
+            writer.close()
+
+        async def ask():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncClient(host="127.0.0.1", port=port, connections=1, timeout=5.0)
+            try:
+                return await asyncio.gather(client.match("第一个", self.userid), \
+                    client.match("第二个", self.userid))
+            finally:
+                client.close()
+                server.close()
+                await server.wait_closed()
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(ask())
+        finally:
+            loop.close()
+        # 按 id 匹配乱序到达的回答
+        self.assertEqual([json.loads(result)["content"] for result in results], \
+            ["第一个", "第二个"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import sys
+import os
+import tempfile
+sys.path.append("../")
+from unittest import TestCase, main
+from chat.cache import LRUCache, TTLCache, FileCache
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.cache = LRUCache(maxsize=2)
+
+    def test_lru(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.cache.set("c", 3) # 淘汰最近最少使用的 "b"
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.get("c"), 3)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_cache_none(self):
+        missing = object()
+        self.cache.set("none", None)
+        self.assertIsNone(self.cache.get("none", missing))
+        self.assertIs(self.cache.get("other", missing), missing)
+
+    def test_ttl(self):
+        now = [0.0]
+        cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+        now[0] = 9.0
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 10.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+        self.assertEqual(cache.misses, 1)
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileCache(directory, max_bytes=10, suffix=".mp3")
+            key = cache.key("你好", "zh", 9)
+            self.assertIsNone(cache.get(key))
+            path = cache.put(key, b"12345")
+            self.assertEqual(cache.get(key), path)
+            os.utime(path, (0, 0))
+            other = cache.put(cache.key("再见"), b"123456")
+            # 超过大小上限时淘汰最近最少使用的文件
+            self.assertIsNone(cache.get(key))
+            self.assertEqual(cache.get(cache.key("再见")), other)
+            self.assertEqual(cache.size, 6)
+            self.assertEqual(FileCache(directory, suffix=".mp3").size, 6)
+
+
+if __name__ == '__main__':
+    main()
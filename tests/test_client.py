@@ -3,8 +3,11 @@ import os
 import sys
 sys.path.append("../")
 import json
+import time
+import threading
+import socketserver
 from unittest import TestCase, main
-from chat.client import match, config, batch_test
+from chat.client import Client, match, config, batch_test, batch_run
 from chat.mytools import get_current_time
 
 class TestMe(TestCase):
@@ -35,8 +38,44 @@ class TestMe(TestCase):
         skbs = [item['name'] for item in databases if item['bselected']==1 ]
         print('skbs: ', skbs)
         
+    def test_client_pool(self):
+        client = Client(pool_size=4, timeout=10.0)
+        results = []
+        def ask(sentence):
+            results.append(json.loads(client.match(question=sentence, userid=self.userid)))
+        threads = [threading.Thread(target=ask, args=(sentence,)) for sentence in ['你好'] * 8]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.close()
+        self.assertEqual(len(results), 8)
+
     def test_batch_test(self):
         batch_test("testcase.txt")
 
+    def test_batch_run(self):
+        summary = batch_run("testcase.txt", output="testresult.jsonl", concurrency=8)
+        self.assertEqual(summary["errors"], 0)
+
+    def test_closed_idle_connection(self):
+        # 桩服务器回答一个请求后关闭连接，客户端应在发送前换用新连接且不重复发送
+        answers = []
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                if self.request.recv(4096):
+                    answers.append(1)
+                    self.request.sendall(json.dumps({"n": len(answers)}).encode("UTF-8"))
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = Client(host="127.0.0.1", port=server.server_address[1])
+        self.assertEqual(json.loads(client.match("你好"))["n"], 1)
+        time.sleep(0.1)
+        self.assertEqual(json.loads(client.match("你好"))["n"], 2)
+        self.assertEqual(len(answers), 2)
+        client.close()
+        server.shutdown()
+        server.server_close()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import sys
+import os
+import time
+import tempfile
+sys.path.append("../")
+from unittest import TestCase, main
+from chat.config import Config, getConfig
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "self.conf")
+        self.write("[server]\nmax_inflight=32\ndeadline=2.0\n\n[reload]\nwatch=1\n")
+        self.config = Config(self.path, environ={})
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, text):
+        with open(self.path, "w", encoding="UTF-8") as file:
+            file.write(text)
+
+    def test_typed(self):
+        self.assertEqual(self.config.getint("server", "max_inflight", minimum=1), 32)
+        self.assertEqual(self.config.getfloat("server", "deadline"), 2.0)
+        self.assertTrue(self.config.getboolean("reload", "watch"))
+        self.assertEqual(self.config.getint("server", "missing", fallback=5), 5)
+        with self.assertRaises(ValueError):
+            self.config.getint("server", "deadline")
+        with self.assertRaises(ValueError):
+            self.config.getint("server", "max_inflight", maximum=16)
+        with self.assertRaises(ValueError):
+            self.config.get("nav", "db")
+
+    def test_environ(self):
+        self.config.environ = {"CHAT_SERVER_MAX_INFLIGHT": "64"}
+        self.assertEqual(self.config.getint("server", "max_inflight"), 64)
+
+    def test_reload(self):
+        reloaded = []
+        self.config.on_reload(reloaded.append)
+        self.assertFalse(self.config.reload())
+        self.write("[server]\nmax_inflight=8\n")
+        os.utime(self.path, (time.time() + 10, time.time() + 10))
+        self.assertTrue(self.config.reload())
+        self.assertEqual(reloaded, [self.config])
+        self.assertEqual(self.config.getint("server", "max_inflight"), 8)
+
+    def test_rollback(self):
+        applied = []
+        def hook(config):
+            applied.append(config.getint("server", "max_inflight", minimum=1))
+            config.getfloat("server", "deadline", minimum=0)
+        self.config.on_reload(hook)
+        self.write("[server]\nmax_inflight=8\ndeadline=-1\n")
+        os.utime(self.path, (time.time() + 10, time.time() + 10))
+        with self.assertRaises(ValueError):
+            self.config.reload()
+        # 钩子失败后恢复并重新应用原配置，文件未再修改时不重复加载
+        self.assertEqual(applied, [8, 32])
+        self.assertEqual(self.config.getint("server", "max_inflight"), 32)
+        self.assertFalse(self.config.reload())
+
+    def test_fallback(self):
+        self.assertIsNone(self.config.getint("server", "missing", fallback=None))
+
+    def test_default(self):
+        self.assertEqual(getConfig("cache", "answer_maxsize"), "10000")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@
 import sys
 sys.path.append("../")
 from unittest import TestCase, main
-from chat.database import Database
+from chat.database import Database, QARow, diff_nodes, row_digest
 from chat.mytools import Walk, time_me
 
 
@@ -23,6 +23,11 @@ class TestMe(TestCase):
         # fnamelist = walker.dir_process(1, path, style="fnamelist")
         pass
 
+    def test_migrate(self):
+        indexes, constraints = self.database.migrate()
+        self.assertEqual(indexes, [])
+        self.assertEqual(constraints, [])
+
     def test_delete(self):
         pass
 
@@ -47,6 +52,33 @@ class TestMe(TestCase):
         # self.database.handle_excel("C:/nlu/data/chat.xls")
 	    # 2.Add qa with txt
         # self.database.handle_txt("C:/nlu/data/bank.txt")
+
+    def test_bulk_excel(self):
+        pass
+        # self.database.bulk_excel("C:/nlu/data/chat.xls", batch_size=1000)
+
+    def test_sync_excel(self):
+        pass
+        # self.database.sync_excel("C:/nlu/data/chat.xls")
+
+    def test_diff_nodes(self):
+        def row(name, content, topic=""):
+            return QARow(name, content, topic, *[""] * (len(QARow._fields) - 3))
+        def record(nid, name, content, topic):
+            node = dict(row(name, content, topic)._asdict())
+            return dict(nid=nid, name=name, topic=topic, digest=row_digest(node))
+        records = [record(1, "你好", "你好呀", "闲聊"), record(2, "再见", "再见", "闲聊"), \
+            record(3, "办卡", "请到柜台", "银行业务"), record(4, "旧问题", "旧回答", "闲聊")]
+        sheets = [("闲聊", [row("你好|早上好", "你好呀"), row("再见", "下次见")])]
+        topics, inserts, updates, stale, kept = diff_nodes(records, sheets)
+        self.assertEqual(topics, {"闲聊": ["闲聊", "闲聊"]})
+        self.assertEqual([node["name"] for node in inserts], ["早上好"])
+        self.assertEqual([(nid, node["content"]) for nid, node in updates], [(2, "下次见")])
+        self.assertEqual(sorted(stale), [3, 4])
+        self.assertEqual(kept, {1, 2})
+        # 只同步部分子表格时不删除其他话题的节点
+        _, _, _, stale, _ = diff_nodes(records, sheets, partial=True)
+        self.assertEqual(stale, [4])
     
     def test_download(self):
         akbs = self.database.get_available_kb()
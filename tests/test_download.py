@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import sys
+import os
+import hashlib
+import tempfile
+import threading
+sys.path.append("../")
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, main
+from chat.download import Downloader, DownloadError
+
+payload = os.urandom(300 * 1024)
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地桩文件服务器：支持 Range，首次请求发送一半后断开连接。
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get("Range"))
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, len(payload) - 1, \
+                len(payload)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.end_headers()
+        if self.server.drop:
+            self.server.drop = False
+            self.wfile.write(payload[start:start + len(payload) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(payload[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.ranges = []
+        self.server.drop = True
+        self.url = "http://127.0.0.1:%d/song.mp3" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.downloader = Downloader(self.tempdir.name, workers=2, block_size=16 * 1024, \
+            timeout=5, retries=2)
+
+    def tearDown(self):
+        self.downloader.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tempdir.cleanup()
+
+    def test_resume(self):
+        md5 = hashlib.md5(payload).hexdigest()
+        path = self.downloader.download(self.url, "song.mp3", size=len(payload), md5=md5)
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), payload)
+        # 断开后从已下载的位置续传
+        self.assertEqual(len(self.server.ranges), 2)
+        offset = int(self.server.ranges[1].split("=")[1].rstrip("-"))
+        self.assertTrue(0 < offset <= len(payload) // 2)
+        self.assertFalse(os.path.exists(path + ".part"))
+        # 已完成的文件不再下载
+        self.downloader.download(self.url, "song.mp3", size=len(payload))
+        self.assertEqual(len(self.server.ranges), 2)
+
+    def test_verify(self):
+        self.server.drop = False
+        with self.assertRaises(DownloadError):
+            self.downloader.download(self.url, "song.mp3", md5="0" * 32)
+        self.assertFalse(os.path.exists(os.path.join(self.tempdir.name, "song.mp3")))
+
+    def test_size_mismatch(self):
+        self.server.drop = False
+        with self.assertRaises(DownloadError):
+            self.downloader.download(self.url, "song.mp3", size=len(payload) + 1)
+        # 大小不符不重试
+        self.assertEqual(len(self.server.ranges), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tempdir.name, "song.mp3.part")))
+
+    def test_submit(self):
+        self.server.drop = False
+        futures = [self.downloader.submit(self.url, "song.mp3") for _ in range(3)]
+        self.assertIs(futures[0], futures[1])
+        self.assertEqual(os.path.getsize(futures[2].result()), len(payload))
+        self.assertEqual(len(self.server.ranges), 1)
+
+
+if __name__ == '__main__':
+    main()
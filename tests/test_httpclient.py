@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import threading
+sys.path.append("../")
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, main
+from chat.cache import TTLCache
+from chat.httpclient import CircuitBreaker, Endpoint, HttpClient
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地桩服务器：/ok 返回请求计数，/slow 延迟回答，/error 返回 500。
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count += 1
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 500 if self.path == "/error" else 200
+        body = json.dumps({"count": self.server.count, "port": self.client_address[1]}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 超时测试中客户端已断开
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.count = 0
+        self.base = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = HttpClient(pool_maxsize=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pool(self):
+        endpoint = Endpoint("ok", self.base + "/ok", timeout=2.0)
+        first = self.client.request(endpoint, data={"q": "你好"})
+        second = self.client.request(endpoint, data={"q": "你好"})
+        self.assertEqual(second["count"], 2)
+        # 连接被复用，客户端端口不变
+        self.assertEqual(first["port"], second["port"])
+
+    def test_cache(self):
+        endpoint = Endpoint("ok", self.base + "/ok", cache=TTLCache(ttl=60))
+        self.client.request(endpoint, cache_key="上海")
+        self.assertEqual(self.client.request(endpoint, cache_key="上海")["count"], 1)
+        self.assertEqual(self.server.count, 1)
+
+    def test_timeout(self):
+        endpoint = Endpoint("slow", self.base + "/slow", timeout=0.1)
+        start = time.monotonic()
+        self.assertEqual(self.client.request(endpoint, fallback="降级"), "降级")
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_breaker(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failures=2, reset_timeout=30, timer=lambda: now[0])
+        endpoint = Endpoint("error", self.base + "/error", breaker=breaker)
+        for _ in range(2):
+            self.assertIsNone(self.client.request(endpoint))
+        self.assertEqual(breaker.state, "open")
+        # 熔断期间不请求上游
+        self.assertIsNone(self.client.request(endpoint))
+        self.assertEqual(self.server.count, 2)
+        # 恢复时间后放行一次试探调用，成功则关闭
+        now[0] = 30.0
+        endpoint.url = self.base + "/ok"
+        self.assertEqual(self.client.request(endpoint)["count"], 3)
+        self.assertEqual(breaker.state, "closed")
+
+
+if __name__ == '__main__':
+    main()
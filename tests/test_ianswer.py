@@ -2,14 +2,11 @@
 import sys
 sys.path.append("../")
 from unittest import TestCase, main
-from chat.ianswer import answer2xml
+from chat.ianswer import answer2xml, answer, fragment_cache
 
 class TestMe(TestCase):
     def setUp(self):
-        pass
-
-    def test_answer2xml(self):
-        data = {
+        self.data = {
             'question': "看看理财产品", # 用户问题
             'content': "我行的各种理财产品请参考下图，您可以点击图标查看详情，也可以语音或手动选择购买。",
             'context': "理财产品",
@@ -23,7 +20,31 @@ class TestMe(TestCase):
             'button': '{"previous": {"pos": 0, "content": "理财产品", "url": "0"}, "next": {"pos": 4, "content": "乾元共享型理财产品", "url": "1"},"area": {"area_1": {"pos": 1, "content": "手机银行办理", "url": "5"}, "area_2": {"pos": 2, "content": "呼叫大堂经理", "url": "6"}, "area_3": {"pos": 3, "content": "理财产品取号", "url": "7"}}}',
             'valid': 1 # valid=0 代表 error_page
         }
-        print(answer2xml(data))
+
+    def test_answer2xml(self):
+        print(answer2xml(self.data))
+
+    def test_fragment_cache(self):
+        data = dict(self.data, nid=7)
+        result = answer2xml(data, version=1)
+        self.assertEqual(result['content'], "")
+        self.assertIn((7, 1), fragment_cache)
+        # 缓存片段拼接的结果与整体格式化模板的结果一致
+        timestamp = result['picurl'].split("<CreateTime>")[1].split("</CreateTime>")[0]
+        expected = answer.format(timestamp=timestamp, news='news', article_count='4', \
+            content=data['content'], context=data['context'], previous="理财产品", \
+            buttons="手机银行办理|呼叫大堂经理|理财产品取号|", next="乾元共享型理财产品", \
+            imgs="乾元共享型理财产品|乾元周周利开放式保本理财产品|乾元私享型理财产品|乾元满溢120天开放式理财产品", \
+            img_url="img/1.jpg", items="\n".join(
+                '<item><Title><![CDATA[]]></Title><Description><![CDATA[]]></Description>'
+                '<PicUrl><![CDATA[img/%d.jpg]]></PicUrl><Url><![CDATA[]]></Url></item>' % index
+                for index in range(2, 5)))
+        self.assertEqual(result['picurl'], expected)
+        # 同一节点 id 的按钮变化时重新渲染
+        changed = dict(data, button="", content="换一个回答")
+        picurl = answer2xml(changed, version=1)['picurl']
+        self.assertIn("换一个回答", picurl)
+        self.assertNotIn("手机银行办理", picurl)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.append("../")
+from unittest import TestCase, main
+from chat.loadgen import schedule, run
+
+class TestMe(TestCase):
+    def setUp(self):
+        pass
+
+    def test_schedule(self):
+        requests = schedule(["你好", "理财产品"], number=100, userids=["A0001", "A0002"], \
+            scene_ratio=0.5)
+        self.assertEqual(len(requests), 100)
+        self.assertTrue(set(userid for userid, _ in requests) <= {"A0001", "A0002"})
+        print(requests[:10])
+
+    def test_schedule_roots(self):
+        requests = schedule(["你好"], number=200, scene_ratio=0.5, roots=["理财产品"])
+        for (_, question), (_, following) in zip(requests, requests[1:]):
+            if following in ("下一步", "上一步") and question not in ("下一步", "上一步"):
+                self.assertEqual(question, "理财产品")
+
+    def test_run(self):
+        run("testcase.txt", pattern="txt", rate=50.0, number=500)
+
+
+if __name__ == '__main__':
+    main()
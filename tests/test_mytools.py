@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
 import sys
+import os
+import json
+import tempfile
 sys.path.append("../")
 from unittest import TestCase, main
+import xlrd
+import chat.mytools
 from chat.mytools import *
 
+class SizeWalk(Walk):
+    def handle_file(self, filepath, pattern=None):
+        return os.path.getsize(filepath)
+
+
 class TestMe(TestCase):
     def setUp(self):
         self.walk = Walk()
@@ -17,6 +27,24 @@ class TestMe(TestCase):
         path = "./"
         self.walk.dir_process(1, path, style="filelist")
     
+    def test_walk(self):
+        with tempfile.TemporaryDirectory() as path:
+            files = ["a.xls", "b.txt", "sub/c.xls", "sub/.hidden.xls", "skip/d.xls", ".git/e.xls"]
+            for index, name in enumerate(files):
+                os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+                with open(os.path.join(path, name), "w") as file:
+                    file.write("x" * index)
+            walker = SizeWalk()
+            found = sorted(os.path.relpath(item, path).replace(os.sep, "/") \
+                for item in walker.walk(path, include="*.xls", exclude=["skip"]))
+            self.assertEqual(found, ["a.xls", "sub/c.xls"])
+            expected = list(walker.process(path, include="*.xls"))
+            self.assertEqual(sorted(size for _, size in expected), [0, 2, 4])
+            for pool in ["thread", "process"]:
+                results = list(walker.process(path, include="*.xls", pool=pool, workers=2, \
+                    max_inflight=2))
+                self.assertEqual(results, expected)
+
     def test_get_timestamp(self):
         print(get_timestamp())
         print(get_timestamp(pattern='s'))
@@ -26,6 +54,34 @@ class TestMe(TestCase):
         print(get_timestamp(s='2018-1-4 11:23:45', pattern='ms'))
         print(get_timestamp(s='2018-1-4-11-23-45', style='%Y-%m-%d-%H-%M-%S', pattern='ms'))
 
+    def test_json_incomplete(self):
+        parser = json.JSONDecoder()
+        def incomplete(text):
+            with self.assertRaises(json.JSONDecodeError) as context:
+                parser.raw_decode(text)
+            return json_incomplete(text, context.exception)
+        text = '{"ask_content": "你好\\u4f60", "id": 12, "x": [1.5e3, -7, true, null]}'
+        # 合法请求的任何前缀都在等待更多数据
+        for end in range(1, len(text)):
+            self.assertTrue(incomplete(text[:end]), text[:end])
+        for text in ['hello', '{"a": tx', '{"a" 1}', '{"a": 1]', '{"a": "\\q"}']:
+            self.assertFalse(incomplete(text), text)
+
+    def test_write_excel_split(self):
+        info = [("name", "问题")]
+        sheets = [{"name": "A", "info": info, "items": [{"n": {"name": str(i)}} for i in range(5)]},
+            {"name": "a(2)", "info": info, "items": []}]
+        max_rows = chat.mytools.excel_max_rows
+        chat.mytools.excel_max_rows = 4
+        try:
+            with tempfile.TemporaryDirectory() as path:
+                filename = os.path.join(path, "kb.xls")
+                write_excel(filename, sheets)
+                # 续写的子表格跳过已有的名称
+                self.assertEqual(xlrd.open_workbook(filename).sheet_names(), ["A", "A(3)", "A(4)", "a(2)"])
+        finally:
+            chat.mytools.excel_max_rows = max_rows
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import sys
+import os
+import tempfile
+sys.path.append("../")
+from unittest import TestCase, main
+from chat.store import SqliteStore
+from chat.snapshot import Automaton, compile_snapshot, load_snapshot
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, "kb.snap")
+        self.store = SqliteStore(":memory:")
+        self.store.add_user({"userid": "A0001", "robotname": "小民", "city": "上海市"})
+        self.store.add_nodes([
+            dict(name="你好", content="你好呀", topic="闲聊", tag="问候"),
+            dict(name="办理信用卡", content="请到柜台", topic="银行业务", tid=1.0, tag="办理 信用卡"),
+            dict(name="我叫{robotname}", content="好的", topic="闲聊", tag="名字")
+            ])
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_automaton(self):
+        patterns = ["he", "she", "his", "hers"]
+        automaton = Automaton.build((pattern, index) for index, pattern in enumerate(patterns))
+        self.assertEqual(sorted(automaton.search("ushers")), [0, 1, 3])
+        self.assertEqual(list(automaton.search("xyz")), [])
+
+    def test_roundtrip(self):
+        header = compile_snapshot(self.filename, store=self.store, processes=1)
+        self.assertEqual(header["count"], 3)
+        kb = load_snapshot(self.filename)
+        self.assertEqual(len(kb), 3)
+        self.assertEqual(kb.find("问候")[0]["content"], "你好呀")
+        self.assertTrue(kb.find("问候")[0]["vector"])
+        # 含用户占位符的问题在运行时计算向量
+        self.assertIsNone(kb.find("名字")[0]["vector"])
+        node = kb.key_sentence("我想办理信用卡", ["银行业务"])
+        self.assertEqual(node["content"], "请到柜台")
+        self.assertIsNone(kb.key_sentence("我想办理信用卡", ["闲聊"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.append("../")
+from unittest import TestCase, main
+from chat.store import Store, SqliteStore
+from chat.kb import KnowledgeBase
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.store = SqliteStore(":memory:")
+        self.store.add_user({"userid": "A0001", "robotname": "小民", "city": "上海市"})
+        self.store.merge_config("A0001", "银行业务", "银行业务,理财产品")
+        self.store.merge_config("A0001", "闲聊", "闲聊")
+        self.store.add_nodes([
+            dict(name="你好", content="你好呀", topic="闲聊", tag="问候"),
+            dict(name="办理信用卡", content="请到柜台", topic="银行业务", tid=1.0, tag="办理 信用卡"),
+            dict(name="下一步", content="请出示身份证", topic="理财产品", tid=2.0, tag="下一步")
+            ])
+
+    def test_user(self):
+        user = self.store.get_user("A0001")
+        self.assertEqual(user["robotname"], "小民")
+        self.assertEqual(user["topics_version"], 0)
+        self.assertIsNone(self.store.get_user("B0001"))
+        self.assertEqual(self.store.kb_version(), 0)
+        self.store.bump_kb_version()
+        self.assertEqual(self.store.kb_version(), 1)
+        # 知识库版本号与用户无关
+        empty = SqliteStore(":memory:")
+        empty.bump_kb_version()
+        self.assertEqual(empty.kb_version(), 1)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Store()
+
+    def test_configs(self):
+        self.assertEqual(set(self.store.config_names()), {"银行业务", "闲聊"})
+        self.assertEqual(set(self.store.user_topics("A0001")), {"银行业务", "理财产品", "闲聊"})
+        self.assertEqual(self.store.select_configs("A0001", ["闲聊"]), 1)
+        self.assertEqual(self.store.user_topics("A0001"), ["闲聊"])
+        self.assertEqual(self.store.get_user("A0001")["topics_version"], 1)
+        self.store.select_configs("A0001", [])
+        self.assertEqual(self.store.user_topics("A0001"), [])
+
+    def test_nodes(self):
+        kb = KnowledgeBase.from_store(self.store)
+        self.assertEqual(len(kb), 3)
+        self.assertEqual(kb.find("问候")[0]["content"], "你好呀")
+        self.assertEqual(self.store.find_node("下一步", "理财产品", 2.0)["content"], "请出示身份证")
+        node = self.store.key_sentence("我想办理信用卡", ["银行业务"])
+        self.assertEqual(node["name"], "办理信用卡")
+        self.assertIsNone(self.store.key_sentence("我想办理信用卡", ["闲聊"]))
+        self.assertEqual(len(self.store.topic_nodes("闲聊")), 1)
+
+    def test_memory(self):
+        self.store.add_memory("你好", "A0001", "1", "0")
+        self.store.add_memory("再见", "A0001", "2", "1")
+        rows = self.store.query("SELECT question FROM memory WHERE previous = ?", ("1",))
+        self.assertEqual(rows[0]["question"], "再见")
+
+
+if __name__ == '__main__':
+    main()
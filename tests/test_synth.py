@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import sys
+import json
+import os
+import random
+import tempfile
+sys.path.append("../")
+from collections import namedtuple
+from unittest import TestCase, main
+from chat.synth import generate, scene, load_cilin
+from chat.ianswer import answer2xml
+from chat.mytools import iter_excel
+from chat.kb import export_columns
+
+Row = namedtuple("Row", [key for key, _ in export_columns])
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, "synth.xls")
+        self.question_file = os.path.join(self.tempdir.name, "synth.txt")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_generate(self):
+        summary = generate(self.filename, cells=1300, topics=3, scene_ratio=0.3, \
+            question_file=self.question_file, question_ratio=0.5)
+        sheets = {}
+        for sheet_name, rows in iter_excel(self.filename, Row):
+            sheets[sheet_name] = list(rows)
+        self.assertEqual(sorted(sheets), ["业务场景", "话题0000", "话题0001", "话题0002"])
+        self.assertEqual(sum(len(rows) for rows in sheets.values()), summary["rows"])
+        cells = sum(len(row.name.split("|")) for rows in sheets.values() for row in rows)
+        self.assertEqual(cells, summary["cells"])
+        # 场景节点的子节点链接指向同一场景中存在的 tid
+        scene = [row for row in sheets["业务场景"] if row.topic == "场景0000"]
+        tids = set(int(row.tid) for row in scene)
+        root = [row for row in scene if row.tid == 0][0]
+        button = json.loads(root.button)
+        self.assertTrue(set(int(item["url"]) for item in button["area"].values()) <= tids)
+        self.assertEqual(button["next"]["url"], "1")
+        self.assertEqual(button["previous"], {})
+        with open(self.question_file, encoding="UTF-8") as file:
+            self.assertEqual(len(file.read().split()), summary["questions"])
+
+    def test_scene_xml(self):
+        groups = load_cilin()
+        verb_codes = sorted(code for code in groups if code[0] in "FH")
+        noun_codes = sorted(code for code in groups if code[0] in "BD")
+        rows, _ = scene(random.Random(0), groups, verb_codes, noun_codes, "场景0000", 3, 2, 1)
+        # 生成的场景节点可由 answer2xml 渲染
+        for item in rows:
+            node = item["n"]
+            data = dict(node, question=node["name"], context=node["topic"], behavior=0, \
+                parameter="")
+            picurl = answer2xml(data)["picurl"]
+            self.assertIn(node["content"], picurl)
+        self.assertIn("img/场景0000/1.png", answer2xml(dict(rows[0]["n"], question="", \
+            context="场景0000", behavior=0, parameter=""))["picurl"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import sys
+import os
+import json
+import tempfile
+sys.path.append("../")
+from unittest import TestCase, main
+from chat.trace import Tracer, NOOP
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.tracer = Tracer(enabled=True)
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def run_request(self):
+        with self.tracer.span("search", question="你好"):
+            with self.tracer.span("extract_synonym"):
+                pass
+            with self.tracer.span("extract_synonym"):
+                pass
+
+    def test_disabled(self):
+        self.assertIs(Tracer().span("search"), NOOP)
+
+    def test_nested(self):
+        self.run_request()
+        stats = self.tracer.stats()
+        self.assertEqual(stats["search"]["count"], 1)
+        self.assertEqual(stats["extract_synonym"]["count"], 2)
+        self.assertGreaterEqual(stats["search"]["total"], stats["extract_synonym"]["total"])
+        depths = {name: depth for name, _, _, _, depth, _ in self.tracer.events}
+        self.assertEqual(depths, {"search": 0, "extract_synonym": 1})
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span("search"):
+                raise ValueError()
+        self.assertEqual(self.tracer.stats()["search"]["errors"], 1)
+
+    def test_sample(self):
+        self.tracer.sample = 0.0
+        self.run_request()
+        self.assertEqual(self.tracer.stats(), {})
+        self.assertEqual(self.tracer.local.stack, [])
+
+    def test_export(self):
+        self.run_request()
+        filename = os.path.join(self.tempdir.name, "trace.json")
+        self.assertEqual(self.tracer.export(filename), 3)
+        with open(filename, encoding="UTF-8") as file:
+            events = json.load(file)["traceEvents"]
+        self.assertEqual(events[-1]["name"], "search")
+        self.assertEqual(events[-1]["args"], {"question": "你好"})
+        filename = os.path.join(self.tempdir.name, "trace.jsonl")
+        self.tracer.export(filename)
+        with open(filename, encoding="UTF-8") as file:
+            self.assertEqual(len(file.readlines()), 3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import tempfile
+import threading
+sys.path.append("../")
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from unittest import TestCase, main
+from chat.tts import TTS, split_sentences
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地桩合成服务器：音频内容为文本本身，首句之外的句子延迟合成。
+    """
+    def do_GET(self):
+        text = parse_qs(urlparse(self.path).query)["tex"][0]
+        self.server.texts.append(text)
+        if not text.startswith("第一句"):
+            time.sleep(0.3)
+        body = text.encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mp3")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Music():
+    """记录播放顺序与时间的音频播放器。
+    """
+    def __init__(self):
+        self.played = []
+        self.filename = None
+
+    def load(self, filename):
+        self.filename = filename
+
+    def play(self):
+        with open(self.filename, encoding="UTF-8") as file:
+            self.played.append((file.read(), time.monotonic()))
+
+    def get_busy(self):
+        return False
+
+
+class Player():
+    def __init__(self):
+        self.music = Music()
+
+    def init(self):
+        pass
+
+
+class TestMe(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.texts = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.player = Player()
+        self.tts = TTS(audioplayer=self.player, tempdir=self.tempdir.name)
+        self.tts.audio_endpoint.url = "http://127.0.0.1:%d/text2audio" % self.server.server_address[1]
+        self.tts.token = {"access_token": "token", "expires_at": time.time() + 86400}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tempdir.cleanup()
+
+    def test_split(self):
+        self.assertEqual(split_sentences("你好！请问办理什么业务？\n谢谢"), \
+            ["你好！", "请问办理什么业务？", "谢谢"])
+        self.assertEqual(split_sentences("一，二，三，四。", max_length=4), ["一，二，", "三，四。"])
+
+    def test_stream(self):
+        text = "第一句很快。第二句慢一些！第三句也慢？第四句"
+        start = time.monotonic()
+        self.tts.say_stream(text).join()
+        played = self.player.music.played
+        self.assertEqual([sentence for sentence, _ in played], split_sentences(text))
+        # 首句在其余句子合成完成之前开始播放
+        self.assertLess(played[0][1] - start, 0.25)
+        self.assertGreaterEqual(played[1][1] - start, 0.3)
+
+    def test_skip_error(self):
+        synthesize = self.tts.synthesize
+        def broken(text, *args, **kwargs):
+            if text.startswith("第二句"):
+                return "missing.mp3"
+            return synthesize(text, *args, **kwargs)
+        self.tts.synthesize = broken
+        self.tts.say_stream("第一句很快。第二句打不开。第三句").join()
+        # 无法播放的句子被跳过，之后的句子照常播放
+        self.assertEqual([sentence for sentence, _ in self.player.music.played], \
+            ["第一句很快。", "第三句"])
+
+    def test_cache(self):
+        self.tts.say("欢迎光临")
+        self.tts.say("欢迎光临")
+        self.assertEqual(self.server.texts, ["欢迎光临"])
+        self.assertEqual(len(self.player.music.played), 2)
+
+
+if __name__ == '__main__':
+    main()